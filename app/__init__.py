@@ -1,7 +1,6 @@
 import os
 from flask import Flask, current_app
 from .utils.logger import setup_app_logger
-from .routes import register_blueprints, socketio_api
 from .extensions import register_extensions
 from .command import register_commands
 
@@ -21,6 +20,10 @@ def create_app(config_class=None):
     # 初始化日志系统
     setup_app_logger(app)
 
+    # 路由模块在创建应用时才导入: 只使用模型或工具模块的脚本 (import app.models) 不必加载全部接口
+    # socketio_api 必须在 socketio.init_app 之前导入, 事件处理函数才会登记到之后创建的每个应用
+    from .routes import register_blueprints, socketio_api  # noqa: F401
+
     register_extensions(app)
     register_commands(app) 
     register_blueprints(app)
@@ -1,4 +1,5 @@
 import os
+import sys
 import click
 from flask import current_app
 from sqlalchemy import inspect
@@ -130,4 +131,296 @@ def register_commands(app):
         print("-" * 120)
         print("\n".join(sorted(output)))
         print("-" * 120)
-        print(f"Total: {len(output)} routes\n")
\ No newline at end of file
+        print(f"Total: {len(output)} routes\n")
+
+    @app.cli.command("rebuild-order-stats")
+    def rebuild_order_stats():
+        """根据订单表全量重建订单每日汇总表."""
+        with app.app_context():
+            logger = app.logger
+            from .models import OrderDailyStat
+
+            try:
+                logger.info("🔄 开始重建订单统计汇总表...")
+                rows = OrderDailyStat.rebuild()
+                db.session.commit()
+                logger.info(f"✅ 订单统计汇总表重建完成，共 {rows} 行")
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"❌ 重建订单统计失败: {str(e)}", exc_info=True)
+                raise
+
+    @app.cli.command("migrate-private-pairs")
+    def migrate_private_pairs():
+        """为私聊会话添加成员对列、回填并合并重复私聊，然后创建唯一索引."""
+        with app.app_context():
+            logger = app.logger
+            from .models import Conversation, ConversationArchive
+
+            inspector = inspect(db.engine)
+            pair_columns = [Conversation.__table__.c.min_user_id, Conversation.__table__.c.max_user_id]
+            try:
+                # 1. 旧库补充列（归档表与会话表的列保持一致）
+                for table in (Conversation.__table__, ConversationArchive.__table__):
+                    if not inspector.has_table(table.name):
+                        continue
+                    existing = {column['name'] for column in inspector.get_columns(table.name)}
+                    for column in pair_columns:
+                        if column.name not in existing:
+                            column_type = column.type.compile(dialect=db.engine.dialect)
+                            db.session.execute(db.text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type} NULL"))
+                            logger.info(f"➕ {table.name} 已添加列 {column.name}")
+                db.session.commit()
+
+                # 2. 回填成员对并合并重复的私聊
+                logger.info("🔄 开始回填私聊成员对...")
+                filled, merged = Conversation.backfill_private_pairs()
+                unlinked = Conversation.unlink_private_orders()
+                archived = ConversationArchive.backfill_private_pairs()
+                db.session.commit()
+                logger.info(f"✅ 已回填 {filled} 个私聊会话，合并删除 {merged} 个重复会话，解除 {unlinked} 个私聊与订单的关联")
+                logger.info(f"✅ 已回填 {archived} 个归档私聊会话的成员对")
+
+                # 3. 创建唯一索引
+                index = next(index for index in Conversation.__table__.indexes if index.unique)
+                if index.name not in {item['name'] for item in inspect(db.engine).get_indexes(Conversation.__tablename__)}:
+                    index.create(db.engine)
+                    logger.info(f"✅ 已创建唯一索引 {index.name}")
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"❌ 私聊成员对迁移失败: {str(e)}", exc_info=True)
+                raise
+
+    @app.cli.command("order-scheduler")
+    @click.option('--once', is_flag=True, help='处理当前已到期的订单后退出')
+    @click.option('--no-push', is_flag=True, help='未配置消息队列时也运行（状态变化不会推送给客户端）')
+    def run_order_scheduler(once, no_push):
+        """按出发时间推进订单状态（未开始 -> 进行中 -> 待付款）."""
+        from .extensions import order_scheduler
+
+        logger = app.logger
+        # 独立进程上没有客户端连接, 推送只能经消息队列转发给服务进程
+        if not app.config['SOCKETIO_MESSAGE_QUEUE']:
+            if not no_push:
+                logger.error("❌ 独立运行调度器需要配置 SOCKETIO_MESSAGE_QUEUE, 否则状态变化无法推送给客户端（确认不需要推送请加 --no-push）")
+                raise SystemExit(1)
+            logger.warning("⚠️ 未配置 SOCKETIO_MESSAGE_QUEUE, 订单状态变化不会推送给客户端")
+        if once:
+            with app.app_context():
+                changed = order_scheduler.run_once()
+            logger.info(f"✅ 已推进 {changed} 个订单的状态")
+            return
+
+        logger.info(f"⏱️ 订单调度器已启动，每 {app.config['ORDER_SCHEDULER_INTERVAL']} 秒检查一次")
+        try:
+            order_scheduler.run_forever()
+        except KeyboardInterrupt:
+            logger.info("订单调度器已停止")
+
+    @app.cli.command("archive")
+    @click.option('--order-days', type=int, default=None, help='归档出发超过 N 天的已完成/已拒绝订单（默认 ARCHIVE_ORDER_DAYS）')
+    @click.option('--message-days', type=int, default=None, help='归档超过 M 天的聊天消息（默认 ARCHIVE_MESSAGE_DAYS）')
+    @click.option('--batch-size', type=int, default=None, help='每批迁移的行数（默认 ARCHIVE_BATCH_SIZE）')
+    def archive(order_days, message_days, batch_size):
+        """把已结束的旧订单（含参与者、群聊）和旧消息分批迁移到归档表."""
+        from datetime import datetime, timedelta
+        from .models import OrderArchive, MessageArchive
+
+        order_days = order_days if order_days is not None else app.config['ARCHIVE_ORDER_DAYS']
+        message_days = message_days if message_days is not None else app.config['ARCHIVE_MESSAGE_DAYS']
+        batch_size = batch_size or app.config['ARCHIVE_BATCH_SIZE']
+
+        with app.app_context():
+            logger = app.logger
+            now = datetime.now()
+            try:
+                logger.info(f"📦 开始归档 {order_days} 天前结束的订单...")
+                orders = OrderArchive.archive_before(now - timedelta(days=order_days), batch_size)
+                logger.info(f"✅ 已归档 {orders} 个订单")
+
+                logger.info(f"📦 开始归档 {message_days} 天前的消息...")
+                messages = MessageArchive.archive_before(now - timedelta(days=message_days), batch_size)
+                logger.info(f"✅ 已归档 {messages} 条消息")
+            except Exception as e:
+                logger.error(f"❌ 归档失败: {str(e)}", exc_info=True)
+                raise
+
+    @app.cli.command("prune-changelog")
+    @click.option('--days', type=int, default=None, help='删除超过 N 天的变更记录（默认 CHANGELOG_RETENTION_DAYS）')
+    @click.option('--batch-size', type=int, default=None, help='每批删除的行数（默认 ARCHIVE_BATCH_SIZE）')
+    def prune_changelog(days, batch_size):
+        """清理增量同步的旧变更记录（令牌早于保留期的客户端会收到全量同步提示）."""
+        from datetime import timedelta
+        from .models import ChangeLog
+
+        days = days if days is not None else app.config['CHANGELOG_RETENTION_DAYS']
+        batch_size = batch_size or app.config['ARCHIVE_BATCH_SIZE']
+
+        with app.app_context():
+            logger = app.logger
+            try:
+                logger.info(f"🧹 开始清理 {days} 天前的变更记录...")
+                rows = ChangeLog.prune(timedelta(days=days), batch_size)
+                logger.info(f"✅ 已删除 {rows} 条变更记录")
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"❌ 清理变更记录失败: {str(e)}", exc_info=True)
+                raise
+
+    @app.cli.command("list-profiles")
+    @click.option('--limit', type=int, default=20, help='显示最近的 N 个剖析文件')
+    def list_profiles(limit):
+        """列出请求剖析文件（见 app/utils/profiler.py）."""
+        from .utils.profiler import RequestProfiler, list_profiles as find_profiles
+
+        profiles = find_profiles(RequestProfiler.directory(app))
+        if not profiles:
+            print("暂无剖析文件")
+            return
+        print(f"{'时间':<19} {'方式':<9} {'耗时(ms)':>9}  {'接口':<45} 文件")
+        print("-" * 160)
+        for profile in profiles[:limit]:
+            print(f"{profile['time']:%Y-%m-%d %H:%M:%S} {profile['mode']:<9} {profile['ms']:>9}  "
+                  f"{profile['method'] + ' ' + profile['path']:<45} {profile['file']}")
+        print("-" * 160)
+        print(f"Total: {len(profiles)} profiles\n")
+
+    @app.cli.command("show-profile")
+    @click.argument('filename')
+    @click.option('--sort', default='cumulative', help='.prof 的排序字段 (cumulative / tottime / ncalls)')
+    @click.option('--limit', type=int, default=20, help='显示的函数/帧数')
+    def show_profile(filename, sort, limit):
+        """汇总一个剖析文件中最耗时的函数."""
+        from .utils.profiler import RequestProfiler, summarize_profile
+
+        path = os.path.join(RequestProfiler.directory(app), os.path.basename(filename))
+        if not os.path.exists(path):
+            raise click.ClickException(f"剖析文件不存在: {path}")
+        print(summarize_profile(path, sort, limit))
+
+    @app.cli.command("startup-profile")
+    @click.option('--config', default=None, help='配置类路径（默认使用 FLASK_CONFIG）')
+    @click.option('--limit', type=int, default=20, help='显示的包/模块数')
+    def startup_profile(config, limit):
+        """在新进程中测量应用冷启动耗时（模块导入与 create_app）."""
+        from .utils.profiler import profile_startup, summarize_startup
+
+        try:
+            startup = profile_startup(os.path.dirname(app.root_path), config)
+        except RuntimeError as e:
+            raise click.ClickException(f"启动失败: {str(e)}")
+        print(summarize_startup(startup, limit))
+
+    @app.cli.command("seed-users")
+    @click.option('--count', type=int, default=1000, help='创建的用户数')
+    @click.option('--prefix', default='seed', help='用户名前缀（用户名为 前缀_用户ID）')
+    @click.option('--password', default='password123', help='所有用户共用的密码')
+    @click.option('--chunk', type=int, default=5000, help='每次批量插入的行数')
+    def seed_users(count, prefix, password, chunk):
+        """批量创建测试用户（共用一次密码哈希, 分块批量插入）."""
+        import time
+        from datetime import datetime, timedelta
+        from .extensions import passwords
+        from .models import User
+
+        with app.app_context():
+            logger = app.logger
+            started = time.perf_counter()
+            password_hash = passwords.hash(password)
+            now = datetime.now()
+            start = (db.session.scalar(db.select(db.func.max(User.user_id))) or 0) + 1
+
+            def make_row(user_id):
+                birthday = datetime(1970, 1, 1) + timedelta(days=user_id % 15000)
+                return {
+                    'user_id': user_id,
+                    'username': f'{prefix}_{user_id}',
+                    'realname': f'测试用户{user_id}',
+                    'identity_id': f"120101{birthday:%Y%m%d}{user_id // 15000 % 1000:03d}{user_id % 10}",
+                    'gender': 'male' if user_id % 2 else 'female',
+                    'telephone': f'17{user_id % 10**9:09d}',
+                    'password_hash': password_hash,
+                    'status': '离线',
+                    'last_active': now,
+                    'updated_at': now,
+                }
+
+            try:
+                for offset in range(0, count, chunk):
+                    ids = range(start + offset, start + min(offset + chunk, count))
+                    db.session.execute(db.insert(User), [make_row(user_id) for user_id in ids])
+                    db.session.commit()
+                    logger.info(f"已写入 {offset + len(ids)}/{count} 个用户")
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"❌ 批量创建用户失败: {str(e)}", exc_info=True)
+                raise
+
+            elapsed = time.perf_counter() - started
+            logger.info(f"✅ 已创建 {count} 个用户 ({prefix}_{start} ~ {prefix}_{start + count - 1}), "
+                        f"密码 {password}, 耗时 {elapsed:.1f}s")
+
+    def resolve_table(name):
+        from . import models  # noqa: F401  确保所有表都已注册到 metadata
+        table = db.metadata.tables.get(name)
+        if table is None:
+            raise click.ClickException(f"表不存在: {name}, 可选: {', '.join(sorted(db.metadata.tables))}")
+        return table
+
+    def open_stream(path, mode):
+        if path == '-':
+            return sys.stdout if mode == 'w' else sys.stdin
+        return open(path, mode, encoding='utf-8', newline='')
+
+    @app.cli.command("export")
+    @click.argument('table')
+    @click.argument('path')
+    @click.option('--format', 'fmt', type=click.Choice(('ndjson', 'csv')), default=None, help='文件格式（默认按扩展名判断）')
+    @click.option('--chunk', type=int, default=10000, help='每次从游标读取的行数')
+    def export_data(table, path, fmt, chunk):
+        """把表数据导出为 NDJSON 或 CSV 文件（PATH 为 - 时写到标准输出）."""
+        import time
+        from .utils.bulk_io import detect_format, export_table
+
+        table = resolve_table(table)
+        fmt = detect_format(path, fmt)
+        with app.app_context():
+            logger = app.logger
+            started = time.perf_counter()
+            stream = open_stream(path, 'w')
+            try:
+                with db.engine.connect() as connection:
+                    count = export_table(connection, table, stream, fmt, chunk)
+            finally:
+                if path != '-':
+                    stream.close()
+            elapsed = time.perf_counter() - started
+            logger.info(f"✅ 已导出 {table.name} {count} 行到 {path} ({fmt}), 耗时 {elapsed:.1f}s")
+
+    @app.cli.command("import")
+    @click.argument('table')
+    @click.argument('path')
+    @click.option('--format', 'fmt', type=click.Choice(('ndjson', 'csv')), default=None, help='文件格式（默认按扩展名判断）')
+    @click.option('--chunk', type=int, default=10000, help='每批插入并提交的行数')
+    def import_data(table, path, fmt, chunk):
+        """从 NDJSON 或 CSV 文件批量导入表数据（PATH 为 - 时读取标准输入）."""
+        import time
+        from .utils.bulk_io import detect_format, import_table
+
+        table = resolve_table(table)
+        fmt = detect_format(path, fmt)
+        with app.app_context():
+            logger = app.logger
+            started = time.perf_counter()
+            stream = open_stream(path, 'r')
+            try:
+                count = import_table(db.engine, table, stream, fmt, chunk,
+                                     progress=lambda n: logger.debug(f"已导入 {n} 行"))
+            except Exception as e:
+                logger.error(f"❌ 导入 {table.name} 失败: {str(e)}")
+                raise
+            finally:
+                if path != '-':
+                    stream.close()
+            elapsed = time.perf_counter() - started
+            logger.info(f"✅ 已导入 {table.name} {count} 行, 耗时 {elapsed:.1f}s ({count / max(elapsed, 1e-6):.0f} 行/s)")
@@ -6,31 +6,70 @@ from flask_cors import CORS # CORS用于跨域资源共享
 from flask_jwt_extended import JWTManager # JWT用于身份验证
 from flask_socketio import SocketIO # SocketIO用于实时通信
 from .utils.logger import get_logger
+from .utils.green import eventlet_patched
+from .utils.cache import Cache # 进程内缓存
+from .utils.order_feed import OrderFeed # 订单广场实时推送
+from .utils.db_pool import configure_engine_options # 连接池配置
+from .utils.db_routing import RoutingSession # 读写分离
+from .utils import db_routing # 读己之写 (请求开始时判断)
+from .utils.outbox import SocketIOOutbox # 提交后推送 Socket.IO 事件
+from .utils.order_scheduler import OrderLifecycleScheduler # 订单状态定时推进
+from .utils.profiler import RequestProfiler # 按需的请求性能剖析
+from .utils.passwords import PasswordHasher # 密码哈希 (eventlet 下在线程池中计算)
+from .utils.lifecycle import WorkerLifecycle # worker 健康状态与优雅退出
+from .utils.socketio_queue import create_client_manager # 消息队列 (含进程间内部广播)
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
 cors = CORS()
 jwt = JWTManager()
 socketio = SocketIO(
-    cors_allowed_origins="*",
-    async_mode='eventlet'
+    cors_allowed_origins="*"
 )
+cache = Cache()
+order_feed = OrderFeed()
+outbox = SocketIOOutbox()
+order_scheduler = OrderLifecycleScheduler()
+profiler = RequestProfiler()
+passwords = PasswordHasher()
+worker = WorkerLifecycle()
 
 def register_extensions(app):
     """Register Flask extensions."""
+    configure_engine_options(app)
     db.init_app(app)
+    db_routing.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     cors.init_app(app)
     jwt.init_app(app) 
-    socketio.init_app(app)
+    # wsgi.py monkey_patch 后使用 eventlet, 测试和命令行使用 threading (不导入 eventlet, 启动更快)
+    socketio_options = {
+        'async_mode': app.config.get('SOCKETIO_ASYNC_MODE') or ('eventlet' if eventlet_patched() else 'threading')
+    }
+    # 多进程部署 (serve.py) 时经消息队列把 emit 转发到其他进程上的客户端, 订单广场等内部事件也经队列广播
+    if app.config.get('SOCKETIO_MESSAGE_QUEUE'):
+        socketio_options['client_manager'] = create_client_manager(
+            app.config['SOCKETIO_MESSAGE_QUEUE'], channel=app.config.get('SOCKETIO_CHANNEL', 'flask-socketio')
+        )
+    if app.config.get('SOCKETIO_TRANSPORTS'):
+        socketio_options['transports'] = app.config['SOCKETIO_TRANSPORTS']
+    socketio.init_app(app, **socketio_options)
+    cache.init_app(app, socketio)
+    order_feed.init_app(app, socketio)
+    outbox.init_app(app, socketio)
+    order_scheduler.init_app(app, socketio)
+    profiler.init_app(app)
+    passwords.init_app(app)
+    worker.init_app(app, socketio)
 
     # 设置JWT的回调函数
     from .models import User
     @jwt.user_lookup_loader
     def user_lookup_callback(_jwt_header, jwt_data):
-        return User.query.get(jwt_data["sub"])
+        # 精简信息 + 请求内/短期进程内缓存, 不再每个请求读取整行 (含头像二进制数据)
+        return User.get_identity(jwt_data["sub"])
         
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
@@ -54,20 +93,19 @@ def register_extensions(app):
         }), 401
     
     @jwt.invalid_token_loader
-    def invalid_token_callback(jwt_header, jwt_payload):
+    def invalid_token_callback(error_string):
         """
         处理无效的JWT token
-        当JWT token无效时自动调用
+        当JWT token无效（签名错误、格式错误、token 类型不符等）时自动调用
 
         参数:
-            jwt_header: JWT头部信息 (dict)
-            jwt_payload: JWT有效载荷 (dict)
+            error_string: 错误描述 (str)
 
         返回:
             JSON响应: 包含错误信息的JSON响应
         """
         logger = get_logger(__name__)
-        logger.warning(f"Token无效: {jwt_payload}")
+        logger.warning(f"Token无效: {error_string}")
         return jsonify({
             "code": 401,
             "message": "Token无效，请重新登录",
@@ -1,5 +1,10 @@
 from enum import Enum
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
 from ..extensions import db
+from .types import PreciseDateTime
 from .Chat_conversation_participant import ConversationParticipant
 from .Chat_messgae import Message
 
@@ -25,10 +30,20 @@ class Conversation(db.Model):
     | avatar     | String(255)      | YES  |     | NULL    | 会话头像URL       |
     | order_id   | Integer          | YES  |     | NULL    | 关联订单ID        |
     | created_at | DateTime         | YES  |     | now()   | 创建时间          |
+    | updated_at | DateTime(6)      | NO   |     | now()   | 最后修改/消息时间  |
+    | min_user_id| Integer          | YES  | UNI | NULL    | 私聊较小的用户ID   |
+    | max_user_id| Integer          | YES  | UNI | NULL    | 私聊较大的用户ID   |
     +------------+------------------+------+-----+---------+------------------+
+
+    新消息写入或消息被修改时同步刷新 updated_at (见文件末尾的 Message 映射事件).
+    私聊会话的 (min_user_id, max_user_id) 唯一 (群聊为 NULL): 两人之间只有一个私聊会话,
+    查找只需一次索引查询, 并发创建时由唯一索引保证不会重复 (见 get_or_create_private).
     """
     __tablename__ = 'conversations'
-    __table_args__ = {'comment': '聊天会话表'}
+    __table_args__ = (
+        db.Index('uq_conversations_private_pair', 'min_user_id', 'max_user_id', unique=True),  # 私聊成员对
+        {'comment': '聊天会话表'}
+    )
 
     id = db.Column(db.Integer, primary_key=True, comment='会话ID')
     type = db.Column(db.Enum(*ConversationType.values(), name='conversation_type_enum'), nullable=False, comment='会话类型')
@@ -36,6 +51,9 @@ class Conversation(db.Model):
     avatar = db.Column(db.String(255), nullable=True, comment='会话头像URL')
     order_id = db.Column(db.Integer, db.ForeignKey('orders.order_id'), nullable=True, comment='关联订单ID')
     created_at = db.Column(db.DateTime, default=db.func.now(), comment='创建时间')
+    updated_at = db.Column(PreciseDateTime, nullable=False, default=datetime.now, onupdate=datetime.now, comment='最后修改时间')
+    min_user_id = db.Column(db.Integer, nullable=True, comment='私聊成员中较小的用户ID')
+    max_user_id = db.Column(db.Integer, nullable=True, comment='私聊成员中较大的用户ID')
 
     # 关联关系
     messages = db.relationship('Message', back_populates='conversation', cascade='all, delete-orphan')
@@ -56,6 +74,161 @@ class Conversation(db.Model):
         )
         return f"与{other_user.username}的对话" if other_user else "私聊会话"
     
+    @staticmethod
+    def private_pair(user1_id, user2_id):
+        """私聊成员对 (较小的用户ID, 较大的用户ID), 与参数顺序无关"""
+        return tuple(sorted((int(user1_id), int(user2_id))))
+
+    @classmethod
+    def find_private(cls, user1_id, user2_id):
+        """两人之间的私聊会话"""
+        low, high = cls.private_pair(user1_id, user2_id)
+        return cls.query.filter_by(min_user_id=low, max_user_id=high).first()
+
+    @classmethod
+    def get_or_create_private(cls, user1_id, user2_id):
+        """
+        查找或创建两人之间的私聊会话（只 flush，由调用方统一提交）
+        两个请求同时创建时只有一个能插入成功, 另一个回滚到保存点后读取已创建的会话
+        :return: (会话, 是否新建)
+        """
+        conv = cls.find_private(user1_id, user2_id)
+        if conv:
+            return conv, False
+
+        low, high = cls.private_pair(user1_id, user2_id)
+        try:
+            with db.session.begin_nested():
+                conv = cls(type=ConversationType.PRIVATE.value, min_user_id=low, max_user_id=high)
+                conv.participants = [ConversationParticipant(user_id=user_id) for user_id in sorted({low, high})]
+                db.session.add(conv)
+        except IntegrityError:
+            # 加锁读取: MySQL 可重复读隔离级别下, 普通查询看不到本事务开始后其他事务提交的会话
+            conv = cls.query.filter_by(min_user_id=low, max_user_id=high).with_for_update().first()
+            if conv is None:
+                raise
+            return conv, False
+        return conv, True
+
+    @classmethod
+    def backfill_private_pairs(cls):
+        """
+        为没有成员对的旧私聊会话填写 min_user_id/max_user_id (创建唯一索引前执行, 只 flush, 由调用方提交)
+        同一对用户有多个私聊时合并到最早的会话: 消息移入, 未读数相加, 已读位置取较新的, 然后删除其余会话;
+        成员超过两人的私聊会话不处理
+        :return: (填写成员对的会话数, 合并删除的会话数)
+        """
+        pending = db.session.query(
+            ConversationParticipant.conversation_id,
+            db.func.min(ConversationParticipant.user_id),
+            db.func.max(ConversationParticipant.user_id)
+        ).join(cls, cls.id == ConversationParticipant.conversation_id).filter(
+            cls.type == ConversationType.PRIVATE.value,
+            cls.min_user_id.is_(None)
+        ).group_by(ConversationParticipant.conversation_id).having(db.func.count() <= 2).all()
+        if not pending:
+            return 0, 0
+
+        # 成员对 -> 会话ID (已填写成员对的会话优先保留, 其次是最早创建的会话)
+        groups = defaultdict(list)
+        for conv_id, low, high in db.session.query(cls.id, cls.min_user_id, cls.max_user_id).filter(
+            cls.min_user_id.isnot(None)
+        ):
+            groups[(low, high)].append(conv_id)
+        for conv_id, low, high in sorted(pending):
+            groups[(low, high)].append(conv_id)
+
+        merged = 0
+        for ids in groups.values():
+            if len(ids) > 1:
+                keep, duplicates = ids[0], ids[1:]
+                for duplicate in duplicates:
+                    cls._merge_private(keep, duplicate)
+                merged += len(duplicates)
+
+        table = cls.__table__
+        surviving = [
+            {'conv_id': conv_id, 'low': low, 'high': high}
+            for conv_id, low, high in pending if groups[(low, high)][0] == conv_id
+        ]
+        # 只修改内部的成员对列: 保留 updated_at, 不记录同步变更
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('conv_id')).values(
+                min_user_id=db.bindparam('low'), max_user_id=db.bindparam('high'), updated_at=table.c.updated_at
+            ),
+            surviving
+        )
+        return len(surviving), merged
+
+    @classmethod
+    def unlink_private_orders(cls):
+        """
+        解除旧私聊会话与订单的关联 (只 flush, 由调用方提交)
+        私聊按成员对在多个订单间复用, 关联订单后删除该订单会级联删除整个私聊记录
+        :return: 解除关联的会话数
+        """
+        table = cls.__table__
+        return db.session.execute(
+            table.update().where(
+                table.c.type == ConversationType.PRIVATE.value,
+                table.c.order_id.isnot(None)
+            ).values(order_id=None, updated_at=table.c.updated_at)
+        ).rowcount
+
+    @classmethod
+    def _merge_private(cls, keep_id, duplicate_id):
+        """把重复的私聊会话（包括已归档的消息）合并到 keep_id 后删除"""
+        from .archive import MessageArchive  # archive 模块依赖本模块
+
+        keep, duplicate = db.session.get(cls, keep_id), db.session.get(cls, duplicate_id)
+        db.session.execute(
+            db.update(Message).where(Message.conversation_id == duplicate_id).values(conversation_id=keep_id)
+        )
+        archived = MessageArchive.__table__
+        db.session.execute(
+            archived.update().where(archived.c.conversation_id == duplicate_id).values(conversation_id=keep_id)
+        )
+        members = {participant.user_id: participant for participant in keep.participants}
+        for participant in duplicate.participants:
+            member = members.get(participant.user_id)
+            if member is None:
+                continue
+            member.unread_count += participant.unread_count or 0
+            member.last_read_message_id = max(
+                filter(None, (member.last_read_message_id, participant.last_read_message_id)), default=None
+            )
+        keep.updated_at = max(keep.updated_at, duplicate.updated_at)
+        db.session.expire(duplicate, ['messages'])  # 消息已移走, 删除会话时不再级联删除
+        db.session.delete(duplicate)
+        db.session.flush()
+
+    @classmethod
+    def get_list_version(cls, user_id):
+        """
+        用户会话列表的版本信息（用于 ETag）
+        包含会话数、所有成员数及已读位置之和、会话与成员的最后修改时间，
+        新消息（刷新 updated_at）、已读、成员变化和成员资料修改都会改变版本
+        """
+        from .user import User
+
+        mine = db.aliased(ConversationParticipant)
+        member = db.aliased(ConversationParticipant)
+        return db.session.query(
+            db.func.count(db.distinct(mine.conversation_id)),
+            db.func.count(member.user_id),
+            db.func.coalesce(db.func.sum(member.last_read_message_id), 0),
+            db.func.max(cls.updated_at),
+            db.func.max(User.updated_at)
+        ).select_from(mine).join(
+            cls, cls.id == mine.conversation_id
+        ).join(
+            member, member.conversation_id == cls.id
+        ).join(
+            User, User.user_id == member.user_id
+        ).filter(
+            mine.user_id == user_id
+        ).one()
+
     @classmethod
     def get_user_conversations(cls, current_user_id):
         """获取指定用户的所有会话列表"""
@@ -111,5 +284,14 @@ class Conversation(db.Model):
 
         return result
 
-
-
+@event.listens_for(Message, 'after_insert')
+@event.listens_for(Message, 'after_update')
+@event.listens_for(Message, 'after_delete')
+def touch_conversation(mapper, connection, target):
+    """消息写入/修改/删除时在同一事务内刷新所属会话的 updated_at"""
+    conversations = Conversation.__table__
+    connection.execute(
+        conversations.update()
+        .where(conversations.c.id == target.conversation_id)
+        .values(updated_at=datetime.now())
+    )
@@ -6,5 +6,8 @@ from .order_participant import OrderParticipant
 from .Chat_messgae import Message
 from .Chat_conversation import Conversation
 from .Chat_conversation_participant import ConversationParticipant
+from .archive import OrderArchive, OrderParticipantArchive, ConversationArchive, ConversationParticipantArchive, MessageArchive
+from .order_stat import OrderDailyStat
+from .change_log import ChangeLog
 
-__all__ = ['User', 'Car', 'Manager', 'Order', 'OrderParticipant', 'Message', 'Conversation', 'ConversationParticipant']
\ No newline at end of file
+__all__ = ['User', 'Car', 'Manager', 'Order', 'OrderParticipant', 'Message', 'Conversation', 'ConversationParticipant', 'OrderArchive', 'OrderParticipantArchive', 'ConversationArchive', 'ConversationParticipantArchive', 'MessageArchive', 'OrderDailyStat', 'ChangeLog']
\ No newline at end of file
@@ -0,0 +1,222 @@
+from datetime import datetime
+from ..extensions import db
+from .order import Order, OrderStatus
+from .order_participant import OrderParticipant
+from .Chat_conversation import Conversation, ConversationType
+from .Chat_conversation_participant import ConversationParticipant
+from .Chat_messgae import Message
+
+"""
+归档表: 已结束的订单及其参与者、群聊, 以及过期的聊天消息定期从热表迁移到 *_archive 表
+
+归档表的列与原表相同 (保留原主键), 另加 archived_at 归档时间, 不设外键, 原表只保留活跃数据.
+迁移按批次执行, 每批 INSERT ... SELECT 写入归档表后从原表删除, 并单独提交, 避免长事务和大范围锁.
+迁移使用表级语句, 不经过 ORM 批量事件: 归档不是删除, 不写入同步墓碑 (ChangeLog).
+读取: 行程记录和会话消息记录传 include_archived=true 时合并归档表, 会话列表在热表中没有消息时取归档的最后一条消息.
+
+用法:
+flask archive                                    # 使用 ARCHIVE_* 配置
+flask archive --order-days 90 --message-days 180 --batch-size 500
+"""
+
+# 可以归档的订单状态
+ARCHIVABLE_STATUSES = (OrderStatus.COMPLETED.value, OrderStatus.REJECTED.value)
+
+def _mirror(model, name, *indexes):
+    """按原表结构创建归档表（不含外键和自增, 另加 archived_at）"""
+    source = model.__table__
+    columns = [
+        db.Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable,
+                  autoincrement=False, comment=column.comment)
+        for column in source.columns
+    ]
+    return db.Table(
+        name, db.metadata, *columns,
+        db.Column('archived_at', db.DateTime, nullable=False, default=datetime.now, comment='归档时间'),
+        *indexes,
+        comment=f'{source.comment}(归档)'
+    )
+
+def _move(archive, model, whereclause, archived_at):
+    """把原表中满足条件的行复制到归档表后删除, 返回迁移行数"""
+    source = model.__table__
+    db.session.execute(
+        archive.__table__.insert().from_select(
+            [column.name for column in source.columns] + ['archived_at'],
+            db.select(*source.columns, db.literal(archived_at, db.DateTime)).where(whereclause)
+        )
+    )
+    return db.session.execute(source.delete().where(whereclause)).rowcount
+
+def _run_batches(next_batch, move_batch):
+    """循环取批次并迁移, 每批单独提交, 返回迁移的批次主键总数"""
+    total = 0
+    while True:
+        ids = next_batch()
+        if not ids:
+            return total
+        try:
+            move_batch(ids, datetime.now())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        total += len(ids)
+
+class OrderArchive(db.Model):
+    """
+    已归档订单表（列与 orders 相同）
+    +---------------------+------------------------+------+-----+---------------------+-----------------------------+
+    | Field               | Type                   | Null | Key | Default             | Comment                     |
+    +---------------------+------------------------+------+-----+---------------------+-----------------------------+
+    | order_id            | Integer                | NO   | PRI | NULL                | 订单ID(沿用原订单ID)        |
+    | ...                 |                        |      |     |                     | 同 orders                   |
+    | archived_at         | DateTime               | NO   |     | now()               | 归档时间                    |
+    +---------------------+------------------------+------+-----+---------------------+-----------------------------+
+    """
+    __table__ = _mirror(
+        Order, 'orders_archive',
+        db.Index('ix_orders_archive_initiator_start', 'initiator_id', 'start_time'),  # 行程记录
+        db.Index('ix_orders_archive_start_time', 'start_time')                         # 按天统计
+    )
+
+    def __repr__(self):
+        return f'<OrderArchive {self.order_id}: {self.start_loc}→{self.dest_loc}>'
+
+    @classmethod
+    def archive_before(cls, cutoff, batch_size=1000):
+        """
+        归档出发时间早于 cutoff 的已完成/已拒绝订单, 连同订单参与者、订单群聊及其成员和消息
+        私聊会话只解除与订单的关联, 其他会话中引用这些订单的消息 order_id 置空 (与外键 ON DELETE SET NULL 一致)
+        :return: 归档的订单数
+        """
+        def next_batch():
+            return db.session.scalars(
+                db.select(Order.order_id).where(
+                    Order.status.in_(ARCHIVABLE_STATUSES),
+                    Order.start_time < cutoff
+                ).order_by(Order.order_id).limit(batch_size)
+            ).all()
+
+        def move_batch(order_ids, archived_at):
+            conversation_ids = db.session.scalars(
+                db.select(Conversation.id).where(
+                    Conversation.order_id.in_(order_ids),
+                    Conversation.type == ConversationType.GROUP.value
+                )
+            ).all()
+
+            db.session.execute(
+                Conversation.__table__.update().where(
+                    Conversation.order_id.in_(order_ids),
+                    Conversation.type != ConversationType.GROUP.value
+                ).values(order_id=None)
+            )
+            db.session.execute(
+                Message.__table__.update().where(
+                    Message.order_id.in_(order_ids),
+                    Message.conversation_id.notin_(conversation_ids)
+                ).values(order_id=None)
+            )
+
+            # 按外键依赖顺序迁移: 会话成员 -> 消息 -> 会话 -> 订单参与者 -> 订单
+            _move(ConversationParticipantArchive, ConversationParticipant,
+                  ConversationParticipant.conversation_id.in_(conversation_ids), archived_at)
+            _move(MessageArchive, Message, Message.conversation_id.in_(conversation_ids), archived_at)
+            _move(ConversationArchive, Conversation, Conversation.id.in_(conversation_ids), archived_at)
+            _move(OrderParticipantArchive, OrderParticipant, OrderParticipant.order_id.in_(order_ids), archived_at)
+            _move(cls, Order, Order.order_id.in_(order_ids), archived_at)
+
+        return _run_batches(next_batch, move_batch)
+
+class OrderParticipantArchive(db.Model):
+    """已归档订单参与者表（列与 order_participants 相同, 另加 archived_at）"""
+    __table__ = _mirror(
+        OrderParticipant, 'order_participants_archive',
+        db.Index('ix_order_participants_archive_order_id', 'order_id')
+    )
+
+    def __repr__(self):
+        return f'<OrderParticipantArchive order:{self.order_id} user:{self.participator_id}>'
+
+class ConversationArchive(db.Model):
+    """已归档订单群聊表（列与 conversations 相同, 另加 archived_at）"""
+    __table__ = _mirror(
+        Conversation, 'conversations_archive',
+        db.Index('ix_conversations_archive_order_id', 'order_id')
+    )
+
+    @classmethod
+    def backfill_private_pairs(cls):
+        """
+        为归档表中没有成员对的私聊会话填写 min_user_id/max_user_id (与 Conversation.backfill_private_pairs 一致,
+        归档表没有唯一索引, 不合并; 只 flush, 由调用方提交)
+        :return: 填写成员对的会话数
+        """
+        table, members = cls.__table__, ConversationParticipantArchive.__table__
+        pairs = db.session.execute(
+            db.select(members.c.conversation_id, db.func.min(members.c.user_id), db.func.max(members.c.user_id))
+            .join(table, table.c.id == members.c.conversation_id)
+            .where(table.c.type == ConversationType.PRIVATE.value, table.c.min_user_id.is_(None))
+            .group_by(members.c.conversation_id)
+            .having(db.func.count() <= 2)
+        ).all()
+        if not pairs:
+            return 0
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('conv_id')).values(
+                min_user_id=db.bindparam('low'), max_user_id=db.bindparam('high')
+            ),
+            [{'conv_id': conv_id, 'low': low, 'high': high} for conv_id, low, high in pairs]
+        )
+        return len(pairs)
+
+class ConversationParticipantArchive(db.Model):
+    """已归档会话成员表（列与 conversation_participants 相同, 另加 archived_at）"""
+    __table__ = _mirror(ConversationParticipant, 'conversation_participants_archive')
+
+class MessageArchive(db.Model):
+    """已归档消息表（列与 messages 相同, 另加 archived_at）"""
+    __table__ = _mirror(
+        Message, 'messages_archive',
+        db.Index('ix_messages_archive_conversation_id', 'conversation_id', 'id')
+    )
+
+    sender = db.relationship('User', primaryjoin='foreign(MessageArchive.sender_id) == User.user_id', viewonly=True)
+
+    @classmethod
+    def history(cls, conversation_id, before=None):
+        """会话中已归档的消息（按时间升序, 可按 before 截止）"""
+        query = cls.query.filter(cls.conversation_id == conversation_id)
+        if before:
+            query = query.filter(cls.created_at < before)
+        return query.order_by(cls.created_at.asc(), cls.id.asc()).all()
+
+    @classmethod
+    def latest(cls, conversation_id):
+        """会话中最后一条已归档的消息"""
+        return cls.query.filter(cls.conversation_id == conversation_id) \
+            .order_by(cls.created_at.desc(), cls.id.desc()).first()
+
+    @classmethod
+    def archive_before(cls, cutoff, batch_size=1000):
+        """
+        归档创建时间早于 cutoff 的消息（仍是某个成员最后已读位置的消息保留在原表, 保证未读计数可以重算）
+        :return: 归档的消息数
+        """
+        read_marks = db.select(ConversationParticipant.last_read_message_id).where(
+            ConversationParticipant.last_read_message_id.isnot(None)
+        )
+
+        def next_batch():
+            return db.session.scalars(
+                db.select(Message.id).where(
+                    Message.created_at < cutoff,
+                    Message.id.notin_(read_marks)
+                ).order_by(Message.id).limit(batch_size)
+            ).all()
+
+        def move_batch(message_ids, archived_at):
+            _move(cls, Message, Message.id.in_(message_ids), archived_at)
+
+        return _run_batches(next_batch, move_batch)
@@ -1,4 +1,6 @@
+from datetime import datetime
 from ..extensions import db
+from .types import PreciseDateTime
 from .association import user_car
 
 class Car(db.Model):
@@ -12,6 +14,7 @@ class Car(db.Model):
     | car_type   | String(50)   | NO   |     | NULL    | 车型           |
     | color      | String(20)   | NO   |     | NULL    | 颜色           |
     | seat_num   | Integer      | NO   |     | NULL    | 座位数         |
+    | updated_at | DateTime(6)  | NO   |     | now()   | 最后修改时间    |
     +------------+--------------+------+-----+---------+----------------+
     """
     __tablename__ = 'car'
@@ -22,6 +25,7 @@ class Car(db.Model):
     car_type = db.Column(db.String(50), nullable=False, comment='车型')
     color = db.Column(db.String(20), nullable=False, comment='颜色')
     seat_num = db.Column(db.Integer, nullable=False, comment='座位数')
+    updated_at = db.Column(PreciseDateTime, nullable=False, default=datetime.now, onupdate=datetime.now, comment='最后修改时间')
 
     # 多对多反向关系（一辆车可属于多个用户）
     owners = db.relationship(
@@ -0,0 +1,237 @@
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from ..extensions import db
+from .order import Order, OrderStatus
+from .order_participant import OrderParticipant
+from .Chat_conversation import Conversation
+from .Chat_conversation_participant import ConversationParticipant
+from .Chat_messgae import Message
+
+class ChangeLog(db.Model):
+    """
+    变更日志表（只追加, 供增量同步接口 /api/sync 使用）
+    +-----------------+-------------+------+-----+---------+-------------------------------+
+    | Field           | Type        | Null | Key | Default | Comment                       |
+    +-----------------+-------------+------+-----+---------+-------------------------------+
+    | id              | BigInteger  | NO   | PRI | NULL    | 变更序号(同步令牌)             |
+    | entity          | String(30)  | NO   |     | NULL    | 实体类型                      |
+    | entity_id       | String(64)  | NO   |     | NULL    | 实体主键(联合主键以:连接)      |
+    | action          | Enum        | NO   |     | NULL    | upsert / delete(墓碑)         |
+    | order_id        | Integer     | YES  |     | NULL    | 所属订单(可见范围)             |
+    | conversation_id | Integer     | YES  |     | NULL    | 所属会话(可见范围)             |
+    | user_id         | Integer     | YES  |     | NULL    | 成员关系对应的用户(可见范围)    |
+    | listed          | Boolean     | NO   |     | False   | 变更前后订单在订单广场上(可见范围)|
+    | created_at      | DateTime    | YES  | MUL | now()   | 记录时间                      |
+    +-----------------+-------------+------+-----+---------+-------------------------------+
+
+    在每次 flush 以及批量 UPDATE/DELETE 时, 由会话事件在同一事务内写入,
+    事务回滚时变更记录一起回滚.
+
+    可见范围在写入时确定: 成员关系 (订单参与者/会话成员) 记录对应的用户, 删除后该用户仍能收到墓碑;
+    订单在变更前或变更后处于未开始 (出现在订单广场) 时记为 listed, 对所有用户可见.
+
+    序号由自增列分配, 并发事务的提交顺序与序号顺序不一定一致 (序号 10 的事务可能晚于 11 提交).
+    同步令牌不越过最近 CHANGELOG_GAP_SECONDS 秒内出现的序号空洞 (见 safe_token),
+    空洞之后的变更仍会返回, 下次同步时重复返回, 客户端按主键覆盖即可.
+    """
+    __tablename__ = 'change_log'
+    __table_args__ = {'comment': '变更日志表'}
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True, comment='变更序号')
+    entity = db.Column(db.String(30), nullable=False, comment='实体类型')
+    entity_id = db.Column(db.String(64), nullable=False, comment='实体主键')
+    action = db.Column(db.Enum('upsert', 'delete', name='change_action_enum'), nullable=False, comment='变更类型')
+    order_id = db.Column(db.Integer, nullable=True, comment='所属订单')
+    conversation_id = db.Column(db.Integer, nullable=True, comment='所属会话')
+    user_id = db.Column(db.Integer, nullable=True, comment='成员关系对应的用户')
+    listed = db.Column(db.Boolean, nullable=False, default=False, comment='订单是否在订单广场上')
+    created_at = db.Column(db.DateTime, default=db.func.now(), index=True, comment='记录时间')
+
+    # 需要记录变更的模型: 模型类 -> (实体类型, 主键字段, 订单字段, 会话字段, 用户字段)
+    TRACKED = {
+        Order: ('order', ('order_id',), 'order_id', None, None),
+        OrderParticipant: ('order_participant', ('order_id', 'participator_id'), 'order_id', None, 'participator_id'),
+        Conversation: ('conversation', ('id',), None, 'id', None),
+        ConversationParticipant: ('conversation_participant', ('conversation_id', 'user_id'), None, 'conversation_id', 'user_id'),
+        Message: ('message', ('id',), None, 'conversation_id', None),
+    }
+
+    def __repr__(self):
+        return f'<ChangeLog {self.id} {self.action} {self.entity}:{self.entity_id}>'
+
+    @staticmethod
+    def _is_listed(obj, action):
+        """订单在本次修改前或修改后是否处于未开始（出现在订单广场上）"""
+        history = inspect(obj).attrs.status.history
+        statuses = set(history.added) | set(history.deleted) | set(history.unchanged)
+        if not statuses:
+            # 未加载状态的删除按可见处理: 多发的墓碑对客户端无害
+            return action == 'delete'
+        return OrderStatus.NOT_STARTED.value in statuses
+
+    @classmethod
+    def _row_for(cls, obj, action):
+        """根据 ORM 对象构造一条变更记录"""
+        entity, key_fields, order_field, conversation_field, user_field = cls.TRACKED[type(obj)]
+        return {
+            'entity': entity,
+            'entity_id': ':'.join(str(getattr(obj, field)) for field in key_fields),
+            'action': action,
+            'order_id': getattr(obj, order_field) if order_field else None,
+            'conversation_id': getattr(obj, conversation_field) if conversation_field else None,
+            'user_id': getattr(obj, user_field) if user_field else None,
+            'listed': cls._is_listed(obj, action) if isinstance(obj, Order) else False
+        }
+
+    @classmethod
+    def record_flush(cls, session):
+        """记录本次 flush 中新增、修改和删除的对象"""
+        rows = []
+        for obj in session.new:
+            if type(obj) in cls.TRACKED:
+                rows.append(cls._row_for(obj, 'upsert'))
+        for obj in session.dirty:
+            if type(obj) in cls.TRACKED and session.is_modified(obj, include_collections=False):
+                rows.append(cls._row_for(obj, 'upsert'))
+        for obj in session.deleted:
+            if type(obj) in cls.TRACKED:
+                rows.append(cls._row_for(obj, 'delete'))
+
+        if rows:
+            session.connection().execute(cls.__table__.insert(), rows)
+
+    @classmethod
+    def record_bulk(cls, session, model, whereclause, action):
+        """
+        记录批量 UPDATE/DELETE 影响的行（在语句执行前以 INSERT ... SELECT 写入）
+        :param whereclause: 批量语句的 WHERE 条件，为 None 时表示整表
+        """
+        entity, key_fields, order_field, conversation_field, user_field = cls.TRACKED[model]
+        table = model.__table__
+
+        entity_id = db.cast(table.c[key_fields[0]], db.String(64))
+        for field in key_fields[1:]:
+            entity_id = entity_id + ':' + db.cast(table.c[field], db.String(64))
+
+        select = db.select(
+            db.literal(entity),
+            entity_id,
+            db.literal(action),
+            table.c[order_field] if order_field else db.null(),
+            table.c[conversation_field] if conversation_field else db.null(),
+            table.c[user_field] if user_field else db.null(),
+            # 语句执行前读取, 即修改前的状态
+            table.c.status == OrderStatus.NOT_STARTED.value if model is Order else db.false()
+        )
+        if whereclause is not None:
+            select = select.where(whereclause)
+
+        session.connection().execute(
+            cls.__table__.insert().from_select(
+                ['entity', 'entity_id', 'action', 'order_id', 'conversation_id', 'user_id', 'listed'], select
+            )
+        )
+
+    @staticmethod
+    def db_now():
+        """数据库当前时间（与 created_at 的默认值 now() 来源一致, 不受应用服务器时钟和时区影响）"""
+        return db.session.scalar(db.select(db.func.now()))
+
+    @classmethod
+    def safe_token(cls, since=0):
+        """
+        可以交给客户端的同步令牌: 不越过最近 CHANGELOG_GAP_SECONDS 秒内出现的序号空洞
+        空洞可能是尚未提交的事务 (之后会以更小的序号出现), 也可能是已回滚的事务;
+        超过该时间仍未出现的序号视为已回滚
+        :param since: 客户端当前的令牌, 返回值不小于它
+        """
+        grace = timedelta(seconds=current_app.config['CHANGELOG_GAP_SECONDS'])
+        cutoff = cls.db_now() - grace
+
+        # 最近写入的、前一个序号不存在的第一条记录
+        previous = db.aliased(cls)
+        first_gap = db.session.scalar(
+            db.select(db.func.min(cls.id)).where(
+                cls.id > since + 1,
+                cls.created_at >= cutoff,
+                ~db.exists().where(previous.id == cls.id - 1)
+            )
+        )
+        latest = db.select(db.func.max(cls.id)).where(cls.id > since)
+        if first_gap is not None:
+            latest = latest.where(cls.id < first_gap)
+        return db.session.scalar(latest) or since
+
+    @classmethod
+    def is_expired(cls, since):
+        """令牌之后的变更是否已被清理（flask prune-changelog），客户端需要重新全量同步"""
+        oldest = db.session.scalar(db.select(db.func.min(cls.id)))
+        return oldest is not None and since + 1 < oldest
+
+    @classmethod
+    def prune(cls, older_than, batch_size=1000):
+        """
+        分批删除早于 older_than（timedelta）的变更记录, 每批单独提交（始终保留最新一条, 用于判断令牌是否过期）
+        :return: 删除的行数
+        """
+        before = cls.db_now() - older_than
+        total = 0
+        while True:
+            latest = db.session.scalar(db.select(db.func.max(cls.id)))
+            ids = db.session.scalars(
+                db.select(cls.id).where(cls.created_at < before, cls.id < latest)
+                .order_by(cls.id).limit(batch_size)
+            ).all()
+            if not ids:
+                db.session.rollback()
+                return total
+            total += db.session.execute(db.delete(cls).where(cls.id.in_(ids))).rowcount
+            db.session.commit()
+
+    @classmethod
+    def get_visible_changes(cls, user_id, since, limit):
+        """
+        查询用户可见的、序号大于 since 的变更记录（按序号升序）
+        - 订单: 变更前后在订单广场上的订单对所有人可见, 其他订单仅对订单成员可见
+        - 订单参与者: 仅对订单成员可见
+        - 会话、会话成员和消息: 仅对会话成员可见
+        - 成员关系的变更（包括删除墓碑）始终对该成员可见
+        """
+        member_orders = db.union(
+            db.select(Order.order_id).where(Order.initiator_id == user_id),
+            db.select(OrderParticipant.order_id).where(OrderParticipant.participator_id == user_id)
+        )
+        member_conversations = db.select(ConversationParticipant.conversation_id).where(
+            ConversationParticipant.user_id == user_id
+        )
+
+        return cls.query.filter(
+            cls.id > since,
+            db.or_(
+                cls.listed.is_(True),
+                cls.user_id == user_id,
+                cls.order_id.in_(member_orders),
+                cls.conversation_id.in_(member_conversations)
+            )
+        ).order_by(cls.id.asc()).limit(limit).all()
+
+@event.listens_for(Session, 'after_flush')
+def record_flush_changes(session, flush_context):
+    ChangeLog.record_flush(session)
+
+@event.listens_for(Session, 'do_orm_execute')
+def record_bulk_changes(orm_execute_state):
+    # query.update()/db.update(Model) 等批量语句不会经过 flush
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in ChangeLog.TRACKED:
+        return
+    ChangeLog.record_bulk(
+        orm_execute_state.session,
+        mapper.class_,
+        orm_execute_state.statement.whereclause,
+        'delete' if orm_execute_state.is_delete else 'upsert'
+    )
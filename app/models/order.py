@@ -4,6 +4,7 @@ from enum import Enum
 from ..extensions import db
 from ..utils.logger import get_logger
 from ..models import User
+from .types import PreciseDateTime
 
 class OrderStatus(Enum):
     """订单状态枚举"""
@@ -65,7 +66,7 @@ class Order(db.Model):
     | initiator_id        | Integer                | NO   | MUL | NULL                | 发起人ID                    |
     | start_loc           | String(100)            | NO   | MUL | NULL                | 出发地(建立索引)            |
     | dest_loc            | String(100)            | NO   |     | NULL                | 目的地                      |
-    | start_time          | DateTime               | NO   |     | CURRENT_TIMESTAMP   | 出发时间                    |
+    | start_time          | DateTime               | NO   | MUL | CURRENT_TIMESTAMP   | 出发时间                    |
     | price               | Numeric(10,2)          | NO   |     | NULL                | 价格(精度:2位小数)          |
     | status              | Enum                   | NO   | MUL | 'not-started'       | 订单状态(建立索引)          |
     | order_type          | Enum                   | NO   |     | NULL                | 订单类型(人找车/车找人)     |
@@ -74,16 +75,20 @@ class Order(db.Model):
     | spare_seat_num      | Integer                | YES  |     | NULL                | 剩余座位(车找人订单)        |
     | rate                | Enum                   | YES  |     | NULL                | 评分(0-5)                  |
     | reject_reason       | String(200)            | YES  |     | NULL                | 拒绝原因                   |
+    | updated_at          | DateTime(6)            | NO   |     | now()               | 最后修改时间(ETag 版本)     |
     +---------------------+------------------------+------+-----+---------------------+-----------------------------+
     """
     __tablename__ = 'orders'
-    __table_args__ = {'comment': '拼车订单表'}
+    __table_args__ = (
+        db.Index('ix_orders_initiator_start', 'initiator_id', 'start_time'),  # 行程记录按发起人+时间倒序分页
+        {'comment': '拼车订单表'}
+    )
     
     order_id = db.Column(db.Integer, primary_key=True, autoincrement=True, comment='订单ID')
     initiator_id = db.Column(db.Integer, db.ForeignKey('user.user_id', ondelete='CASCADE'), comment='发起人ID')
     start_loc = db.Column(db.String(100), nullable=False, index=True, comment='出发地')
     dest_loc = db.Column(db.String(100), nullable=False, comment='目的地')
-    start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, comment='出发时间')
+    start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True, comment='出发时间')
     price = db.Column(db.Numeric(10, 2), nullable=False, comment='价格')
     status = db.Column(db.Enum(*OrderStatus.values(), name='order_status_enum'), default=OrderStatus.NOT_STARTED.value ,nullable=False, index=True, comment='订单状态')
     order_type = db.Column(db.Enum(*OrderType.values(), name='order_type_enum'), nullable=False, comment='订单类型')
@@ -92,6 +97,7 @@ class Order(db.Model):
     spare_seat_num = db.Column(db.Integer, nullable=True, comment='剩余座位(车找人订单)')
     rate = db.Column(db.Enum(*OrderRate.values(), name='order_rate_enum'), nullable=True, comment='评分')
     reject_reason = db.Column(db.String(200), nullable=True, comment='拒绝原因')
+    updated_at = db.Column(PreciseDateTime, nullable=False, default=datetime.now, onupdate=datetime.now, comment='最后修改时间')
 
     # 关联关系
     initiator = db.relationship('User', back_populates='initiated_orders')                                         # 订单发起者
@@ -180,3 +186,164 @@ class Order(db.Model):
             logger.error(f"订单创建失败: {str(e)}")
             return None, "数据库操作失败"
 
+
+    @classmethod
+    def reserve_seats(cls, order_id, seats=1):
+        """
+        原子占用座位: UPDATE ... SET spare_seat_num = spare_seat_num - n WHERE spare_seat_num >= n
+        由数据库保证并发请求不会超卖, 不依赖先读后写
+        语句不经过 flush, 占用成功后单独记录订单推送（提交后向订单广场订阅者推送剩余座位变化）
+        :return: 是否占用成功（剩余座位不足或订单不存在时为 False）
+        """
+        from ..extensions import order_feed
+        from ..utils.order_feed import order_snapshot
+
+        result = db.session.execute(
+            db.update(cls)
+            .where(cls.order_id == order_id, cls.spare_seat_num >= seats)
+            .values(spare_seat_num=cls.spare_seat_num - seats)
+            .execution_options(synchronize_session='fetch')
+        )
+        if result.rowcount != 1:
+            return False
+
+        after = order_snapshot(db.session.get(cls, order_id))
+        order_feed.record(db.session, {**after, 'spare_seat_num': after['spare_seat_num'] + seats}, after)
+        return True
+
+    @classmethod
+    def get_list_version(cls):
+        """
+        订单广场列表的版本信息（用于 ETag）：可见订单数、最大订单ID、订单及发起人的最后修改时间
+        列表中的日期按"今天/昨天"显示，因此版本中同时包含当天日期
+        """
+        row = db.session.query(
+            db.func.count(cls.order_id),
+            db.func.max(cls.order_id),
+            db.func.max(cls.updated_at),
+            db.func.max(User.updated_at)
+        ).join(
+            User, User.user_id == cls.initiator_id
+        ).filter(
+            cls.status == OrderStatus.NOT_STARTED.value
+        ).one()
+        return (*row, datetime.now().date())
+
+    @classmethod
+    def get_calendar_summary(cls, user_id, year, month):
+        """
+        获取用户某月的日历汇总（一次分组查询）
+        :param user_id: 用户ID（发起者或参与者）
+        :param year: 年份
+        :param month: 月份
+        :return: {'YYYY-MM-DD': {'count': n, 'orders': [...]}} 按日期分桶的字典
+        """
+        from app.models.order_participant import OrderParticipant
+
+        start_date = datetime(year, month, 1)
+        end_date = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+
+        membership = db.aliased(OrderParticipant)
+        is_participant = db.exists().where(
+            membership.order_id == cls.order_id,
+            membership.participator_id == user_id
+        )
+        rows = db.session.execute(
+            db.select(
+                cls.order_id,
+                cls.start_time,
+                cls.status,
+                db.func.count(OrderParticipant.participator_id)
+            ).outerjoin(
+                OrderParticipant, OrderParticipant.order_id == cls.order_id
+            ).where(
+                cls.start_time >= start_date,
+                cls.start_time < end_date,
+                db.or_(cls.initiator_id == user_id, is_participant)
+            ).group_by(
+                cls.order_id, cls.start_time, cls.status
+            ).order_by(cls.start_time.asc())
+        ).all()
+
+        days = {}
+        for order_id, start_time, status, participants_count in rows:
+            bucket = days.setdefault(start_time.date().isoformat(), {'count': 0, 'orders': []})
+            bucket['count'] += 1
+            bucket['orders'].append({
+                'order_id': order_id,
+                'time': start_time.strftime('%H:%M'),
+                'status': status,
+                'participants_count': participants_count
+            })
+        return days
+
+    @classmethod
+    def get_user_trip_rows(cls, user_id, limit=None, before=None, include_archived=False):
+        """
+        获取用户行程记录（发起的订单 UNION 参与的订单，按出发时间倒序）
+        两个分支分别走 (initiator_id, start_time) 和 order_participants 主键索引，
+        避免 initiator_id = ? OR order_id IN (...) 导致的全表扫描；
+        游标条件、排序和 LIMIT 在每个分支内执行，外层只对各分支的前 limit 行合并排序
+        :param user_id: 用户ID
+        :param limit: 返回条数（None 表示不限制）
+        :param before: 游标 (start_time, order_id)，只返回该位置之后（更早）的行程
+        :param include_archived: 是否同时查询归档订单表（同样的两个分支）
+        :return: 行程行列表（仅订单列与发起人是否有头像，不加载头像数据）
+        """
+        from app.models.order_participant import OrderParticipant
+        from app.models.user import User
+
+        def branches(orders, participants):
+            columns = (
+                orders.order_id,
+                orders.initiator_id,
+                orders.start_time,
+                orders.start_loc,
+                orders.dest_loc,
+                orders.price,
+                orders.car_type,
+                orders.status,
+                User.user_avatar.isnot(None).label('initiator_has_avatar')
+            )
+
+            def keyset(query):
+                if before is None:
+                    return query
+                start_time, order_id = before
+                return query.where(db.or_(
+                    orders.start_time < start_time,
+                    db.and_(orders.start_time == start_time, orders.order_id < order_id)
+                ))
+
+            def page(query):
+                """排序和条数下推到每个分支, 每个分支最多读取 limit 行, 而不是用户的全部行程"""
+                query = keyset(query)
+                if limit is None:
+                    return query
+                # SQLite 不允许 UNION 的分支直接带 ORDER BY / LIMIT, 包一层子查询
+                branch = query.order_by(orders.start_time.desc(), orders.order_id.desc()).limit(limit).subquery()
+                return db.select(*branch.c)
+
+            as_initiator = page(
+                db.select(*columns)
+                .join(User, User.user_id == orders.initiator_id)
+                .where(orders.initiator_id == user_id)
+            )
+            as_participant = page(
+                db.select(*columns)
+                .join(participants, participants.order_id == orders.order_id)
+                .join(User, User.user_id == orders.initiator_id)
+                .where(participants.participator_id == user_id)
+            )
+            return [as_initiator, as_participant]
+
+        selects = branches(cls, OrderParticipant)
+        if include_archived:
+            from app.models.archive import OrderArchive, OrderParticipantArchive
+            selects += branches(OrderArchive, OrderParticipantArchive)
+
+        trips = db.union(*selects).subquery()
+        query = db.select(trips).order_by(trips.c.start_time.desc(), trips.c.order_id.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        return db.session.execute(query).all()
@@ -29,7 +29,7 @@ class OrderParticipant(db.Model):
 
     # 复合主键
     participator_id = db.Column(db.Integer, db.ForeignKey('user.user_id', ondelete='CASCADE'), primary_key=True, comment='参与者ID')
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.order_id', ondelete='CASCADE'), primary_key=True, comment='订单ID')
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.order_id', ondelete='CASCADE'), primary_key=True, index=True, comment='订单ID')
     initiator_id = db.Column(db.Integer, db.ForeignKey('user.user_id', ondelete='CASCADE'), nullable=True, comment='发起人ID')
     identity = db.Column(db.Enum(*ParticipantIdentity.values(), name='order_type_enum'), nullable=False, comment='身份(driver/passenger)')
     # join_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, comment='加入时间')
@@ -66,4 +66,42 @@ class OrderParticipant(db.Model):
             initiator_id=initiator_id
         )
         
-        return participant, None
\ No newline at end of file
+        return participant, None
+    @classmethod
+    def get_brief_participants(cls, order_ids, include_archived=False):
+        """
+        批量获取订单参与者的精简信息（一次查询，不加载头像数据）
+        :param order_ids: 订单ID列表
+        :param include_archived: 是否同时查询归档的订单参与者
+        :return: {order_id: [{'id', 'name', 'has_avatar'}, ...]}
+        """
+        from app.models.user import User
+
+        participants = {order_id: [] for order_id in order_ids}
+        if not participants:
+            return participants
+
+        def select_from(table):
+            return db.select(
+                table.order_id,
+                User.user_id,
+                User.realname,
+                User.username,
+                User.user_avatar.isnot(None)
+            ).join(
+                User, User.user_id == table.participator_id
+            ).where(table.order_id.in_(participants.keys()))
+
+        query = select_from(cls)
+        if include_archived:
+            from app.models.archive import OrderParticipantArchive
+            query = db.union_all(query, select_from(OrderParticipantArchive))
+        rows = db.session.execute(query).all()
+
+        for order_id, user_id, realname, username, has_avatar in rows:
+            participants[order_id].append({
+                'id': user_id,
+                'name': realname or username,
+                'has_avatar': has_avatar
+            })
+        return participants
@@ -0,0 +1,192 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from ..extensions import db
+from .order import Order, OrderRate
+from .order_participant import OrderParticipant
+from .archive import OrderArchive, OrderParticipantArchive
+
+class OrderDailyStat(db.Model):
+    """
+    订单每日汇总表（管理后台统计用）
+    +---------------+----------------+------+-----+---------+-----------------------------+
+    | Field         | Type           | Null | Key | Default | Comment                     |
+    +---------------+----------------+------+-----+---------+-----------------------------+
+    | stat_date     | Date           | NO   | PRI | NULL    | 统计日期(订单出发日期)       |
+    | status        | String(20)     | NO   | PRI | NULL    | 订单状态                    |
+    | order_type    | String(20)     | NO   | PRI | NULL    | 订单类型                    |
+    | order_count   | Integer        | NO   |     | 0       | 订单数                      |
+    | gmv           | Numeric(14,2)  | NO   |     | 0       | 订单总额 sum(price)         |
+    | rating_sum    | Integer        | NO   |     | 0       | 评分总和                    |
+    | rating_count  | Integer        | NO   |     | 0       | 已评分订单数                 |
+    | matched_count | Integer        | NO   |     | 0       | 已成团订单数(参与者>1)       |
+    +---------------+----------------+------+-----+---------+-----------------------------+
+
+    汇总表按 (日期, 状态, 类型) 聚合 (包含已归档订单), 在订单状态或参与人数变化时按天增量刷新,
+    统计接口的查询量只与天数相关, 与订单数量无关.
+    同一天的刷新先锁定当天的汇总行再重新计算, 写入使用 upsert, 并发刷新不会因主键冲突失败.
+    MySQL 需使用 READ COMMITTED 隔离级别, 后刷新的事务才能读到先提交的事务修改的订单.
+    """
+    __tablename__ = 'order_daily_stats'
+    __table_args__ = {'comment': '订单每日汇总表'}
+
+    stat_date = db.Column(db.Date, primary_key=True, comment='统计日期')
+    status = db.Column(db.String(20), primary_key=True, comment='订单状态')
+    order_type = db.Column(db.String(20), primary_key=True, comment='订单类型')
+    order_count = db.Column(db.Integer, nullable=False, default=0, comment='订单数')
+    gmv = db.Column(db.Numeric(14, 2), nullable=False, default=0, comment='订单总额')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, comment='评分总和')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, comment='已评分订单数')
+    matched_count = db.Column(db.Integer, nullable=False, default=0, comment='已成团订单数')
+
+    VALUE_COLUMNS = ('order_count', 'gmv', 'rating_sum', 'rating_count', 'matched_count')
+
+    def __repr__(self):
+        return f'<OrderDailyStat {self.stat_date} {self.status} {self.order_type}: {self.order_count}>'
+
+    @staticmethod
+    def _aggregate(start=None, end=None):
+        """
+        按 (日期, 状态, 类型) 聚合订单表和归档订单表, 返回可直接写入汇总表的字典列表
+        :param start, end: 出发时间范围 [start, end)，为 None 时不限制
+        """
+        def branch(orders, participants):
+            participant_count = db.select(
+                db.func.count()
+            ).where(
+                participants.order_id == orders.order_id
+            ).correlate(orders).scalar_subquery()
+
+            query = db.select(
+                orders.start_time,
+                orders.status,
+                orders.order_type,
+                orders.order_id,
+                orders.price,
+                orders.rate,
+                participant_count.label('participant_count')
+            )
+            if start is not None:
+                query = query.where(orders.start_time >= start)
+            if end is not None:
+                query = query.where(orders.start_time < end)
+            return query
+
+        source = db.union_all(
+            branch(Order, OrderParticipant),
+            branch(OrderArchive, OrderParticipantArchive)
+        ).subquery()
+
+        stat_day = db.func.date(source.c.start_time)
+        # 评分列是 ENUM: MySQL 中 CAST(ENUM AS SIGNED) 得到的是枚举序号而不是字面值, 逐个值映射为整数
+        rating = db.case(*((source.c.rate == value, int(value)) for value in OrderRate.values()), else_=0)
+        rows = db.session.execute(
+            db.select(
+                stat_day.label('stat_date'),
+                source.c.status,
+                source.c.order_type,
+                db.func.count(source.c.order_id),
+                db.func.coalesce(db.func.sum(source.c.price), 0),
+                db.func.coalesce(db.func.sum(rating), 0),
+                db.func.count(source.c.rate),
+                db.func.coalesce(db.func.sum(db.case((source.c.participant_count > 1, 1), else_=0)), 0)
+            ).group_by(stat_day, source.c.status, source.c.order_type)
+        ).all()
+
+        stats = []
+        for day, status, order_type, count, gmv, rating_sum, rating_count, matched in rows:
+            # SQLite 的 date() 返回字符串, MySQL 返回 date
+            if isinstance(day, str):
+                day = date.fromisoformat(day)
+            elif isinstance(day, datetime):
+                day = day.date()
+            stats.append({
+                'stat_date': day,
+                'status': status,
+                'order_type': order_type,
+                'order_count': count,
+                'gmv': Decimal(str(gmv)),
+                'rating_sum': int(rating_sum),
+                'rating_count': rating_count,
+                'matched_count': int(matched)
+            })
+        return stats
+
+    @classmethod
+    def _lock_day(cls, day):
+        """
+        锁定某天的汇总行 (SELECT ... FOR UPDATE), 同一天的并发刷新在此排队
+        SQLite 写事务本身串行, 不需要行锁
+        :return: 当天已有的 (状态, 类型)
+        """
+        return {
+            (status, order_type) for status, order_type in db.session.execute(
+                db.select(cls.status, cls.order_type).where(cls.stat_date == day).with_for_update()
+            )
+        }
+
+    @classmethod
+    def _upsert(cls, stats):
+        """按主键写入汇总行, 已存在时覆盖统计值"""
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            statement = insert(cls)
+            values = statement.inserted
+            statement = statement.on_duplicate_key_update(**{
+                name: getattr(values, name) for name in cls.VALUE_COLUMNS
+            })
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+            statement = insert(cls)
+            statement = statement.on_conflict_do_update(
+                index_elements=[cls.stat_date, cls.status, cls.order_type],
+                set_={name: getattr(statement.excluded, name) for name in cls.VALUE_COLUMNS}
+            )
+        db.session.execute(statement, stats)
+
+    @classmethod
+    def refresh_days(cls, *days):
+        """
+        重新计算指定日期的汇总数据（在订单状态变化的同一事务中调用）
+        :param days: date 或 datetime 对象
+        """
+        # 按日期顺序加锁, 同时刷新多天的事务之间不会死锁
+        for day in sorted({d.date() if isinstance(d, datetime) else d for d in days if d}):
+            existing = cls._lock_day(day)
+            start = datetime.combine(day, datetime.min.time())
+            stats = cls._aggregate(start, start + timedelta(days=1))
+            if stats:
+                cls._upsert(stats)
+            # 当天已没有订单的 (状态, 类型) 组合
+            stale = existing - {(row['status'], row['order_type']) for row in stats}
+            if stale:
+                db.session.execute(db.delete(cls).where(
+                    cls.stat_date == day,
+                    db.or_(*(db.and_(cls.status == status, cls.order_type == order_type)
+                             for status, order_type in stale))
+                ))
+
+    @classmethod
+    def refresh_for(cls, *orders):
+        """刷新订单所在日期的汇总数据"""
+        cls.refresh_days(*(order.start_time for order in orders))
+
+    @classmethod
+    def rebuild(cls):
+        """
+        全量重建汇总表
+        :return: 写入的汇总行数
+        """
+        db.session.execute(db.delete(cls))
+        stats = cls._aggregate()
+        if stats:
+            db.session.execute(db.insert(cls), stats)
+        return len(stats)
+
+    @classmethod
+    def query_range(cls, start_date, end_date):
+        """查询日期区间内的汇总行（包含首尾）"""
+        return cls.query.filter(
+            cls.stat_date >= start_date,
+            cls.stat_date <= end_date
+        ).order_by(cls.stat_date.asc()).all()
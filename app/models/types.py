@@ -0,0 +1,6 @@
+from sqlalchemy.dialects import mysql
+from ..extensions import db
+
+# 精确到微秒的时间类型: MySQL 的 DATETIME 默认只保留到秒,
+# 同一秒内的多次修改会得到相同的 updated_at, 无法作为 ETag 等版本依据
+PreciseDateTime = db.DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql')
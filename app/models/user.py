@@ -1,11 +1,19 @@
 import base64
-from flask import current_app
+from collections import namedtuple
+from itsdangerous import Signer
+from flask import current_app, url_for, g, has_app_context
 from datetime import datetime
-from ..extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from ..extensions import db, passwords, cache
 from .association import user_car
+from .types import PreciseDateTime
 from ..utils.logger import get_logger
 
+# JWT 当前用户 (flask_jwt_extended.current_user) 的精简信息, 不含头像二进制数据和密码哈希
+UserIdentity = namedtuple('UserIdentity', ['user_id', 'username', 'realname', 'gender', 'status',
+                                           'has_avatar', 'is_manager'])
+
 class User(db.Model):
     """用户模型类"""
     __tablename__ = 'user'
@@ -24,6 +32,7 @@ class User(db.Model):
     order_time = db.Column(db.Integer, default=0, comment='订单次数')
     status = db.Column(db.Enum('在线', '离线', '隐身', name='user_status_enum'), nullable=False, default='离线', comment='用户状态')
     last_active = db.Column(db.DateTime, comment='最后活跃时间')
+    updated_at = db.Column(PreciseDateTime, nullable=False, default=datetime.now, onupdate=datetime.now, comment='最后修改时间')
 
     # 关系
     manager_role = db.relationship('Manager', back_populates='user', uselist=False, cascade='all, delete-orphan')  # 一对一
@@ -48,10 +57,14 @@ class User(db.Model):
     
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash(password)
     
     def verify_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """密码哈希的方法或参数与当前 PASSWORD_HASH_METHOD 配置不同"""
+        return passwords.needs_rehash(self.password_hash)
     
     # 更新最后活跃时间
     def update_last_active(self):
@@ -89,6 +102,125 @@ class User(db.Model):
             return default_avatar or current_app.config.get('DEFAULT_AVATAR_URL')
         return user.get_avatar_url(default_avatar)
     
+    @classmethod
+    def build_avatar_url(cls, user_id, has_avatar, default_avatar=None):
+        """
+        构造头像图片地址（不读取头像二进制数据）
+        :param user_id: 用户ID
+        :param has_avatar: 是否上传过头像（可用 User.user_avatar.isnot(None) 查询）
+        :param default_avatar: 可选，自定义默认头像URL
+        :return: 头像URL字符串
+        """
+        if not has_avatar:
+            return default_avatar or current_app.config.get('DEFAULT_AVATAR_URL')
+        # <image src> 无法携带 Authorization 请求头, 地址中附带签名代替登录校验, 不能通过遍历用户ID获取头像
+        return url_for('user_api.get_user_avatar_image', user_id=user_id, sig=cls.avatar_signature(user_id))
+
+    @staticmethod
+    def _avatar_signer():
+        return Signer(current_app.config['SECRET_KEY'], salt='user-avatar')
+
+    @classmethod
+    def avatar_signature(cls, user_id):
+        """头像图片地址的签名（由 SECRET_KEY 计算, 同一用户的地址不变, 可被客户端缓存）"""
+        return cls._avatar_signer().get_signature(str(int(user_id))).decode('ascii')
+
+    @classmethod
+    def verify_avatar_signature(cls, user_id, signature):
+        return bool(signature) and cls._avatar_signer().verify_signature(str(int(user_id)), signature)
+
+    @classmethod
+    def get_login_row(cls, username):
+        """
+        登录所需的列（不读取头像二进制数据, 一次查询同时得到是否上传头像和是否管理员）
+        :return: Row(user_id, username, identity_id, gender, password_hash, has_avatar, is_manager), 用户不存在时返回 None
+        """
+        from .manager import Manager
+        return db.session.execute(
+            db.select(
+                cls.user_id, cls.username, cls.identity_id, cls.gender, cls.password_hash,
+                cls.user_avatar.isnot(None).label('has_avatar'),
+                Manager.manager_id.isnot(None).label('is_manager')
+            ).outerjoin(Manager, Manager.user_id == cls.user_id)
+            .where(cls.username == username)
+            .limit(1)
+        ).first()
+
+    @classmethod
+    def get_identity(cls, user_id):
+        """
+        JWT 当前用户的精简信息: 先查请求内缓存, 再查进程内 jwt_user 缓存 (JWT_USER_CACHE_TTL 秒), 最后查询数据库
+        用户资料修改、上传头像、删除用户后调用 invalidate_identity 失效
+        :return: UserIdentity, 用户不存在时返回 None（不缓存, 用户注册后立即可用）
+        """
+        try:
+            key = str(int(user_id))
+        except (TypeError, ValueError):
+            return None
+        identities = g.setdefault('user_identities', {})
+        if key in identities:
+            return identities[key]
+
+        cache.configure('jwt_user',
+                        max_entries=current_app.config['JWT_USER_CACHE_SIZE'],
+                        ttl=current_app.config['JWT_USER_CACHE_TTL'])
+        identity = cache.get('jwt_user', key)
+        if identity is None:
+            from .manager import Manager
+            generation = cache.generation('jwt_user')
+            row = db.session.execute(
+                db.select(
+                    cls.user_id, cls.username, cls.realname, cls.gender, cls.status,
+                    cls.user_avatar.isnot(None).label('has_avatar'),
+                    Manager.manager_id.isnot(None).label('is_manager')
+                ).outerjoin(Manager, Manager.user_id == cls.user_id)
+                .where(cls.user_id == int(key))
+                .limit(1)
+            ).first()
+            if row is None:
+                return None
+            identity = UserIdentity(**row._asdict())
+            cache.set('jwt_user', key, identity, generation=generation)
+
+        identities[key] = identity
+        return identity
+
+    @classmethod
+    def invalidate_identity(cls, user_id):
+        """清除用户的 JWT 当前用户缓存（请求内和进程内）"""
+        key = str(int(user_id))
+        cache.delete('jwt_user', key)
+        if has_app_context():
+            g.get('user_identities', {}).pop(key, None)
+
+    @classmethod
+    def rehash_password(cls, user_id, password):
+        """按当前 PASSWORD_HASH_METHOD 重新计算并保存密码哈希（不加载用户对象）"""
+        db.session.execute(
+            db.update(cls).where(cls.user_id == user_id).values(password_hash=passwords.hash(password))
+        )
+
+    @classmethod
+    def get_profile_version(cls, user_id):
+        """
+        个人档案的版本信息（用于 ETag）：用户最后修改时间 + 名下车辆数量/ID/最后修改时间
+        :return: 元组，用户不存在时返回 None
+        """
+        from .car import Car
+
+        return db.session.query(
+            cls.updated_at,
+            db.func.count(Car.car_id),
+            db.func.coalesce(db.func.sum(Car.car_id), 0),
+            db.func.max(Car.updated_at)
+        ).outerjoin(
+            user_car, user_car.c.user_id == cls.user_id
+        ).outerjoin(
+            Car, Car.car_id == user_car.c.car_id
+        ).filter(
+            cls.user_id == user_id
+        ).group_by(cls.user_id, cls.updated_at).first()
+
     @classmethod
     def calculate_age(cls, indentity_id):
         """
@@ -103,12 +235,33 @@ class User(db.Model):
         age = (datetime.utcnow() - birth_date).days // 365
         return age
     
+    # 注册时需要唯一的字段, 按提示优先级排列
+    UNIQUE_FIELDS = ('username', 'telephone', 'identity_id')
+    CONFLICT = "用户名、手机号或身份证号已被注册"
+
+    @classmethod
+    def find_conflicts(cls, username, telephone, identity_id):
+        """
+        一次查询检查用户名、手机号、身份证号是否已被注册（三个字段均有唯一索引）
+        :return: 已被占用的字段名列表, 按 UNIQUE_FIELDS 顺序
+        """
+        rows = db.session.execute(
+            db.select(cls.username, cls.telephone, cls.identity_id).where(db.or_(
+                cls.username == username,
+                cls.telephone == telephone,
+                cls.identity_id == identity_id
+            )).limit(len(cls.UNIQUE_FIELDS))
+        ).all()
+        values = {'username': username, 'telephone': telephone, 'identity_id': identity_id}
+        return [field for field in cls.UNIQUE_FIELDS
+                if any(getattr(row, field) == values[field] for row in rows)]
+
     @staticmethod
     def create_user(data):
         """
-        创建用户信息（封装业务逻辑）
+        创建用户信息（封装业务逻辑, 一次插入一次提交）
         :param data: 包含用户信息的字典
-        :return: (user_object, error_message)
+        :return: (user_object, error_message), 唯一字段冲突 (并发注册) 时 error_message 为 CONFLICT
         """
         logger = get_logger(__name__)
 
@@ -119,15 +272,24 @@ class User(db.Model):
                 identity_id=data['identity_id'],
                 gender=data['gender'],
                 telephone=data['telephone'],
-                password_hash=generate_password_hash(data['password']),
-                user_avatar=None  # 默认头像
+                password_hash=passwords.hash(data['password']),
+                user_avatar=None,  # 默认头像
+                last_active=datetime.utcnow()
             )
             db.session.add(user)
-            user.update_last_active()
             db.session.commit()
 
-            return user, None       
+            return user, None
+        except IntegrityError as e:
+            db.session.rollback()
+            logger.warning(f"创建用户冲突: {str(e)}")
+            return None, User.CONFLICT
         except Exception as e:
             db.session.rollback()
             logger.error(f"创建用户失败: {str(e)}")
-            return None, "创建用户失败"
\ No newline at end of file
+            return None, "创建用户失败"
+
+@event.listens_for(User, 'after_delete')
+def invalidate_deleted_user_identity(mapper, connection, target):
+    """删除用户后, 其 token 不能再通过缓存的当前用户信息认证"""
+    User.invalidate_identity(target.user_id)
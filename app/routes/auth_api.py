@@ -1,13 +1,19 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
 from ..models import User, Manager
-from ..extensions import db
+from ..extensions import db, passwords
 from ..utils.logger import get_logger, log_requests
 from ..utils.Response import ApiResponse
-import base64
 
 auth_bp = Blueprint('auth_api', __name__)
 
+# 注册时唯一字段冲突的提示
+DUPLICATE_MESSAGES = {
+    'username': "用户名已经被注册",
+    'telephone': "手机号已被注册",
+    'identity_id': "身份证号已被注册",
+}
+
 @auth_bp.route('/register', methods=['POST'])
 @log_requests()
 def register():
@@ -15,28 +21,27 @@ def register():
     logger = get_logger(__name__)
     data = request.get_json()
    
-    # 检查用户名、手机号、身份证号是否已存在
-    if User.query.filter_by(username=data['username']).first():
-        response = ApiResponse.error(message="用户名已经被注册", code=400)
-        return response.to_json_response(400)
-
-    if User.query.filter_by(telephone=data['telephone']).first():
-        response = ApiResponse.error(message="手机号已被注册", code=400)
-        return response.to_json_response(400)
-    
-    if User.query.filter_by(identity_id=data['identity_id']).first():
-        response = ApiResponse.error(message="身份证号已被注册", code=400)
+    # 一次查询检查用户名、手机号、身份证号是否已存在
+    conflicts = User.find_conflicts(data['username'], data['telephone'], data['identity_id'])
+    if conflicts:
+        response = ApiResponse.error(message=DUPLICATE_MESSAGES[conflicts[0]], code=400)
         return response.to_json_response(400)
     
     user, error = User.create_user(data)
     
+    if error == User.CONFLICT:
+        # 检查之后被并发注册占用, 由唯一约束拦截
+        response = ApiResponse.error(message=error, code=409)
+        return response.to_json_response(409)
     if error:
         response = ApiResponse.error(message=f"用户注册失败: {error}", code=400)
         return response.to_json_response(400)
     
-    logger.success(f"用户注册成功: {user.user_id, user.username}")
+    # 提交后属性已过期, 从对象标识中取主键, 不再查询一次
+    user_id = db.inspect(user).identity[0]
+    logger.success(f"用户注册成功: {user_id, data['username']}")
 
-    response = ApiResponse.success(message="登录成功", data={"userId": user.user_id})
+    response = ApiResponse.success(message="登录成功", data={"userId": user_id})
     return response.to_json_response()
 
 @auth_bp.route('/login', methods=['POST'])
@@ -50,49 +55,46 @@ def login():
     username = data.get('username')
     password = data.get('password')
 
-    # 查找用户并校验密码
-    user = User.query.filter_by(username=username).first()
-    if not user or not user.verify_password(password):
+    # 只查询登录需要的列（不读取头像二进制数据）并校验密码
+    user = User.get_login_row(username)
+    if not user or not passwords.verify(user.password_hash, password):
         logger.warning(f"用户名或密码错误: {username}")
         return ApiResponse.error("用户名或密码错误", code=401).to_json_response(401)
-    
-    # 创建JWT token
-    access_token = create_access_token(
-        identity=str(user.user_id),
-        additional_claims={
-            "user_info": {
-                "ID": user.identity_id,
-                "username": user.username
-            }
+
+    # 哈希配置调整后, 用本次登录的明文密码按新参数重新计算
+    if passwords.needs_rehash(user.password_hash):
+        User.rehash_password(user.user_id, password)
+        db.session.commit()
+        logger.info(f"用户 {user.user_id} 的密码已按新的哈希参数更新")
+
+    # 创建JWT token, refresh_token 用于 /refresh 换取新的 access_token, 无需重新输入密码
+    claims = {
+        "user_info": {
+            "ID": user.identity_id,
+            "username": user.username
         }
-    )
-    
-    # 处理头像数据 - 如果是二进制数据则转换为base64
-    avatar_data = None
-    if user.user_avatar:
-        if isinstance(user.user_avatar, bytes):
-            avatar_data = f"data:image/jpeg;base64,{base64.b64encode(user.user_avatar).decode('utf-8')}"
-        else:
-            # 如果avatar是URL字符串，则直接使用
-            avatar_data = user.user_avatar
+    }
+    access_token = create_access_token(identity=str(user.user_id), additional_claims=claims)
+    refresh_token = create_refresh_token(identity=str(user.user_id), additional_claims=claims)
     
     logger.success(f"用户登录成功: {user.user_id, user.username}")
 
-    # 构建响应数据
+    # 构建响应数据（头像返回图片地址, 由客户端单独加载）
     user_data = {
         "userId": user.user_id,
         "username": user.username,
         "gender": user.gender,
-        "age": user.calculate_age(user.identity_id),
-        "avatar": avatar_data or current_app.config['DEFAULT_AVATAR_URL'],
-        "is_manager": user.is_manager
+        "age": User.calculate_age(user.identity_id),
+        "avatar": User.build_avatar_url(user.user_id, user.has_avatar),
+        "is_manager": bool(user.is_manager)
     }
 
     return ApiResponse.success(
         message="登录成功",
         data={
             "user": user_data,
-            "access_token": access_token
+            "access_token": access_token,
+            "refresh_token": refresh_token
         }
     ).to_json_response(200)
 
@@ -100,7 +102,10 @@ def login():
 @jwt_required(refresh=True)  # 必须用refresh_token
 def refresh():
     identity = get_jwt_identity()
-    new_token = create_access_token(identity=identity)
+    # 沿用 refresh_token 中的用户信息, 不查询数据库
+    user_info = get_jwt().get("user_info")
+    claims = {"user_info": user_info} if user_info else {}
+    new_token = create_access_token(identity=identity, additional_claims=claims)
     return jsonify({
         "code": 200,
         "message": "刷新成功",
@@ -3,39 +3,22 @@ import base64
 from datetime import datetime
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, current_user, get_jwt_identity
-from ..extensions import db, socketio
-from ..models import User, Conversation, Message, Order
+from ..extensions import db, outbox
+from ..models import User, Conversation, Message, Order, MessageArchive
 from ..models import ConversationParticipant as Participant
 from ..models.Chat_messgae import MessageType
 from ..utils.logger import get_logger, log_requests
 from ..utils.Response import ApiResponse
+from ..utils.etag import etag
+from ..utils.db_routing import read_replica
 
 chat_bp = Blueprint('chat', __name__)
 
-def get_or_create_private_conversation(user1_id, user2_id):
-    """查找或创建私聊会话"""
-    conv = Conversation.query.filter(
-        Conversation.type == 'private',
-        Conversation.participants.any(user_id=user1_id),
-        Conversation.participants.any(user_id=user2_id)
-    ).first()
-
-    if not conv:
-        conv = Conversation(type='private')
-        db.session.add(conv)
-        db.session.flush()  # 获取conv.id
-
-        db.session.add_all([
-            Participant(user_id=user1_id, conversation_id=conv.id),
-            Participant(user_id=user2_id, conversation_id=conv.id)
-        ])
-        db.session.commit()
-
-    return conv
-
 @chat_bp.route('/conversations', methods=['GET'])
 @jwt_required()
 @log_requests()
+@read_replica
+@etag(lambda: Conversation.get_list_version(get_jwt_identity()), per_user=True)
 def get_conversations():
     """获取当前用户的所有会话列表（包含最后一条消息）"""
     logger = get_logger(__name__)
@@ -57,11 +40,12 @@ def get_conversations():
             conversation = participant.conversation
 
             # 获取最后一条消息
+            # 获取最后一条消息（热表中的消息都已归档时取归档表中的最后一条）
             last_message = Message.query.filter_by(
                 conversation_id=conversation.id
             ).order_by(
                 Message.created_at.desc()
-            ).first()
+            ).first() or MessageArchive.latest(conversation.id)
 
             # 获取会话的其他参与者（排除自己）
             other_participants = Participant.query.filter(
@@ -132,7 +116,7 @@ def get_conversations():
 @jwt_required()
 @log_requests()
 def get_messages(conversation_id):
-    """获取指定会话的历史消息"""
+    """获取指定会话的历史消息（include_archived=true 时包含已归档的旧消息）"""
     logger = get_logger(__name__)
     current_user_id = get_jwt_identity()
     logger.info(f"获取会话 {conversation_id} 的消息记录")
@@ -153,6 +137,7 @@ def get_messages(conversation_id):
         # 获取查询参数
         before = request.args.get('before')
         before_time = datetime.fromisoformat(before) if before else None
+        include_archived = request.args.get('include_archived', 'false').lower() in ('1', 'true')
 
         # 构建基础查询
         query = Message.query.filter_by(
@@ -174,6 +159,11 @@ def get_messages(conversation_id):
             participant.last_read_message_id = last_message.id
             db.session.commit()
 
+        # 合并已归档的消息（已读位置只记录热表中的消息）
+        if include_archived:
+            messages = sorted(MessageArchive.history(conversation_id, before_time) + messages,
+                              key=lambda msg: (msg.created_at, msg.id))
+
         # 格式化响应数据
         messages_data = []
         for msg in messages:
@@ -245,7 +235,7 @@ def get_messages(conversation_id):
 def create_private_conversation():
     """创建私聊会话"""
     logger = get_logger(__name__)
-    current_user_id = get_jwt_identity()
+    current_user_id = int(get_jwt_identity())
     
     try:
         data = request.get_json()
@@ -262,12 +252,9 @@ def create_private_conversation():
         if not order or order.initiator_id != target_user_id:
             return ApiResponse.error("无效的订单ID").to_json_response(404)
 
-        # 获取或创建会话
-        conv = get_or_create_private_conversation(current_user_id, target_user_id)
-        
-        # 关联订单与会话
-        conv.trip_id = order_id
-        db.session.commit()
+        # 获取或创建会话（按成员对唯一，并发请求不会重复创建）
+        # 私聊按成员对复用, 不关联订单 (删除订单会级联删除关联的会话); 订单信息记录在消息和推送事件上
+        conv, _ = Conversation.get_or_create_private(current_user_id, target_user_id)
 
         # 获取对方用户信息
         target_user = User.query.get(target_user_id)
@@ -279,14 +266,15 @@ def create_private_conversation():
             'realname': target_user.realname
         }]
 
-        # 触发Socket事件
-        socketio.emit('conversation_created', {
+        # 触发Socket事件（提交成功后推送）
+        outbox.emit('conversation_created', {
             'conversation_id': conv.id,
             'initiator_id': current_user_id,
             'target_user_id': target_user_id,
             'order_id': order_id,
             'created_at': datetime.utcnow().isoformat()
         }, room=str(target_user_id))
+        db.session.commit()
 
         logger.success(f"私聊会话创建成功: {conv.id}")
         return ApiResponse.success(
@@ -303,6 +291,7 @@ def create_private_conversation():
         ).to_json_response(200)
 
     except Exception as e:
+        db.session.rollback()
         logger.error(f"创建私聊会话失败: {str(e)}", exc_info=True)
         return ApiResponse.error("服务器内部错误").to_json_response(500)
 
@@ -312,7 +301,7 @@ def create_private_conversation():
 def create_message():
     """发送初始消息"""
     logger = get_logger(__name__)
-    current_user_id = get_jwt_identity()
+    current_user_id = int(get_jwt_identity())
 
     try:
         data = request.get_json()
@@ -329,24 +318,19 @@ def create_message():
         if not participant:
             return ApiResponse.error("无权限发送消息").to_json_response(403)
 
+        # 关联订单（订单不存在时不关联）
+        order = Order.query.get(data['order_id']) if data['order_id'] else None
+
         # 创建消息记录
         new_message = Message(
             conversation_id=data['conversation_id'],
             sender_id=current_user_id,
             content=data['content'],
             message_type='invitation',
-            is_read=False
+            order_id=order.order_id if order else None
         )
         db.session.add(new_message)
-        db.session.commit()
-
-        # 关联订单
-        if data['order_id']:
-            order = Order.query.get(data['order_id'])
-            if order:
-                new_message.special_type = 'order_invitation'
-                new_message.order_id = order.order_id
-                db.session.commit()
+        db.session.flush()  # 获取消息ID和创建时间
 
         # 构造响应数据
         message_data = {
@@ -356,17 +340,17 @@ def create_message():
             'sender': {
                 'user_id': current_user_id,
                 'username': current_user.username,
-                'avatar': base64.b64encode(current_user.user_avatar).decode('utf-8') 
-                          if current_user.user_avatar else None
+                'avatar': User.build_avatar_url(current_user_id, current_user.has_avatar)
             },
             'order_id': data['order_id']
         }
 
-        # 触发Socket事件
-        socketio.emit('message_sent', {
+        # 触发Socket事件（提交成功后推送）
+        outbox.emit('message_sent', {
             'conversation_id': data['conversation_id'],
             **message_data
         }, room=str(data['conversation_id']))
+        db.session.commit()
 
         logger.success(f"初始消息发送成功: {new_message.id}")
         return ApiResponse.success(
@@ -375,5 +359,6 @@ def create_message():
         ).to_json_response(200)
 
     except Exception as e:
+        db.session.rollback()
         logger.error(f"消息发送失败: {str(e)}", exc_info=True)
         return ApiResponse.error("消息发送失败").to_json_response(500)
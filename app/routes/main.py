@@ -1,4 +1,8 @@
-from flask import Blueprint, jsonify
+from functools import wraps
+from flask import Blueprint, jsonify, request, current_app
+from ..extensions import cache, db, worker
+from ..utils.db_pool import get_pool_stats
+from ..utils.lifecycle import HEALTH_LISTENER
 
 # 创建蓝图实例
 main_bp = Blueprint('main', __name__)
@@ -12,4 +16,31 @@ def index():
 @main_bp.route('/hello/<name>')
 def hello(name):
     """Hello route"""
-    return jsonify({"greeting": f"Hello, {name}!"})
\ No newline at end of file
+    return jsonify({"greeting": f"Hello, {name}!"})
+
+def internal_only(f):
+    """只在 --health-port 内部监听端口开放的接口 (METRICS_PUBLIC=True 时也在服务端口开放)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not (request.environ.get(HEALTH_LISTENER) or current_app.config.get('METRICS_PUBLIC')):
+            return jsonify({"code": 403, "message": "指标接口只在内部端口开放"}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+@main_bp.route('/metrics/cache')
+@internal_only
+def cache_metrics():
+    """缓存命中率等指标（按命名空间）"""
+    return jsonify({"code": 200, "data": cache.stats()}), 200
+
+@main_bp.route('/metrics/db-pool')
+@internal_only
+def db_pool_metrics():
+    """数据库连接池状态及 checkout 等待时间"""
+    return jsonify({"code": 200, "data": get_pool_stats(db.engine)}), 200
+
+@main_bp.route('/health')
+def health():
+    """当前 worker 的健康状态 (优雅退出期间返回 503, 负载均衡据此摘除)"""
+    status = 503 if worker.draining else 200
+    return jsonify({"code": status, "data": worker.health()}), status
@@ -1,16 +1,20 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, g
 from datetime import datetime, timedelta
 from sqlalchemy import and_, or_
 from decimal import Decimal
-from ..extensions import db
+from ..extensions import db, cache
 import base64
-from ..models import Order, OrderParticipant, User, Car, Conversation, ConversationParticipant, Message
+from ..models import Order, OrderParticipant, User, Car, Conversation, ConversationParticipant, Message, OrderDailyStat
 from ..models.order import OrderStatus, OrderType
 from ..models.order_participant import ParticipantIdentity
 from ..models.Chat_conversation import ConversationType
 from ..models.Chat_messgae import MessageType
 from ..utils.logger import get_logger, log_requests
 from ..utils.Response import ApiResponse
+from ..utils.etag import etag
+from ..utils.db_routing import read_replica
+from ..services import ServiceError, order_workflow
+from ..services.order_workflow import get_order_member_ids, invalidate_user_calendars
 import json
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
@@ -31,6 +35,9 @@ def decimal_to_float(d):
 @order_bp.route('/list', methods=['GET'])
 @jwt_required()
 @log_requests()
+@read_replica
+@etag(Order.get_list_version)
+@cache.cached('orders_list', depends_on=(Order, User))
 def get_order_list():
     """获取订单列表"""
     logger = get_logger(__name__)
@@ -43,12 +50,8 @@ def get_order_list():
             db.joinedload(Order.initiator)
         )
 
-        # 排除不合理的订单（出发时间已过且未开始的订单）
-        current_time = datetime.utcnow()
-        query = query.filter(
-            Order.status.in_([OrderStatus.NOT_STARTED.value, OrderStatus.IN_PROGRESS.value]),
-            (Order.start_time > current_time)
-        )
+        # 只展示未出发的订单（出发后由订单调度器改为进行中）
+        query = query.filter(Order.status == OrderStatus.NOT_STARTED.value)
 
         # 执行查询获取全部结果
         all_orders = query.all()
@@ -121,8 +124,7 @@ def get_active_orders():
             db.joinedload(Order.initiator),
         ).filter(
             Order.initiator_id == current_user_id,  # 我发起的订单
-            Order.status.in_([OrderStatus.NOT_STARTED.value, OrderStatus.IN_PROGRESS.value]),
-            Order.start_time > datetime.utcnow()
+            Order.status.in_([OrderStatus.NOT_STARTED.value, OrderStatus.IN_PROGRESS.value])
         )
 
         # 执行查询
@@ -289,7 +291,11 @@ def create_order():
         )
         db.session.add(new_participant)
 
+        # 刷新订单统计汇总
+        OrderDailyStat.refresh_for(new_order)
+
         db.session.commit()  # 提交事务
+        invalidate_user_calendars({initiator_id, current_user_id}, start_time_dt)
 
         logger.success(f"订单创建成功，ID: {new_order.order_id}，会话ID: {new_conversation.id}")
         return ApiResponse.success(
@@ -309,61 +315,73 @@ def create_order():
             return ApiResponse.error("用户ID无效", code=400).to_json_response(200)
         return ApiResponse.error(f"创建订单失败: {str(e)}", code=500).to_json_response(200)
 
+def get_user_calendar(user_id, year, month):
+    """获取用户某月的日历汇总（优先读取缓存）"""
+    cache.configure('calendar',
+                    max_entries=current_app.config['CALENDAR_CACHE_SIZE'],
+                    ttl=current_app.config['CALENDAR_CACHE_TTL'])
+    key = f"{int(user_id)}:{year}:{month}"
+    # 读己之写的请求 (见 db_routing) 跳过缓存读取, 其他进程上的缓存可能还未失效
+    days = None if g.get('read_your_writes') else cache.get('calendar', key)
+    if days is None:
+        days = Order.get_calendar_summary(user_id, year, month)
+        cache.set('calendar', key, days)
+    return days
+
+def parse_calendar_params():
+    """
+    解析日历接口的 year/month 参数（支持 params JSON 或普通查询参数）
+    :return: (year, month, error_response)
+    """
+    params_str = request.args.get('params')
+    if params_str:
+        try:
+            params = json.loads(params_str)
+        except json.JSONDecodeError:
+            return None, None, (jsonify({"code": 400, "error": "params 参数格式错误，必须是有效的 JSON"}), 400)
+    else:
+        params = request.args
+
+    year = params.get('year')
+    month = params.get('month')
+
+    # 验证 year 和 month 是否存在
+    if not year or not month:
+        return None, None, (jsonify({"code": 400, "error": "缺少 year 或 month 参数"}), 400)
+
+    # 转换 year 和 month 为整数
+    try:
+        year = int(year)
+        month = int(month)
+    except ValueError:
+        return None, None, (jsonify({"code": 400, "error": "year 和 month 参数必须是整数"}), 400)
+
+    if not 1 <= month <= 12:
+        return None, None, (jsonify({"code": 400, "error": "无效的日期参数"}), 400)
+
+    return year, month, None
+
 @order_bp.route('/calendar/<int:user_id>', methods=['GET'])
 def get_calendar_orders(user_id):
     """获取日历视图的订单数据"""
     logger = get_logger(__name__)
     
     try:
-        # 从请求参数中获取 params
-        params_str = request.args.get('params')
-        if not params_str:
-            return jsonify({"code": 400, "error": "缺少 params 参数"}), 400
-        
-        # 解析 params 参数
-        try:
-            params = json.loads(params_str)
-            year = params.get('year')
-            month = params.get('month')
-        except json.JSONDecodeError:
-            return jsonify({"code": 400, "error": "params 参数格式错误，必须是有效的 JSON"}), 400
-        
-        # 验证 year 和 month 是否存在
-        if not year or not month:
-            return jsonify({"code": 400, "error": "缺少 year 或 month 参数"}), 400
-        
-        # 转换 year 和 month 为整数
-        try:
-            year = int(year)
-            month = int(month)
-        except ValueError:
-            return jsonify({"code": 400, "error": "year 和 month 参数必须是整数"}), 400
-        
-        # 计算月份的开始和结束日期
-        start_date = datetime(year, month, 1)
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1) - timedelta(seconds=1)
-        else:
-            end_date = datetime(year, month + 1, 1) - timedelta(seconds=1)
-        
-        print(start_date, end_date)
-        # 查询该用户在该月份内作为发起者或参与者的订单
+        year, month, error_response = parse_calendar_params()
+        if error_response:
+            return error_response
+
+        # 参与人数等按天汇总数据来自日历缓存，这里只需加载订单和发起人
+        days = get_user_calendar(user_id, year, month)
+        participants_count = {
+            item['order_id']: item['participants_count']
+            for bucket in days.values() for item in bucket['orders']
+        }
         orders = Order.query.filter(
-            and_(
-                Order.start_time >= start_date,
-                Order.start_time <= end_date,
-                or_(
-                    Order.initiator_id == user_id,
-                    Order.order_id.in_(
-                        db.session.query(OrderParticipant.order_id)
-                        .filter(OrderParticipant.participator_id == user_id)
-                    )
-                )
-            )
+            Order.order_id.in_(participants_count.keys())
         ).options(
-            db.joinedload(Order.initiator),
-            db.joinedload(Order.participants).joinedload(OrderParticipant.participator)
-        ).all()
+            db.joinedload(Order.initiator)
+        ).order_by(Order.start_time.asc()).all() if participants_count else []
         
         # 格式化返回数据
         orders_data = []
@@ -389,7 +407,7 @@ def get_calendar_orders(user_id):
                     'username': order.initiator.username,
                     'avatar': avatar_data or current_app.config['DEFAULT_AVATAR_URL']
                 },
-                'participants_count': len(order.participants)
+                'participants_count': participants_count[order.order_id]
             }
             orders_data.append(order_data)
 
@@ -412,6 +430,80 @@ def get_calendar_orders(user_id):
             "error": "获取日历数据失败"
         }), 500
 
+@order_bp.route('/calendar/<int:user_id>/summary', methods=['GET'])
+def get_calendar_summary(user_id):
+    """获取日历视图的按天汇总（订单ID、时间、人数）"""
+    logger = get_logger(__name__)
+
+    try:
+        year, month, error_response = parse_calendar_params()
+        if error_response:
+            return error_response
+
+        days = get_user_calendar(user_id, year, month)
+        return jsonify({
+            "code": 200,
+            "data": {
+                "year": year,
+                "month": month,
+                "days": [{'date': day, **bucket} for day, bucket in sorted(days.items())]
+            }
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error fetching calendar summary: {str(e)}")
+        return jsonify({
+            "code": 500,
+            "error": "获取日历数据失败"
+        }), 500
+
+def parse_trip_cursor(cursor):
+    """
+    解析行程分页游标（格式: 出发时间ISO_订单ID）
+    :return: (start_time, order_id) 或 None
+    """
+    if not cursor:
+        return None
+    start_time, _, order_id = cursor.rpartition('_')
+    return datetime.fromisoformat(start_time), int(order_id)
+
+def build_trip_page(user_id, limit=None, before=None, include_archived=False):
+    """
+    构造行程记录分页数据
+    :param include_archived: 是否包含已归档的订单
+    :return: (trips_data, next_cursor)
+    """
+    rows = Order.get_user_trip_rows(user_id, limit=limit, before=before, include_archived=include_archived)
+    participants = OrderParticipant.get_brief_participants([row.order_id for row in rows],
+                                                           include_archived=include_archived)
+
+    trips_data = []
+    for row in rows:
+        members = participants[row.order_id]
+        trips_data.append({
+            'id': row.order_id,
+            'date': row.start_time.isoformat(),
+            'startPoint': row.start_loc,
+            'endPoint': row.dest_loc,
+            'price': float(row.price),
+            'carType': row.car_type,
+            'userAvatar': User.build_avatar_url(row.initiator_id, row.initiator_has_avatar),
+            'orderCount': len(members),
+            'status': row.status,
+            'participants': [{
+                'id': member['id'],
+                'name': member['name'],
+                'avatar': User.build_avatar_url(member['id'], member['has_avatar'])
+            } for member in members]
+        })
+
+    # 只有取满一页时才可能还有下一页
+    next_cursor = None
+    if limit is not None and len(rows) == limit:
+        last = rows[-1]
+        next_cursor = f"{last.start_time.isoformat()}_{last.order_id}"
+    return trips_data, next_cursor
+
 @order_bp.route('/user/trips', methods=['GET'])
 @jwt_required()
 @log_requests()
@@ -425,49 +517,7 @@ def get_user_trips():
         # 查询数量限制
         limit = 3
 
-        # 构建基础查询
-        query = Order.query.filter(
-            or_(
-                Order.initiator_id == current_user_id,
-                Order.order_id.in_(
-                    db.session.query(OrderParticipant.order_id)
-                    .filter(OrderParticipant.participator_id == current_user_id)
-                )
-            )
-        ).options(
-            db.joinedload(Order.initiator),
-            db.joinedload(Order.participants).joinedload(OrderParticipant.participator)
-        ).order_by(Order.start_time.desc())
-
-        # 如果有limit参数则应用限制
-        if limit is not None:
-            query = query.limit(int(limit))
-        
-        orders = query.all()
-        
-        # 格式化返回数据
-        trips_data = []
-        for order in orders:
-            # 处理头像数据
-            avatar_data = None
-            if order.initiator.user_avatar:
-                if isinstance(order.initiator.user_avatar, bytes):
-                    avatar_data = f"data:image/jpeg;base64,{base64.b64encode(order.initiator.user_avatar).decode('utf-8')}"
-                else:
-                    avatar_data = order.initiator.user_avatar
-            
-            trip_data = {
-                'id': order.order_id,
-                'date': order.start_time.isoformat(),
-                'startPoint': order.start_loc,
-                'endPoint': order.dest_loc,
-                'price': float(order.price),
-                'carType': order.car_type,
-                'userAvatar': avatar_data or current_app.config['DEFAULT_AVATAR_URL'],
-                'orderCount': len(order.participants),
-                'status': order.status
-            }
-            trips_data.append(trip_data)
+        trips_data, _ = build_trip_page(current_user_id, limit=limit)
         
         logger.success(f"成功获取用户 {current_user_id} 的行程记录")
         return ApiResponse.success(
@@ -486,56 +536,34 @@ def get_user_trips():
 @jwt_required()
 @log_requests()
 def get_user_trip_list():
-    ""r"获取用户最近的行程记录"""
+    ""r"获取用户的行程记录（支持 limit + cursor 游标分页，下一页游标通过 X-Next-Cursor 响应头返回；include_archived=true 时包含已归档的订单）"""
     logger = get_logger(__name__)
     current_user_id = get_jwt_identity()
     logger.info(f"获取用户 {current_user_id} 的行程记录")
     
     try:
-        # 构建基础查询
-        orders = Order.query.filter(
-            or_(
-                Order.initiator_id == current_user_id,
-                Order.order_id.in_(
-                    db.session.query(OrderParticipant.order_id)
-                    .filter(OrderParticipant.participator_id == current_user_id)
-                )
-            )
-        ).options(
-            db.joinedload(Order.initiator),
-            db.joinedload(Order.participants).joinedload(OrderParticipant.participator)
-        ).order_by(Order.start_time.desc()).all()
-        
-        # 格式化返回数据
-        trips_data = []
-        for order in orders:
-            # 处理头像数据
-            avatar_data = None
-            if order.initiator.user_avatar:
-                if isinstance(order.initiator.user_avatar, bytes):
-                    avatar_data = f"data:image/jpeg;base64,{base64.b64encode(order.initiator.user_avatar).decode('utf-8')}"
-                else:
-                    avatar_data = order.initiator.user_avatar
-            
-            trip_data = {
-                'id': order.order_id,
-                'date': order.start_time.isoformat(),
-                'startPoint': order.start_loc,
-                'endPoint': order.dest_loc,
-                'price': float(order.price),
-                'carType': order.car_type,
-                'userAvatar': avatar_data or current_app.config['DEFAULT_AVATAR_URL'],
-                'orderCount': len(order.participants),
-                'status': order.status
-            }
-            trips_data.append(trip_data)
+        # 分页参数（不传 limit 时返回全部行程）
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit <= 0:
+            raise ValueError("limit 必须为正整数")
+        before = parse_trip_cursor(request.args.get('cursor'))
+        include_archived = request.args.get('include_archived', 'false').lower() in ('1', 'true')
+
+        trips_data, next_cursor = build_trip_page(current_user_id, limit=limit, before=before,
+                                                  include_archived=include_archived)
         
         logger.success(f"成功获取用户 {current_user_id} 的行程记录")
-        return ApiResponse.success(
+        response, status = ApiResponse.success(
             "获取行程记录成功",
             data=trips_data
         ).to_json_response(200)
-        
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response, status
+
+    except ValueError as e:
+        logger.warning(f"参数错误: {str(e)}")
+        return ApiResponse.error("请求参数错误", code=400).to_json_response(200)
     except Exception as e:
         logger.error(f"获取行程记录失败: {str(e)}")
         return ApiResponse.error(
@@ -544,6 +572,7 @@ def get_user_trip_list():
         ).to_json_response(200)
 
 @order_bp.route('/manage/list', methods=['GET'])
+@read_replica
 def get_managed_orders():
     """获取管理后台的订单列表"""
     logger = get_logger(__name__)
@@ -675,6 +704,76 @@ def get_managed_orders():
             "error": "获取订单列表失败"
         }), 500
 
+@order_bp.route('/manage/stats', methods=['GET'])
+def get_managed_order_stats():
+    """获取管理后台的订单统计（按日期/状态/类型汇总）"""
+    logger = get_logger(__name__)
+
+    try:
+        params_str = request.args.get('params')
+        if params_str:
+            try:
+                params = json.loads(params_str)
+            except json.JSONDecodeError:
+                return jsonify({"code": 400, "error": "参数格式错误，params 必须是有效的 JSON"}), 400
+        else:
+            params = request.args
+
+        # 日期区间，默认最近30天
+        try:
+            end_date = datetime.strptime(params['end'], '%Y-%m-%d').date() if params.get('end') else datetime.now().date()
+            start_date = datetime.strptime(params['start'], '%Y-%m-%d').date() if params.get('start') else end_date - timedelta(days=29)
+        except (ValueError, TypeError):
+            return jsonify({"code": 400, "error": "日期格式错误，请使用 YYYY-MM-DD"}), 400
+
+        if start_date > end_date:
+            return jsonify({"code": 400, "error": "开始日期不能晚于结束日期"}), 400
+
+        def new_bucket():
+            return {'order_count': 0, 'gmv': Decimal('0'), 'rating_sum': 0, 'rating_count': 0, 'matched_count': 0}
+
+        def add_to(bucket, row):
+            bucket['order_count'] += row.order_count
+            bucket['gmv'] += row.gmv or 0
+            bucket['rating_sum'] += row.rating_sum
+            bucket['rating_count'] += row.rating_count
+            bucket['matched_count'] += row.matched_count
+
+        def format_bucket(bucket):
+            return {
+                'order_count': bucket['order_count'],
+                'gmv': float(bucket['gmv']),
+                'avg_rating': round(bucket['rating_sum'] / bucket['rating_count'], 2) if bucket['rating_count'] else None,
+                'fill_rate': round(bucket['matched_count'] / bucket['order_count'], 4) if bucket['order_count'] else None
+            }
+
+        # 汇总表每天最多 (状态数 x 类型数) 行，查询量与天数成正比
+        summary = new_bucket()
+        by_day, by_status, by_type = {}, {}, {}
+        for row in OrderDailyStat.query_range(start_date, end_date):
+            add_to(summary, row)
+            add_to(by_day.setdefault(row.stat_date, new_bucket()), row)
+            add_to(by_status.setdefault(row.status, new_bucket()), row)
+            add_to(by_type.setdefault(row.order_type, new_bucket()), row)
+
+        return jsonify({
+            "code": 200,
+            "data": {
+                'range': {'start': start_date.isoformat(), 'end': end_date.isoformat()},
+                'summary': format_bucket(summary),
+                'by_day': [{'date': day.isoformat(), **format_bucket(bucket)} for day, bucket in sorted(by_day.items())],
+                'by_status': [{'status': status, **format_bucket(bucket)} for status, bucket in by_status.items()],
+                'by_type': [{'type': order_type, **format_bucket(bucket)} for order_type, bucket in by_type.items()]
+            }
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error fetching order stats: {str(e)}")
+        return jsonify({
+            "code": 500,
+            "error": "获取订单统计失败"
+        }), 500
+
 @order_bp.route('/manage/<int:order_id>/approve', methods=['POST'])
 def approve_order(order_id):
     """审核通过订单"""
@@ -690,7 +789,10 @@ def approve_order(order_id):
         
         # 更新状态为 not-started (根据业务需求)
         order.status = 'not-started'
+        OrderDailyStat.refresh_for(order)
+        member_ids, start_time = get_order_member_ids(order), order.start_time
         db.session.commit()
+        invalidate_user_calendars(member_ids, start_time)
         
         return jsonify({
             "code": 200,
@@ -725,7 +827,10 @@ def reject_order(order_id):
         # 更新状态和拒绝原因
         order.status = 'rejected'
         order.reject_reason = data['reason']
+        OrderDailyStat.refresh_for(order)
+        member_ids, start_time = get_order_member_ids(order), order.start_time
         db.session.commit()
+        invalidate_user_calendars(member_ids, start_time)
         
         return jsonify({
             "code": 200,
@@ -764,8 +869,12 @@ def rate_trip(order_id):
             return jsonify({"error": f"订单当前状态为 '{order.status}'，无法进行评分"}), 400
 
         # 更新订单评分和状态
+        order.rate = str(rating_value)
         order.status = "completed"  # 更新状态为 "已完成"
+        OrderDailyStat.refresh_for(order)
+        member_ids, start_time = get_order_member_ids(order), order.start_time
         db.session.commit()
+        invalidate_user_calendars(member_ids, start_time)
 
         print(f"订单 {order_id} 评分成功，评分为 {rating_value} 星。")
         return jsonify({"code": 200,"message": "评价提交成功！"}), 200
@@ -865,7 +974,10 @@ def mark_order_as_paid(order_id):
 
         # 更新订单状态为 completed
         order.status = 'to-review'
+        OrderDailyStat.refresh_for(order)
+        member_ids, start_time = get_order_member_ids(order), order.start_time
         db.session.commit()
+        invalidate_user_calendars(member_ids, start_time)
 
         logger.info(f"订单 {order_id} 已标记为已支付")
         return jsonify({"code": 200, "message": "订单支付成功"}), 200
@@ -895,8 +1007,13 @@ def delete_order(order_id):
             }), 403
 
         # 删除订单
+        member_ids = get_order_member_ids(order)
+        start_time = order.start_time
         db.session.delete(order)
+        db.session.flush()
+        OrderDailyStat.refresh_for(order)
         db.session.commit()
+        invalidate_user_calendars(member_ids, start_time)
         
         return jsonify({"code": 200, "message": "订单已删除"}), 200
         
@@ -906,6 +1023,8 @@ def delete_order(order_id):
         return jsonify({"code": 500, "message": "服务器错误"}), 500
     
 @order_bp.route('/not-started', methods=['GET'])
+@read_replica
+@cache.cached('orders_not_started', depends_on=(Order, User))
 def get_not_started_orders():
     """
     获取所有状态为not-started的订单列表
@@ -1044,50 +1163,9 @@ def driver_apply_order():
             return ApiResponse.error("您已参与此订单").to_json_response()
         
         # ===== 3. 创建/获取私聊会话 =====
-        # 查找现有私聊（两人之间的非订单会话）
-        existing_private = db.session.query(Conversation).join(
-            ConversationParticipant,
-            Conversation.id == ConversationParticipant.conversation_id
-        ).filter(
-            # 找私聊会话: 
-            # 会话的类型为"PRIVATE"
-            # 对应的订单为"None"
-            # 参与者的数量为2
-            Conversation.type == ConversationType.PRIVATE.value,
-            Conversation.order_id.is_(None),
-            ConversationParticipant.user_id.in_([current_user_id, order.initiator_id]),
-        ).group_by(Conversation.id).having(
-            # 查询会话参与者等于2的会话
-            db.func.count(ConversationParticipant.user_id.distinct()) == 2
-        ).first()
-
-        if existing_private:
-            conversation = existing_private
-            logger.info(f"找到现有私聊会话 {conversation.id}")
-        else:
-            # 创建新私聊会话
-            conversation = Conversation(
-                type=ConversationType.PRIVATE.value,
-                created_at=datetime.utcnow(),
-            )
-            db.session.add(conversation)
-            db.session.flush()  # 获取生成的ID
-
-            # 添加参与者
-            participants = [
-                ConversationParticipant(
-                    user_id=current_user_id,
-                    conversation_id=conversation.id,
-                    joined_at=datetime.utcnow()
-                ),
-                ConversationParticipant(
-                    user_id=order.initiator_id,
-                    conversation_id=conversation.id,
-                    joined_at=datetime.utcnow()
-                )
-            ]
-            db.session.bulk_save_objects(participants)
-            logger.info(f"创建新私聊会话 {conversation.id}")
+        # 两人之间的私聊会话按成员对唯一：一次索引查询，并发申请不会重复创建
+        conversation, is_new_conversation = Conversation.get_or_create_private(current_user_id, order.initiator_id)
+        logger.info(f"{'创建新' if is_new_conversation else '找到现有'}私聊会话 {conversation.id}")
 
         # ===== 4. 发送申请消息 =====
         driver = User.query.get(current_user_id)
@@ -1122,7 +1200,7 @@ def driver_apply_order():
             "conversation_id": conversation.id,
             "message_id": message.id,
             "order_status": order.status,
-            "is_new_conversation": not bool(existing_private)
+            "is_new_conversation": is_new_conversation
         }).to_json_response()
     
     except ValueError as e:
@@ -1177,50 +1255,9 @@ def passenger_apply_order():
                 return ApiResponse.error("座位已满").to_json_response()
             
         # ===== 4. 创建/获取私聊会话 =====
-        # 查找现有私聊（两人之间的非订单会话）
-        existing_private = db.session.query(Conversation).join(
-            ConversationParticipant,
-            Conversation.id == ConversationParticipant.conversation_id
-        ).filter(
-            # 找私聊会话: 
-            # 会话的类型为"PRIVATE"
-            # 对应的订单为"None"
-            # 参与者的数量为2
-            Conversation.type == ConversationType.PRIVATE.value,
-            Conversation.order_id.is_(None),
-            ConversationParticipant.user_id.in_([current_user_id, order.initiator_id]),
-        ).group_by(Conversation.id).having(
-            # 查询会话参与者等于2的会话
-            db.func.count(ConversationParticipant.user_id.distinct()) == 2
-        ).first()
-
-        if existing_private:
-            conversation = existing_private
-            logger.info(f"找到现有私聊会话 {conversation.id}")
-        else:
-            # 创建新私聊会话
-            conversation = Conversation(
-                type=ConversationType.PRIVATE.value,
-                created_at=datetime.utcnow(),
-            )
-            db.session.add(conversation)
-            db.session.flush()  # 获取生成的ID
-
-            # 添加参与者
-            participants = [
-                ConversationParticipant(
-                    user_id=current_user_id,
-                    conversation_id=conversation.id,
-                    joined_at=datetime.utcnow()
-                ),
-                ConversationParticipant(
-                    user_id=order.initiator_id,
-                    conversation_id=conversation.id,
-                    joined_at=datetime.utcnow()
-                )
-            ]
-            db.session.bulk_save_objects(participants)
-            logger.info(f"创建新私聊会话 {conversation.id}")
+        # 两人之间的私聊会话按成员对唯一：一次索引查询，并发申请不会重复创建
+        conversation, is_new_conversation = Conversation.get_or_create_private(current_user_id, order.initiator_id)
+        logger.info(f"{'创建新' if is_new_conversation else '找到现有'}私聊会话 {conversation.id}")
 
         # ===== 5. 发送申请消息 =====
         passenger = User.query.get(current_user_id)
@@ -1303,7 +1340,7 @@ def accept_application():
     """同意拼车/搭车申请"""
 
     logger = get_logger(__name__)
-    current_user_id = get_jwt_identity()
+    current_user_id = int(get_jwt_identity())
     data = request.get_json()
 
     try:
@@ -1316,96 +1353,22 @@ def accept_application():
         message_id = data['messageId']
         logger.info(f"用户 {current_user_id} 同意用户 {applicant_user_id} 加入订单 {order_id}")
 
-        # ==== 校验订单 ====
-        order = Order.query.get(order_id)
-        if not order:
-            return ApiResponse.error("订单不存在", code=404).to_json_response()
-        
-        # 只有订单发起人可以同意申请
-        if int(order.initiator_id) != int(current_user_id):
-            return ApiResponse.error(
-                f"您无权处理该申请。当前操作用户 ID 为 {current_user_id}，但该订单的发起人 ID 为 {order.initiator_id}。只有订单发起人可以进行此操作。",
-                code=403
-            ).to_json_response()
-        
-        # ==== 添加到订单参与者 ====
-        existing = OrderParticipant.query.filter_by(
-            order_id=order_id,
-            participator_id=applicant_user_id
-        ).first()
-
-        if not existing:
-            participant = OrderParticipant(
-                order_id=order_id,
-                participator_id=applicant_user_id,
-                initiator_id=current_user_id,
-                identity=ParticipantIdentity.PASSENGER.value, # 以乘客的身份加入
-            )
-            db.session.add(participant)
-            logger.info(f"用户 {applicant_user_id} 加入订单 {order_id}")
-        else:
-            logger.info(f"用户 {applicant_user_id} 已在订单 {order_id} 中")
-
-        # ==== 查找订单群聊会话 ====
-        conversation = Conversation.query.filter_by(
-            order_id=order_id,
-            type=ConversationType.GROUP.value
-        ).first()
-
-        # ==== 添加到会话参与者 ====
-        in_conversation = ConversationParticipant.query.filter_by(
-            conversation_id=conversation.id,
-            user_id=applicant_user_id
-        ).first()
-
-        if not in_conversation:
-            new_participant = ConversationParticipant(
-                user_id=applicant_user_id,
-                conversation_id=conversation.id,
-                joined_at=datetime.utcnow()
-            )
-            db.session.add(new_participant)
-            logger.info(f"用户 {applicant_user_id} 加入会话 {conversation.id}")
-
-        # ==== 系统消息通知 ====
-        inviter = User.query.get(current_user_id)     # 邀请者
-        applicant = User.query.get(applicant_user_id) # 申请者
-        # 邀请者发送申请者已经加入拼车的消息
-        message = Message(
-            conversation_id=conversation.id,
-            sender_id=current_user_id,
-            content=f"{applicant.username} 已加入拼车",
-            message_type=MessageType.TEXT.value,
-            created_at=datetime.utcnow()
-        )
-        db.session.add(message)
-
-        # ==== 更新参与群聊人员的未读消息数 ====
-        db.session.execute(
-            db.update(ConversationParticipant)
-            .where(
-                ConversationParticipant.conversation_id == conversation.id,
-            )
-            .values(unread_count=ConversationParticipant.unread_count + 1)
-        )
-        db.session.commit()
-
-        # ==== 更新聊天信息状态为ACCEPT ====
-        db.session.query(Message).filter_by(
-            id=message_id
-        ).update({
-            'message_type': MessageType.APPLY_JOIN_ACCEPT.value
-        })
-        db.session.commit() 
+        # ==== 加入订单与群聊、发送系统消息、更新申请消息状态（同一事务）====
+        result = order_workflow.accept_join_application(order_id, current_user_id, applicant_user_id, message_id)
+        invalidate_user_calendars(result.member_ids, result.start_time)
         
-        logger.success(f"用户 {current_user_id} 受邀请加入订单 {order_id} 成功")
+        logger.success(f"用户 {applicant_user_id} 加入订单 {order_id} 成功")
         return ApiResponse.success("已同意申请", data={
-            "conversation_id": conversation.id,
-            "message_id": message.id
+            "conversation_id": result.conversation_id,
+            "message_id": result.message_id
         }).to_json_response()
     except ValueError as e:
         logger.warning(f"参数错误: {str(e)}")
         return ApiResponse.error(str(e), code=400).to_json_response()
+    except ServiceError as e:
+        db.session.rollback()
+        logger.warning(f"接受申请失败: {e.message}")
+        return ApiResponse.error(e.message, code=e.code).to_json_response()
     except Exception as e:
         db.session.rollback()
         logger.error(f"接受申请失败: {str(e)}")
@@ -1418,7 +1381,7 @@ def reject_application():
     """拒绝拼车/搭车申请"""
 
     logger = get_logger(__name__)
-    current_user_id = get_jwt_identity()
+    current_user_id = int(get_jwt_identity())
     data = request.get_json()
 
     try:
@@ -1431,21 +1394,9 @@ def reject_application():
         message_id = data['messageId']
         logger.info(f"用户 {current_user_id} 拒绝用户 {applicant_user_id} 加入订单 {order_id}")
 
-        # ==== 校验订单 ====
-        order = Order.query.get(order_id)
-        if not order:
-            return ApiResponse.error("订单不存在", code=404).to_json_response()
-        
-        if order.initiator_id != current_user_id:
-            return ApiResponse.error("您无权处理该申请", code=403).to_json_response()
-        
         # ==== 更新聊天消息状态为 REJECT ====
-        db.session.query(Message).filter_by(
-            id=message_id
-        ).update({
-            'message_type': MessageType.APPLY_JOIN_REJECT.value
-        })
-        db.session.commit()
+        order_workflow.reject_request(order_id, current_user_id, message_id, MessageType.APPLY_JOIN_REJECT.value,
+                       forbidden_message="您无权处理该申请")
 
         logger.success(f"用户 {applicant_user_id} 的申请已被拒绝")
         return ApiResponse.success("已拒绝申请", data={
@@ -1455,6 +1406,10 @@ def reject_application():
     except ValueError as e:
         logger.warning(f"参数错误: {str(e)}")
         return ApiResponse.error(str(e), code=400).to_json_response()
+    except ServiceError as e:
+        db.session.rollback()
+        logger.warning(f"拒绝申请失败: {e.message}")
+        return ApiResponse.error(e.message, code=e.code).to_json_response()
     except Exception as e:
         db.session.rollback()
         logger.error(f"拒绝申请失败: {str(e)}")
@@ -1467,7 +1422,7 @@ def accept_order_application():
     """乘客同意司机接单"""
 
     logger = get_logger(__name__)
-    current_user_id = get_jwt_identity()
+    current_user_id = int(get_jwt_identity())
     data = request.get_json()
 
     try:
@@ -1480,91 +1435,23 @@ def accept_order_application():
         message_id = data['messageId']
         logger.info(f"用户 {current_user_id} 同意司机 {driver_user_id} 接单 {order_id}")
 
-        # ==== 校验订单 ====
-        order = Order.query.get(order_id)
-        if not order:
-            return ApiResponse.error("订单不存在", code=404).to_json_response()
-        
-        if int(order.initiator_id) != int(current_user_id):
-            return ApiResponse.error("您无权处理该接单申请", code=403).to_json_response()
-        
-        # ==== 添加司机为订单参与者 ====
-        existing = OrderParticipant.query.filter_by(
-            order_id=order_id,
-            participator_id=driver_user_id
-        ).first()
-
-        if not existing:
-            participant = OrderParticipant(
-                order_id=order_id,
-                participator_id=driver_user_id,
-                initiator_id=current_user_id,
-                identity=ParticipantIdentity.DRIVER.value, # 身份是司机
-            )
-            db.session.add(participant)
-            logger.info(f"司机 {driver_user_id} 加入订单 {order_id}")
-        else:
-            logger.info(f"司机 {driver_user_id} 已在订单 {order_id} 中")
-
-        # ==== 查找订单群聊会话 ====
-        conversation = Conversation.query.filter_by(
-            order_id=order_id,
-            type=ConversationType.GROUP.value
-        ).first()
-
-        if not conversation:
-            return ApiResponse.error("群聊未初始化", code=500).to_json_response()
-        
-        # ==== 添加到群聊参与者 ====
-        in_conversation = ConversationParticipant.query.filter_by(
-            conversation_id=conversation.id,
-            user_id=driver_user_id
-        ).first()
-
-        if not in_conversation:
-            new_participant = ConversationParticipant(
-                user_id=driver_user_id,
-                conversation_id=conversation.id,
-                joined_at=datetime.utcnow()
-            )
-            db.session.add(new_participant)
-            logger.info(f"司机 {driver_user_id} 加入会话 {conversation.id}")
-
-        # ==== 系统消息通知 ====
-        driver = User.query.get(driver_user_id)
-        message = Message(
-            conversation_id=conversation.id,
-            sender_id=current_user_id,
-            content=f"{driver.realname or driver.username} 已接单",
-            message_type=MessageType.TEXT.value,
-            created_at=datetime.utcnow()
-        )
-        db.session.add(message)
-
-        # ==== 更新群聊未读数 ====
-        db.session.execute(
-            db.update(ConversationParticipant)
-            .where(ConversationParticipant.conversation_id == conversation.id)
-            .values(unread_count=ConversationParticipant.unread_count + 1)
-        )
-
-        # ==== 更新原消息状态为 ACCEPT ====
-        db.session.query(Message).filter_by(
-            id=message_id
-        ).update({
-            'message_type': MessageType.APPLY_ORDER_ACCEPT.value
-        })
-        db.session.commit()
+        # ==== 司机加入订单与群聊、发送系统消息、更新接单消息状态（同一事务）====
+        result = order_workflow.accept_driver_application(order_id, current_user_id, driver_user_id, message_id)
+        invalidate_user_calendars(result.member_ids, result.start_time)
 
         logger.success(f"司机 {driver_user_id} 成功加入订单 {order_id}")
         return ApiResponse.success("接单成功", data={
-            "conversation_id": conversation.id,
-            "message_id": message.id
+            "conversation_id": result.conversation_id,
+            "message_id": result.message_id
         }).to_json_response()
     
     except ValueError as e:
         logger.warning(f"参数错误: {str(e)}")
         return ApiResponse.error(str(e), code=400).to_json_response()
+    except ServiceError as e:
+        db.session.rollback()
+        logger.warning(f"接单处理失败: {e.message}")
+        return ApiResponse.error(e.message, code=e.code).to_json_response()
     except Exception as e:
         db.session.rollback()
         logger.error(f"接单处理失败: {str(e)}")
@@ -1577,7 +1464,7 @@ def reject_order_application():
     """乘客拒绝司机接单申请"""
 
     logger = get_logger(__name__)
-    current_user_id = get_jwt_identity()
+    current_user_id = int(get_jwt_identity())
     data = request.get_json()
 
     try:
@@ -1590,21 +1477,9 @@ def reject_order_application():
         message_id = data['messageId']
         logger.info(f"用户 {current_user_id} 拒绝司机 {driver_user_id} 接单 {order_id}")
 
-         # ==== 校验订单 ====
-        order = Order.query.get(order_id)
-        if not order:
-            return ApiResponse.error("订单不存在", code=404).to_json_response()
-        
-        if order.initiator_id != current_user_id:
-            return ApiResponse.error("您无权处理该接单申请", code=403).to_json_response()
-
         # ==== 更新原申请消息状态为 REJECT ====
-        db.session.query(Message).filter_by(
-            id=message_id
-        ).update({
-            'message_type': MessageType.APPLY_ORDER_REJECT.value
-        })
-        db.session.commit()
+        order_workflow.reject_request(order_id, current_user_id, message_id, MessageType.APPLY_ORDER_REJECT.value,
+                       forbidden_message="您无权处理该接单申请")
 
         logger.success(f"用户 {current_user_id} 拒绝司机 {driver_user_id} 的接单申请成功")
         return ApiResponse.success("已拒绝接单申请", data={
@@ -1614,6 +1489,10 @@ def reject_order_application():
     except ValueError as e:
         logger.warning(f"参数错误: {str(e)}")
         return ApiResponse.error(str(e), code=400).to_json_response()
+    except ServiceError as e:
+        db.session.rollback()
+        logger.warning(f"拒绝接单失败: {e.message}")
+        return ApiResponse.error(e.message, code=e.code).to_json_response()
     except Exception as e:
         db.session.rollback()
         logger.error(f"拒绝接单失败: {str(e)}")
@@ -1626,7 +1505,7 @@ def accept_invitation():
     """乘客接受拼车邀请"""
 
     logger = get_logger(__name__)
-    current_user_id = get_jwt_identity()
+    current_user_id = int(get_jwt_identity())
     data = request.get_json()
 
     try:
@@ -1639,69 +1518,22 @@ def accept_invitation():
         message_id = data['messageId']
         logger.info(f"用户 {current_user_id} 接受 {passenger_user_id} 的拼车邀请 {order_id}")
 
-        # ==== 校验订单 ====
-        order = Order.query.get(order_id)
-        if not order:
-            return ApiResponse.error("订单不存在", code=404).to_json_response()
-        
-        # ==== 添加当前用户为订单参与者 ====
-        existing = OrderParticipant.query.filter_by(
-            order_id=order_id,
-            participator_id=current_user_id
-        ).first()
-
-        if not existing:
-            participant = OrderParticipant(
-                order_id=order_id,
-                participator_id=current_user_id,
-                initiator_id=passenger_user_id,
-                identity=ParticipantIdentity.PASSENGER.value,  # 身份是乘客
-            )
-            db.session.add(participant)
-            logger.info(f"乘客 {current_user_id} 加入订单 {order_id}")
-        else:
-            logger.info(f"乘客 {current_user_id} 已在订单 {order_id} 中")
-
-        # ==== 查找订单群聊会话 ====
-        conversation = Conversation.query.filter_by(
-            order_id=order_id,
-            type=ConversationType.GROUP.value
-        ).first()
-
-        if not conversation:
-            return ApiResponse.error("群聊未初始化", code=500).to_json_response()
-        
-        # ==== 添加到群聊参与者 ====
-        in_conversation = ConversationParticipant.query.filter_by(
-            conversation_id=conversation.id,
-            user_id=current_user_id
-        ).first()
-
-        if not in_conversation:
-            new_participant = ConversationParticipant(
-                user_id=current_user_id,
-                conversation_id=conversation.id,
-                joined_at=datetime.utcnow()
-            )
-            db.session.add(new_participant)
-            logger.info(f"乘客 {current_user_id} 加入会话 {conversation.id}")
-
-        # ==== 更新原消息状态为 ACCEPT ====
-        db.session.query(Message).filter_by(
-            id=message_id
-        ).update({
-            'message_type': MessageType.INVITATION_ACCEPT.value
-        })
-        db.session.commit()
+        # ==== 加入订单与群聊、更新邀请消息状态（同一事务）====
+        result = order_workflow.accept_invitation(order_id, current_user_id, passenger_user_id, message_id)
+        invalidate_user_calendars(result.member_ids, result.start_time)
 
         logger.success(f"乘客 {current_user_id} 成功加入订单 {order_id}")
         return ApiResponse.success("接受拼车邀请成功", data={
-            "conversation_id": conversation.id,
+            "conversation_id": result.conversation_id,
         }).to_json_response()
     
     except ValueError as e:
         logger.warning(f"参数错误: {str(e)}")
         return ApiResponse.error(str(e), code=400).to_json_response()
+    except ServiceError as e:
+        db.session.rollback()
+        logger.warning(f"接受拼车邀请失败: {e.message}")
+        return ApiResponse.error(e.message, code=e.code).to_json_response()
     except Exception as e:
         db.session.rollback()
         logger.error(f"接受拼车邀请失败: {str(e)}")
@@ -1714,7 +1546,7 @@ def reject_invitation():
     """乘客拒绝拼车邀请"""
 
     logger = get_logger(__name__)
-    current_user_id = get_jwt_identity()
+    current_user_id = int(get_jwt_identity())
     data = request.get_json()
 
     try:
@@ -1727,18 +1559,8 @@ def reject_invitation():
         message_id = data['messageId']
         logger.info(f"用户 {current_user_id} 拒绝 {passenger_user_id} 的拼车邀请 {order_id}")
 
-        # ==== 校验订单 ====
-        order = Order.query.get(order_id)
-        if not order:
-            return ApiResponse.error("订单不存在", code=404).to_json_response()
-        
         # ==== 更新原申请消息状态为 REJECT ====
-        db.session.query(Message).filter_by(
-            id=message_id
-        ).update({
-            'message_type': MessageType.INVITATION_REJECT.value
-        })
-        db.session.commit()
+        order_workflow.reject_request(order_id, current_user_id, message_id, MessageType.INVITATION_REJECT.value)
 
         logger.success(f"用户 {current_user_id} 拒绝拼车邀请成功")
         return ApiResponse.success("已拒绝拼车邀请", data={
@@ -1748,9 +1570,11 @@ def reject_invitation():
     except ValueError as e:
         logger.warning(f"参数错误: {str(e)}")
         return ApiResponse.error(str(e), code=400).to_json_response()
+    except ServiceError as e:
+        db.session.rollback()
+        logger.warning(f"拒绝拼车邀请失败: {e.message}")
+        return ApiResponse.error(e.message, code=e.code).to_json_response()
     except Exception as e:
         db.session.rollback()
         logger.error(f"拒绝拼车邀请失败: {str(e)}")
         return ApiResponse.error("拒绝拼车邀请失败", code=500).to_json_response()
-
-
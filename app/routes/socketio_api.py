@@ -1,10 +1,11 @@
 """与socketio相关的路由"""
 from datetime import datetime
-from ..extensions import socketio
+from ..extensions import socketio, order_feed
 from ..utils.logger import get_logger
 from ..extensions import db
 from ..models import User, Message, Conversation, ConversationParticipant, Order
 from ..models.Chat_messgae import MessageType
+from ..utils.order_feed import FeedFilter
 from flask import request, g
 from functools import wraps
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
@@ -97,6 +98,8 @@ def handle_disconnect():
     """处理断开连接事件"""
     logger = get_logger(__name__)
 
+    order_feed.index.unsubscribe(request.sid)
+
     user_id = next((k for k,v in online_users.items() if v == request.sid), None)
     if user_id:
         online_users.pop(user_id, None)
@@ -150,6 +153,29 @@ def handle_leave_conversation(data):
     leave_room(room)
     logger.info(f"用户 {user_id} 离开房间 {room}")
 
+@socketio.on('subscribe_orders_feed')
+@socketio_jwt_required
+def handle_subscribe_orders_feed(data=None):
+    """订阅订单广场实时推送（重复订阅会替换原有过滤条件）"""
+    logger = get_logger(__name__)
+
+    try:
+        feed_filter = FeedFilter.from_dict(data)
+    except (TypeError, ValueError) as e:
+        logger.warning(f"订阅参数错误: {str(e)}")
+        return {'code': 400, 'message': 'Invalid feed filter'}
+
+    order_feed.index.subscribe(request.sid, feed_filter)
+    logger.info(f"用户 {g.socketio_user['id']} 订阅订单推送: type={feed_filter.order_type}, keyword={feed_filter.keyword}")
+    return {'code': 200, 'message': 'Subscribed'}
+
+@socketio.on('unsubscribe_orders_feed')
+@socketio_jwt_required
+def handle_unsubscribe_orders_feed(data=None):
+    """取消订阅订单广场实时推送"""
+    order_feed.index.unsubscribe(request.sid)
+    return {'code': 200, 'message': 'Unsubscribed'}
+
 @socketio.on('send_message')
 @socketio_jwt_required
 def handle_send_message(data):
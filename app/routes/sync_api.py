@@ -0,0 +1,221 @@
+"""增量同步接口: 客户端携带上次的同步令牌, 只拉取之后发生变化的订单与会话数据"""
+from datetime import datetime
+from flask import Blueprint, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..extensions import db
+from ..models import Order, OrderParticipant, Conversation, ConversationParticipant, Message, ChangeLog
+from ..models.order import OrderStatus
+from ..utils.logger import get_logger, log_requests
+from ..utils.Response import ApiResponse
+
+sync_bp = Blueprint('sync_api', __name__)
+
+DEFAULT_SYNC_LIMIT = 500
+MAX_SYNC_LIMIT = 1000
+
+def format_time(dt):
+    return dt.isoformat() if isinstance(dt, datetime) else None
+
+def serialize_order(order):
+    return {
+        "order_id": order.order_id,
+        "initiator_id": order.initiator_id,
+        "start_loc": order.start_loc,
+        "dest_loc": order.dest_loc,
+        "start_time": format_time(order.start_time),
+        "price": float(order.price),
+        "status": order.status,
+        "order_type": order.order_type,
+        "car_type": order.car_type,
+        "travel_partner_num": order.travel_partner_num,
+        "spare_seat_num": order.spare_seat_num,
+        "rate": order.rate,
+        "updated_at": format_time(order.updated_at)
+    }
+
+def serialize_order_participant(participant):
+    return {
+        "order_id": participant.order_id,
+        "participator_id": participant.participator_id,
+        "initiator_id": participant.initiator_id,
+        "identity": participant.identity
+    }
+
+def serialize_conversation(conversation):
+    return {
+        "conversation_id": conversation.id,
+        "type": conversation.type,
+        "title": conversation.title,
+        "order_id": conversation.order_id,
+        "created_at": format_time(conversation.created_at),
+        "updated_at": format_time(conversation.updated_at)
+    }
+
+def serialize_conversation_participant(participant):
+    return {
+        "conversation_id": participant.conversation_id,
+        "user_id": participant.user_id,
+        "last_read_message_id": participant.last_read_message_id,
+        "unread_count": participant.unread_count
+    }
+
+def serialize_message(message):
+    return {
+        "message_id": message.id,
+        "conversation_id": message.conversation_id,
+        "sender_id": message.sender_id,
+        "content": message.content,
+        "type": message.message_type,
+        "order_id": message.order_id,
+        "created_at": format_time(message.created_at)
+    }
+
+# 实体类型 -> (响应中的字段名, 模型, 主键字段, 序列化函数)
+SYNC_ENTITIES = {
+    'order': ('orders', Order, ('order_id',), serialize_order),
+    'order_participant': ('order_participants', OrderParticipant, ('order_id', 'participator_id'), serialize_order_participant),
+    'conversation': ('conversations', Conversation, ('id',), serialize_conversation),
+    'conversation_participant': ('conversation_participants', ConversationParticipant, ('conversation_id', 'user_id'), serialize_conversation_participant),
+    'message': ('messages', Message, ('id',), serialize_message),
+}
+
+def load_current_rows(model, key_fields, entity_ids):
+    """按主键批量读取实体的当前数据，返回 {entity_id: obj}"""
+    first_field = getattr(model, key_fields[0])
+    first_values = {int(entity_id.split(':')[0]) for entity_id in entity_ids}
+    rows = model.query.filter(first_field.in_(first_values)).all()
+
+    result = {}
+    for row in rows:
+        entity_id = ':'.join(str(getattr(row, field)) for field in key_fields)
+        if entity_id in entity_ids:
+            result[entity_id] = row
+    return result
+
+def split_entity_ids(entity_ids, user_id):
+    """成员关系主键 "对象ID:用户ID" 中属于指定用户的对象ID"""
+    return {int(entity_id.split(':')[0]) for entity_id in entity_ids if entity_id.split(':')[1] == str(user_id)}
+
+def resolve_orders(user_id, order_ids):
+    """
+    订单当前对用户是否可见: 订单成员, 或订单仍在订单广场上（未开始）
+    :return: (可见的订单 {entity_id: order}, 不再可见的订单 entity_id 集合)
+    """
+    orders = {order.order_id: order for order in Order.query.filter(Order.order_id.in_(order_ids))}
+    members = {
+        order_id for (order_id,) in db.session.query(OrderParticipant.order_id).filter(
+            OrderParticipant.order_id.in_(order_ids), OrderParticipant.participator_id == user_id
+        )
+    } | {order_id for order_id, order in orders.items() if order.initiator_id == user_id}
+
+    visible = {
+        str(order_id): order for order_id, order in orders.items()
+        if order_id in members or order.status == OrderStatus.NOT_STARTED.value
+    }
+    return visible, {str(order_id) for order_id in order_ids} - visible.keys()
+
+def resolve_conversations(user_id, conversation_ids):
+    """用户已不是成员（被移除或会话已删除）的会话 entity_id 集合"""
+    members = {
+        conversation_id for (conversation_id,) in db.session.query(ConversationParticipant.conversation_id).filter(
+            ConversationParticipant.conversation_id.in_(conversation_ids), ConversationParticipant.user_id == user_id
+        )
+    }
+    return {str(conversation_id) for conversation_id in conversation_ids - members}
+
+@sync_bp.route('', methods=['GET'])
+@jwt_required()
+@log_requests()
+def sync_changes():
+    """
+    增量同步
+    参数: since - 上次返回的同步令牌（缺省时只返回当前令牌）; limit - 每次最多读取的变更条数
+    返回: changes(变化后的最新数据) / deleted(被删除或不再可见的主键, 墓碑) / next(下次同步令牌) / has_more
+    同一变更可能在相邻两次同步中重复返回（见 ChangeLog.safe_token）, 客户端按主键覆盖或删除.
+    令牌之后的变更已被清理时返回 code=410, 客户端重新拉取全量列表后使用 data.next 继续增量同步.
+    """
+    logger = get_logger(__name__)
+    current_user_id = int(get_jwt_identity())
+
+    since = request.args.get('since')
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_SYNC_LIMIT)), MAX_SYNC_LIMIT)
+        since = int(since) if since is not None else None
+        if limit <= 0 or (since is not None and since < 0):
+            raise ValueError
+    except ValueError:
+        return ApiResponse.error("since/limit 参数必须是非负整数", code=400).to_json_response(200)
+
+    try:
+        changes = {name: [] for name, *_ in SYNC_ENTITIES.values()}
+        deleted = {name: [] for name, *_ in SYNC_ENTITIES.values()}
+
+        if since is None:
+            # 首次同步: 客户端先全量拉取列表, 之后从当前令牌开始增量同步
+            return ApiResponse.success("获取同步令牌成功", data={
+                "changes": changes,
+                "deleted": deleted,
+                "next": str(ChangeLog.safe_token()),
+                "has_more": False
+            }).to_json_response(200)
+
+        if ChangeLog.is_expired(since):
+            logger.info(f"用户 {current_user_id} 的同步令牌 {since} 已过期, 需要全量同步")
+            return ApiResponse.error("同步令牌已过期，请重新全量同步", code=410).set_data({
+                "resync": True,
+                "next": str(ChangeLog.safe_token())
+            }).to_json_response(200)
+
+        # 先确定令牌上限再读取变更: 上限之前的序号此时都已提交, 之后读取的变更不会遗漏
+        watermark = ChangeLog.safe_token(since)
+        logs = ChangeLog.get_visible_changes(current_user_id, since, limit + 1)
+        has_more = len(logs) > limit
+        logs = logs[:limit]
+
+        # 同一实体只保留最后一次变更
+        latest = {}
+        for log in logs:
+            latest[(log.entity, log.entity_id)] = log.action
+
+        def entity_ids(entity, action):
+            return {entity_id for (e, entity_id), a in latest.items() if e == entity and a == action}
+
+        for entity, (name, model, key_fields, serialize) in SYNC_ENTITIES.items():
+            upserts, removed = entity_ids(entity, 'upsert'), entity_ids(entity, 'delete')
+
+            if entity == 'order':
+                # 用户退出的订单、已离开订单广场的订单: 不是成员时按墓碑返回
+                left = split_entity_ids(entity_ids('order_participant', 'delete'), current_user_id)
+                candidates = {int(entity_id) for entity_id in upserts} | left
+                current, hidden = resolve_orders(current_user_id, candidates) if candidates else ({}, set())
+                removed |= hidden
+            elif entity == 'conversation':
+                current = load_current_rows(model, key_fields, upserts) if upserts else {}
+                left = split_entity_ids(entity_ids('conversation_participant', 'delete'), current_user_id)
+                removed |= resolve_conversations(current_user_id, left) if left else set()
+            else:
+                current = load_current_rows(model, key_fields, upserts) if upserts else {}
+            # 之后又被删除（删除记录不在本页）的实体同样按墓碑返回
+            removed |= upserts - current.keys()
+            current = {entity_id: row for entity_id, row in current.items() if entity_id not in removed}
+
+            changes[name] = [serialize(current[entity_id]) for entity_id in sorted(current)]
+            deleted[name] = sorted(removed)
+
+        # 令牌不越过可能尚未提交的序号; 停在空洞前时本页之后的变更等下次同步
+        if has_more and logs[-1].id <= watermark:
+            next_token = logs[-1].id
+        else:
+            next_token, has_more = watermark, False
+        logger.info(f"用户 {current_user_id} 增量同步 since={since}, 变更 {len(logs)} 条")
+        return ApiResponse.success("增量同步成功", data={
+            "changes": changes,
+            "deleted": deleted,
+            "next": str(next_token),
+            "has_more": has_more
+        }).to_json_response(200)
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"增量同步失败: {str(e)}", exc_info=True)
+        return ApiResponse.error("增量同步失败", code=500).to_json_response(200)
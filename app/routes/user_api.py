@@ -3,9 +3,10 @@ from datetime import datetime
 from ..models import User,Car
 from ..utils.logger import get_logger, log_requests
 from ..utils.Response import ApiResponse
+from ..utils.etag import etag
 from ..models.association import user_car
-from ..extensions import db
-from flask import Blueprint, jsonify, current_app, request
+from ..extensions import db, cache
+from flask import Blueprint, jsonify, current_app, request, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 user_bp = Blueprint('user_api', __name__)
@@ -13,6 +14,7 @@ user_bp = Blueprint('user_api', __name__)
 @user_bp.route('/basic', methods=['GET'])
 @jwt_required()
 @log_requests()
+@cache.cached('user_basic', per_user=True, depends_on=(User,))
 def get_user_basic():
     """
     获取用户基础信息
@@ -64,6 +66,7 @@ def get_user_basic():
 @user_bp.route('/profile', methods=['GET'])
 @jwt_required()
 @log_requests()
+@etag(lambda: User.get_profile_version(get_jwt_identity()), per_user=True)
 def get_user_profile():
     """
     获取用户完整档案（个人中心页面）
@@ -215,6 +218,7 @@ def upload_avatar(user_id):
         user.user_avatar = avatar_data
 
         db.session.commit()
+        User.invalidate_identity(user_id)
 
         logger.info(f"用户 {user_id} 上传头像成功")
         return jsonify({
@@ -273,6 +277,31 @@ def get_avatar():
             code=500
         ).to_json_response(200)
 
+@user_bp.route('/<int:user_id>/avatar', methods=['GET'])
+@jwt_required(optional=True)
+def get_user_avatar_image(user_id):
+    """
+    获取用户头像图片（二进制，供 <image src> 直接引用）
+    需要登录, 或使用 User.build_avatar_url 生成的带签名 (sig 参数) 的地址
+    """
+    logger = get_logger(__name__)
+
+    if get_jwt_identity() is None and not User.verify_avatar_signature(user_id, request.args.get('sig')):
+        return jsonify({"code": 401, "message": "未登录或头像地址无效"}), 401
+
+    try:
+        avatar = db.session.execute(
+            db.select(User.user_avatar).where(User.user_id == user_id)
+        ).scalar_one_or_none()
+        if not avatar:
+            return jsonify({"code": 404, "message": "头像不存在"}), 404
+
+        return Response(avatar, mimetype='image/jpeg')
+
+    except Exception as e:
+        logger.error(f"获取头像图片失败: {e}")
+        return jsonify({"code": 500, "message": "服务器错误"}), 500
+
 @user_bp.route('/update', methods=['POST'])
 @jwt_required()
 @log_requests()
@@ -307,6 +336,7 @@ def update_user():
             user.password = data['password']
 
         db.session.commit()
+        User.invalidate_identity(current_user_id)
     
         # 构建响应数据
         response_data = {
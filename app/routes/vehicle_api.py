@@ -2,7 +2,7 @@ from flask import Blueprint, jsonify, request
 from ..models import User, Car
 from ..models.association import user_car
 from ..utils.logger import get_logger, log_requests
-from ..extensions import db
+from ..extensions import db, cache
 from ..utils.Response import ApiResponse
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
@@ -11,6 +11,7 @@ vehicle_bp = Blueprint('vehicle_api', __name__)
 @vehicle_bp.route('', methods=['GET'])
 @jwt_required()
 @log_requests()
+@cache.cached('user_cars', per_user=True, depends_on=(User, Car))
 def get_user_cars():
     """
     获取当前用户的车辆列表
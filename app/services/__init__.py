@@ -0,0 +1,7 @@
+class ServiceError(Exception):
+    """业务流程错误（message 为返回给客户端的提示, code 为响应中的业务状态码）"""
+
+    def __init__(self, message, code=400):
+        super().__init__(message)
+        self.message = message
+        self.code = code
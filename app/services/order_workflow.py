@@ -0,0 +1,240 @@
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import and_, text
+from ..extensions import db, cache
+from ..models import Order, OrderParticipant, User, Conversation, ConversationParticipant, Message, OrderDailyStat
+from ..models.order import OrderType
+from ..models.order_participant import ParticipantIdentity
+from ..models.Chat_conversation import ConversationType
+from ..models.Chat_messgae import MessageType
+from ..utils.logger import get_logger
+from . import ServiceError
+
+"""
+订单申请流程（申请加入 / 司机接单 / 拼车邀请）的同意与拒绝
+
+每个操作只用一条查询读取所需的全部数据（订单、成员关系、群聊、用户）并锁定订单行,
+所有写入在同一个事务中提交; 同一订单上的并发同意按订单行锁串行执行.
+座位通过条件 UPDATE 原子扣减, 即使绕过行锁也不会超卖.
+流程出错时抛出 ServiceError, 由调用方回滚事务并返回错误响应.
+
+使用方法:
+try:
+    result = accept_join_application(order_id, operator_id=1, applicant_id=2, message_id=3)
+except ServiceError as e:
+    db.session.rollback()
+    return ApiResponse.error(e.message, code=e.code).to_json_response()
+invalidate_user_calendars(result.member_ids, result.start_time)
+"""
+
+# 一次加载的申请上下文: 订单 + 用户在订单/群聊中的成员记录 + 群聊 + 用户
+MembershipContext = namedtuple('MembershipContext', [
+    'order', 'order_participant', 'conversation', 'conversation_participant', 'user'
+])
+
+# 同意申请的结果: 群聊ID、系统消息ID、订单成员ID（用于清除日历缓存）、出发时间
+WorkflowResult = namedtuple('WorkflowResult', ['conversation_id', 'message_id', 'member_ids', 'start_time'])
+
+def get_order_member_ids(order):
+    """获取订单发起人与全部参与者ID（参与人数变化会影响所有成员的日历）"""
+    return get_members_by_order([order])[order.order_id]
+
+def get_members_by_order(orders):
+    """
+    批量获取多个订单的发起人与参与者ID（一次查询）
+    :param orders: 订单对象或订单快照（需包含 order_id / initiator_id）
+    :return: {order_id: {user_id, ...}}
+    """
+    def field(order, name):
+        return order[name] if isinstance(order, dict) else getattr(order, name)
+
+    members = {field(order, 'order_id'): {field(order, 'initiator_id')} - {None} for order in orders}
+    if members:
+        rows = db.session.query(
+            OrderParticipant.order_id, OrderParticipant.participator_id
+        ).filter(OrderParticipant.order_id.in_(members.keys()))
+        for order_id, participator_id in rows:
+            members[order_id].add(participator_id)
+    return members
+
+def invalidate_user_calendars(user_ids, start_time):
+    """订单创建、删除、成员或状态变化提交后, 清除相关用户对应月份的日历缓存"""
+    for user_id in user_ids:
+        cache.delete('calendar', f"{int(user_id)}:{start_time.year}:{start_time.month}")
+
+def _lock_order_row(order_id):
+    """
+    SQLite 不支持 SELECT ... FOR UPDATE: 先对订单行做一次空更新取得写锁,
+    使并发事务在读取订单之前排队, 效果与行锁一致
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        # 原生语句: 不触发 updated_at 的 onupdate, 也不经过会话事件
+        db.session.connection().execute(
+            text(f"UPDATE {Order.__tablename__} SET order_id = order_id WHERE order_id = :order_id"),
+            {'order_id': order_id}
+        )
+
+def load_membership_context(order_id, user_id, lock=True):
+    """
+    一条查询读取订单及用户在该订单中的成员关系
+    :param lock: 是否锁定订单行（SELECT ... FOR UPDATE），直到事务结束
+    :raises ServiceError: 订单不存在
+    """
+    if lock:
+        _lock_order_row(order_id)
+
+    query = db.session.query(
+        Order, OrderParticipant, Conversation, ConversationParticipant, User
+    ).outerjoin(
+        OrderParticipant, and_(
+            OrderParticipant.order_id == Order.order_id,
+            OrderParticipant.participator_id == user_id
+        )
+    ).outerjoin(
+        Conversation, and_(
+            Conversation.order_id == Order.order_id,
+            Conversation.type == ConversationType.GROUP.value
+        )
+    ).outerjoin(
+        ConversationParticipant, and_(
+            ConversationParticipant.conversation_id == Conversation.id,
+            ConversationParticipant.user_id == user_id
+        )
+    ).outerjoin(
+        User, User.user_id == user_id
+    ).filter(Order.order_id == order_id)
+
+    if lock:
+        query = query.with_for_update(of=Order)
+
+    row = query.first()
+    if row is None:
+        raise ServiceError("订单不存在", code=404)
+    return MembershipContext(*row)
+
+def _require_initiator(order, operator_id, message):
+    if int(order.initiator_id) != int(operator_id):
+        raise ServiceError(message, code=403)
+
+def _set_message_type(message_id, message_type):
+    """
+    更新申请/邀请消息的处理状态
+    通过 ORM 修改（而不是批量 UPDATE）, 触发 Message 映射事件刷新会话 updated_at, 会话 ETag 随之变化
+    """
+    message = db.session.get(Message, message_id)
+    if message is not None:
+        message.message_type = message_type
+
+def _join_order(context, user_id, initiator_id, identity):
+    """
+    将用户加入订单及订单群聊（已加入时跳过）
+    乘客加入车找人订单时原子占用一个座位（Order.reserve_seats）, 座位不足时抛出 ServiceError
+    参与人数变化后刷新订单统计汇总（已成团订单数由参与人数决定）
+    """
+    logger = get_logger(__name__)
+    order = context.order
+    if context.conversation is None:
+        raise ServiceError("群聊未初始化", code=500)
+
+    if context.order_participant is None:
+        if identity == ParticipantIdentity.PASSENGER.value and order.order_type == OrderType.CAR_FIND_PERSON.value:
+            if not Order.reserve_seats(order.order_id):
+                raise ServiceError("座位已满", code=409)
+
+        db.session.add(OrderParticipant(
+            order_id=order.order_id,
+            participator_id=user_id,
+            initiator_id=initiator_id,
+            identity=identity
+        ))
+        db.session.flush()
+        OrderDailyStat.refresh_for(order)
+        logger.info(f"用户 {user_id} 以 {identity} 身份加入订单 {order.order_id}")
+    else:
+        logger.info(f"用户 {user_id} 已在订单 {order.order_id} 中")
+
+    if context.conversation_participant is None:
+        db.session.add(ConversationParticipant(
+            user_id=user_id,
+            conversation_id=context.conversation.id,
+            joined_at=datetime.utcnow()
+        ))
+        logger.info(f"用户 {user_id} 加入会话 {context.conversation.id}")
+
+def _notify_group(conversation, sender_id, content):
+    """在订单群聊中发送系统通知并增加成员未读数"""
+    message = Message(
+        conversation_id=conversation.id,
+        sender_id=sender_id,
+        content=content,
+        message_type=MessageType.TEXT.value,
+        created_at=datetime.utcnow()
+    )
+    db.session.add(message)
+    db.session.execute(
+        db.update(ConversationParticipant)
+        .where(ConversationParticipant.conversation_id == conversation.id)
+        .values(unread_count=ConversationParticipant.unread_count + 1)
+    )
+    return message
+
+def _commit(context, message=None):
+    """计算订单成员并提交事务"""
+    member_ids = get_order_member_ids(context.order)
+    start_time = context.order.start_time
+    db.session.commit()
+    return WorkflowResult(
+        conversation_id=context.conversation.id,
+        message_id=message.id if message is not None else None,
+        member_ids=member_ids,
+        start_time=start_time
+    )
+
+def accept_join_application(order_id, operator_id, applicant_id, message_id):
+    """订单发起人同意乘客的拼车/搭车申请"""
+    context = load_membership_context(order_id, applicant_id)
+    if context.user is None:
+        raise ServiceError("申请用户不存在", code=404)
+    _require_initiator(
+        context.order, operator_id,
+        f"您无权处理该申请。当前操作用户 ID 为 {operator_id}，但该订单的发起人 ID 为 {context.order.initiator_id}。只有订单发起人可以进行此操作。"
+    )
+    _join_order(context, applicant_id, operator_id, ParticipantIdentity.PASSENGER.value)
+    message = _notify_group(context.conversation, operator_id, f"{context.user.username} 已加入拼车")
+    _set_message_type(message_id, MessageType.APPLY_JOIN_ACCEPT.value)
+    return _commit(context, message)
+
+def accept_driver_application(order_id, operator_id, driver_id, message_id):
+    """订单发起人（乘客）同意司机接单"""
+    context = load_membership_context(order_id, driver_id)
+    if context.user is None:
+        raise ServiceError("司机不存在", code=404)
+    _require_initiator(context.order, operator_id, "您无权处理该接单申请")
+    _join_order(context, driver_id, operator_id, ParticipantIdentity.DRIVER.value)
+    message = _notify_group(
+        context.conversation, operator_id,
+        f"{context.user.realname or context.user.username} 已接单"
+    )
+    _set_message_type(message_id, MessageType.APPLY_ORDER_ACCEPT.value)
+    return _commit(context, message)
+
+def accept_invitation(order_id, passenger_id, inviter_id, message_id):
+    """乘客接受拼车邀请"""
+    context = load_membership_context(order_id, passenger_id)
+    _join_order(context, passenger_id, inviter_id, ParticipantIdentity.PASSENGER.value)
+    _set_message_type(message_id, MessageType.INVITATION_ACCEPT.value)
+    return _commit(context)
+
+def reject_request(order_id, operator_id, message_id, message_type, forbidden_message=None):
+    """
+    拒绝申请或邀请: 只更新原消息状态
+    :param forbidden_message: 非订单发起人操作时的错误信息; 为 None 时不校验发起人（拒绝邀请）
+    """
+    order = db.session.query(Order.order_id, Order.initiator_id).filter(Order.order_id == order_id).first()
+    if order is None:
+        raise ServiceError("订单不存在", code=404)
+    if forbidden_message is not None:
+        _require_initiator(order, operator_id, forbidden_message)
+    _set_message_type(message_id, message_type)
+    db.session.commit()
+    return message_id
@@ -0,0 +1,315 @@
+import time
+import threading
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from typing import Any, Dict, Optional
+from flask import current_app, request, make_response, has_app_context, g
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .socketio_queue import BroadcastMixin
+
+"""
+进程内缓存子系统
+
+使用方法:
+# 1. 在扩展中初始化 (extensions.py)
+cache = Cache()
+cache.init_app(app, socketio)
+
+# 2. 直接读写命名空间缓存
+cache.set('calendar', '1:2025:5', value)
+cache.get('calendar', '1:2025:5')     # 命中返回值, 未命中返回 None
+cache.delete('calendar', '1:2025:5')
+
+# 3. 装饰只读接口 (放在 @log_requests() 之下), 相关模型提交修改后自动失效
+@order_bp.route('/list')
+@jwt_required()
+@log_requests()
+@cached('orders_list', depends_on=(Order, User))
+def get_order_list(): ...
+
+后端通过 CACHE_BACKEND 配置选择, 目前只有进程内的 memory 实现;
+实现 CacheBackend 接口即可替换为多进程共享的缓存 (如 Redis).
+配置了 SOCKETIO_MESSAGE_QUEUE 时, delete/clear (含模型提交后的自动失效) 经消息队列广播, 每个进程清除自己的缓存;
+未配置时只清除本进程的缓存, 其他进程上的缓存只能等过期.
+"""
+
+INVALIDATE_EVENT = '__cache_invalidate__'  # 进程间广播的内部事件 (见 socketio_queue.py)
+
+class CacheBackend:
+    """缓存后端接口（按命名空间隔离）"""
+
+    def get(self, namespace: str, key: str) -> Any:
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None,
+            generation: Optional[int] = None) -> None:
+        """写入缓存; generation 与当前命名空间代数不一致时放弃写入（期间发生过失效）"""
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self, namespace: str) -> None:
+        """清空命名空间并递增其代数"""
+        raise NotImplementedError
+
+    def generation(self, namespace: str) -> int:
+        raise NotImplementedError
+
+    def configure(self, namespace: str, max_entries: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        """设置命名空间的容量和默认过期时间"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError
+
+class MemoryCacheBackend(CacheBackend):
+    """进程内 TTL + LRU 缓存后端（每个命名空间单独限制容量）"""
+
+    def __init__(self, default_ttl: float = 30, max_entries: int = 1024):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data = defaultdict(OrderedDict)   # {namespace: {key: (expires_at, value)}}
+        self._generations = defaultdict(int)
+        self._options = {}                      # {namespace: {'max_entries', 'ttl'}}
+        self._metrics = defaultdict(lambda: {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expired': 0, 'invalidations': 0})
+
+    def configure(self, namespace, max_entries=None, ttl=None):
+        with self._lock:
+            options = self._options.setdefault(namespace, {})
+            if max_entries is not None:
+                options['max_entries'] = max_entries
+            if ttl is not None:
+                options['ttl'] = ttl
+
+    def get(self, namespace, key):
+        with self._lock:
+            entries = self._data[namespace]
+            metrics = self._metrics[namespace]
+            item = entries.get(key)
+            if item is None:
+                metrics['misses'] += 1
+                return None
+
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del entries[key]
+                metrics['expired'] += 1
+                metrics['misses'] += 1
+                return None
+
+            entries.move_to_end(key)
+            metrics['hits'] += 1
+            return value
+
+    def set(self, namespace, key, value, ttl=None, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generations[namespace]:
+                return
+
+            options = self._options.get(namespace, {})
+            ttl = ttl if ttl is not None else options.get('ttl', self.default_ttl)
+            expires_at = time.monotonic() + ttl if ttl else None
+
+            entries = self._data[namespace]
+            entries[key] = (expires_at, value)
+            entries.move_to_end(key)
+            self._metrics[namespace]['sets'] += 1
+
+            max_entries = options.get('max_entries', self.max_entries)
+            while len(entries) > max_entries:
+                entries.popitem(last=False)
+                self._metrics[namespace]['evictions'] += 1
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data[namespace].pop(key, None)
+            self._generations[namespace] += 1
+
+    def clear(self, namespace):
+        with self._lock:
+            self._data[namespace].clear()
+            self._generations[namespace] += 1
+            self._metrics[namespace]['invalidations'] += 1
+
+    def generation(self, namespace):
+        with self._lock:
+            return self._generations[namespace]
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for namespace, metrics in self._metrics.items():
+                lookups = metrics['hits'] + metrics['misses']
+                result[namespace] = {
+                    **metrics,
+                    'size': len(self._data[namespace]),
+                    'hit_rate': round(metrics['hits'] / lookups, 4) if lookups else None
+                }
+            return result
+
+# 可用的缓存后端（CACHE_BACKEND 配置项）
+BACKENDS = {
+    'memory': MemoryCacheBackend,
+}
+
+class Cache:
+    """缓存扩展: 管理当前应用的缓存后端以及模型 -> 命名空间的失效关系"""
+
+    def __init__(self):
+        self._dependencies = defaultdict(set)   # {模型类: {命名空间}}
+
+    def init_app(self, app, socketio=None):
+        backend_class = BACKENDS[app.config.get('CACHE_BACKEND', 'memory')]
+        backend = app.extensions['cache'] = backend_class(
+            default_ttl=app.config.get('CACHE_DEFAULT_TTL', 30),
+            max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024)
+        )
+        manager = socketio.server.manager if socketio is not None and socketio.server else None
+        if isinstance(manager, BroadcastMixin):
+            manager.on_broadcast(INVALIDATE_EVENT, lambda message: self._invalidate(backend, **message))
+            app.extensions['cache_queue'] = manager
+        self._register_session_events()
+
+    @staticmethod
+    def _invalidate(backend, namespace, key=None):
+        if key is None:
+            backend.clear(namespace)
+        else:
+            backend.delete(namespace, key)
+
+    def _broadcast_invalidate(self, namespace, key=None):
+        """清除所有进程 (未配置消息队列时为本进程) 中的缓存"""
+        queue = current_app.extensions.get('cache_queue')
+        if queue is not None:
+            queue.broadcast(INVALIDATE_EVENT, {'namespace': namespace, 'key': key})
+        else:
+            self._invalidate(self.backend, namespace, key)
+
+    @property
+    def backend(self) -> Optional[CacheBackend]:
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('cache')
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None and current_app.config.get('CACHE_ENABLED', True)
+
+    # ---- 直接读写 ----
+    def get(self, namespace, key):
+        return self.backend.get(namespace, key) if self.enabled else None
+
+    def set(self, namespace, key, value, ttl=None, generation=None):
+        if self.enabled:
+            self.backend.set(namespace, key, value, ttl=ttl, generation=generation)
+
+    def delete(self, namespace, key):
+        if self.backend is not None:
+            self._broadcast_invalidate(namespace, key)
+
+    def clear(self, namespace):
+        if self.backend is not None:
+            self._broadcast_invalidate(namespace)
+
+    def generation(self, namespace):
+        """命名空间当前代数（读取数据前获取, 写入时传给 set, 期间发生过失效则放弃写入）"""
+        return self.backend.generation(namespace) if self.enabled else None
+
+    def configure(self, namespace, max_entries=None, ttl=None):
+        if self.backend is not None:
+            self.backend.configure(namespace, max_entries=max_entries, ttl=ttl)
+
+    def stats(self):
+        return self.backend.stats() if self.backend is not None else {}
+
+    # ---- 自动失效 ----
+    def depends_on(self, namespace, *models):
+        """登记命名空间依赖的模型，这些模型提交修改后清空该命名空间"""
+        for model in models:
+            self._dependencies[model].add(namespace)
+
+    def invalidate_models(self, models):
+        """清空依赖于指定模型的所有命名空间"""
+        namespaces = set()
+        for model in models:
+            namespaces |= self._dependencies.get(model, set())
+        for namespace in namespaces:
+            self.clear(namespace)
+
+    def _register_session_events(self):
+        """监听 SQLAlchemy 会话事件：flush/批量语句记录被修改的模型，提交后统一失效"""
+        if event.contains(Session, 'after_commit', self._after_commit):
+            return
+        event.listen(Session, 'after_flush', self._after_flush)
+        event.listen(Session, 'do_orm_execute', self._do_orm_execute)
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_soft_rollback', self._after_rollback)
+
+    @staticmethod
+    def _changed_models(session):
+        return session.info.setdefault('cache_changed_models', set())
+
+    def _after_flush(self, session, flush_context):
+        changed = self._changed_models(session)
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            changed.add(type(obj))
+
+    def _do_orm_execute(self, orm_execute_state):
+        # query.update()/db.update(Model) 等批量语句不会经过 flush
+        if (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert) \
+                and orm_execute_state.bind_mapper is not None:
+            self._changed_models(orm_execute_state.session).add(orm_execute_state.bind_mapper.class_)
+
+    def _after_commit(self, session):
+        changed = session.info.pop('cache_changed_models', None)
+        if changed and has_app_context():
+            self.invalidate_models(changed)
+
+    def _after_rollback(self, session, previous_transaction):
+        # 只回滚到保存点 (或其中 flush 的子事务) 时, 外层事务之前的修改仍会提交, 保留待失效的模型
+        if previous_transaction.parent is None:
+            session.info.pop('cache_changed_models', None)
+
+    # ---- 接口装饰器 ----
+    def cached(self, namespace, ttl=None, per_user=False, depends_on=()):
+        """
+        缓存只读接口的成功响应（HTTP 200 且业务 code 为 200）
+
+        :param namespace: 缓存命名空间
+        :param ttl: 过期秒数，默认使用 CACHE_DEFAULT_TTL
+        :param per_user: 是否按当前 JWT 用户区分缓存（需位于 @jwt_required() 之下）
+        :param depends_on: 依赖的模型类，提交修改后自动失效
+        """
+        self.depends_on(namespace, *depends_on)
+
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if not self.enabled:
+                    return f(*args, **kwargs)
+
+                key = request.full_path
+                if per_user:
+                    key = f"{get_jwt_identity()}:{key}"
+
+                # 读己之写的请求 (见 db_routing) 跳过缓存读取, 直接查询主库
+                hit = None if g.get('read_your_writes') else self.backend.get(namespace, key)
+                if hit is not None:
+                    body, mimetype = hit
+                    return current_app.response_class(body, mimetype=mimetype), 200
+
+                generation = self.backend.generation(namespace)
+                response = make_response(f(*args, **kwargs))
+                if response.status_code == 200 and response.is_json \
+                        and (response.get_json(silent=True) or {}).get('code') == 200:
+                    self.backend.set(namespace, key, (response.get_data(), response.mimetype),
+                                     ttl=ttl, generation=generation)
+
+                # 保持 (response, status) 形式，兼容 log_requests
+                return response, response.status_code
+            return decorated_function
+        return decorator
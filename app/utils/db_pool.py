@@ -0,0 +1,133 @@
+import threading
+import time
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+"""
+数据库连接池配置与等待时间统计
+
+连接池参数按环境配置 (config.py 中的 DB_POOL_* 配置项), 启动时转换为 SQLALCHEMY_ENGINE_OPTIONS;
+如果配置类中已显式设置 SQLALCHEMY_ENGINE_OPTIONS, 则以显式配置为准.
+
+eventlet 下大量绿色线程共享同一个连接池, 池过小时请求会在 checkout 处排队,
+InstrumentedQueuePool 记录每次 checkout 的等待时间, 通过 /api/metrics/db-pool 查看.
+"""
+
+# 等待时间分布的桶上限（毫秒）
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+class PoolWaitStats:
+    """连接 checkout 等待时间统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            self.buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def record(self, wait, timed_out=False):
+        wait_ms = wait * 1000
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            for i, upper in enumerate(WAIT_BUCKETS_MS):
+                if wait_ms <= upper:
+                    self.buckets[i] += 1
+                    break
+            else:
+                self.buckets[-1] += 1
+
+    def percentile(self, pct):
+        """按桶估算等待时间分位数（返回桶上限, 毫秒）"""
+        with self._lock:
+            total = sum(self.buckets)
+            if not total:
+                return None
+            threshold = total * pct / 100
+            count = 0
+            for i, bucket in enumerate(self.buckets):
+                count += bucket
+                if count >= threshold:
+                    return WAIT_BUCKETS_MS[i] if i < len(WAIT_BUCKETS_MS) else None
+            return None
+
+    def to_dict(self):
+        with self._lock:
+            total = self.checkouts + self.timeouts
+            labels = [f"<={upper}ms" for upper in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / total * 1000, 3) if total else None,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'wait_histogram': dict(zip(labels, self.buckets))
+            }
+
+class InstrumentedQueuePool(QueuePool):
+    """记录 checkout 等待时间的 QueuePool（等待时间包含溢出连接的建立时间）"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+def is_memory_sqlite(uri):
+    """内存 SQLite 使用单连接池, 不支持连接池参数"""
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+def configure_engine_options(app):
+    """根据 DB_POOL_* 配置生成 SQLALCHEMY_ENGINE_OPTIONS（需在 db.init_app 之前调用）"""
+    if app.config.get('SQLALCHEMY_ENGINE_OPTIONS'):
+        return
+    if is_memory_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': app.config.get('DB_POOL_SIZE', 5),
+        'max_overflow': app.config.get('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': app.config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': app.config.get('DB_POOL_RECYCLE', -1),
+        'pool_pre_ping': app.config.get('DB_POOL_PRE_PING', False),
+    }
+
+def get_pool_stats(engine):
+    """连接池当前状态及等待时间统计"""
+    pool = engine.pool
+    stats = {'pool_class': type(pool).__name__, 'status': pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'checked_in': pool.checkedin()
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        stats['wait'] = pool.wait_stats.to_dict()
+    return stats
@@ -0,0 +1,145 @@
+import time
+from functools import wraps
+from flask import current_app, g, request, has_app_context, has_request_context, after_this_request
+from flask_jwt_extended import decode_token
+from itsdangerous import Signer, BadSignature
+from flask_sqlalchemy.session import Session as BaseSession
+from sqlalchemy import event
+
+"""
+读写分离: 只读接口使用从库 (SQLALCHEMY_BINDS 中的 replica), 写操作始终使用主库
+
+使用方法 (放在 @log_requests() 之下):
+@order_bp.route('/list')
+@jwt_required()
+@log_requests()
+@read_replica
+def get_order_list(): ...
+
+未配置 REPLICA_DATABASE_URL 时 read_replica 不起作用, 所有查询都走主库.
+用户提交修改后的 REPLICA_STICKY_SECONDS 秒内, 该用户的读请求仍走主库 (读己之写),
+避免从库复制延迟导致用户看不到自己刚提交的数据.
+粘滞标记除写入进程内缓存外, 还以签名 Cookie (用户ID:截止时间) 返回给客户端:
+多进程部署 (serve.py) 时后续请求落到其他 worker 也能识别, 不依赖进程内缓存.
+
+读己之写在每个请求开始时判断 (init_app 登记的 before_request), 结果记在 g.read_your_writes:
+@read_replica 据此改走主库, 缓存 (@cache.cached 与日历缓存) 据此跳过读取,
+避免其他 worker 上尚未失效的缓存返回用户自己修改前的数据.
+配置了从库或消息队列 (多进程) 时才记录粘滞标记; 单进程且没有从库时提交后缓存已同步失效, 不需要.
+"""
+
+REPLICA_BIND = 'replica'
+STICKY_NAMESPACE = 'replica_sticky'
+STICKY_COOKIE = 'replica_sticky'
+
+class RoutingSession(BaseSession):
+    """根据请求标记选择主库或从库的会话（flush 期间始终使用主库）"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('db_read_replica'):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def _current_user_id():
+    """
+    当前请求的用户ID（未携带或携带无效 Token 时返回 None）
+    只解码请求头中的 Token, 不触发用户查询, 接口是否经过 @jwt_required() 都可以使用
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header.startswith('Bearer '):
+        return None
+    try:
+        return decode_token(auth_header[7:])[current_app.config.get('JWT_IDENTITY_CLAIM', 'sub')]
+    except Exception:
+        return None
+
+def _sticky_backend():
+    return current_app.extensions.get('cache')
+
+def is_sticky(user_id):
+    """用户最近是否提交过修改"""
+    backend = _sticky_backend()
+    return user_id is not None and backend is not None and backend.get(STICKY_NAMESPACE, str(user_id)) is not None
+
+def mark_sticky(user_id):
+    backend = _sticky_backend()
+    if user_id is not None and backend is not None:
+        backend.set(STICKY_NAMESPACE, str(user_id), True, ttl=current_app.config.get('REPLICA_STICKY_SECONDS', 5))
+
+def _sticky_signer():
+    return Signer(current_app.config['SECRET_KEY'], salt='replica-sticky')
+
+def set_sticky_cookie(response, user_id):
+    """在响应中写入粘滞 Cookie"""
+    seconds = current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+    value = _sticky_signer().sign(f'{user_id}:{time.time() + seconds:.3f}').decode()
+    response.set_cookie(STICKY_COOKIE, value, max_age=max(1, round(seconds)), httponly=True, samesite='Lax')
+    return response
+
+def has_sticky_cookie(user_id):
+    """请求是否携带该用户未过期的粘滞 Cookie（截止时间超出粘滞时长的视为无效）"""
+    value = request.cookies.get(STICKY_COOKIE)
+    if user_id is None or not value:
+        return False
+    try:
+        cookie_user, until = _sticky_signer().unsign(value).decode().split(':')
+        remaining = float(until) - time.time()
+    except (BadSignature, ValueError):
+        return False
+    return cookie_user == str(user_id) and 0 < remaining <= current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+
+def _sticky_enabled():
+    """是否可能读到自己修改前的数据 (配置了从库, 或多进程部署时其他进程的缓存)"""
+    return REPLICA_BIND in current_app.config.get('SQLALCHEMY_BINDS', {}) \
+        or bool(current_app.config.get('SOCKETIO_MESSAGE_QUEUE'))
+
+def _resolve_read_your_writes():
+    """请求开始时判断当前用户是否在粘滞时间内 (进程内标记或粘滞 Cookie)"""
+    g.replica_sticky_cookie = False
+    g.read_your_writes = False
+    if _sticky_enabled():
+        user_id = _current_user_id()
+        g.read_your_writes = is_sticky(user_id) or has_sticky_cookie(user_id)
+
+def init_app(app):
+    app.before_request(_resolve_read_your_writes)
+
+def read_replica(f):
+    """只读接口装饰器: 使用从库查询, 最近提交过修改的用户除外"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if REPLICA_BIND not in current_app.config.get('SQLALCHEMY_BINDS', {}) or g.get('read_your_writes'):
+            # 读己之写: 走主库 (缓存同样跳过, 见 cache.cached)
+            return f(*args, **kwargs)
+
+        g.db_read_replica = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.db_read_replica = False
+    return decorated_function
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _record_write(session, flush_context):
+    session.info['replica_wrote'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _record_bulk_write(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['replica_wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _mark_writer_sticky(session):
+    if session.info.pop('replica_wrote', False) and has_request_context() and _sticky_enabled():
+        user_id = _current_user_id()
+        mark_sticky(user_id)
+        if user_id is not None and not g.get('replica_sticky_cookie'):
+            g.replica_sticky_cookie = True
+            after_this_request(lambda response: set_sticky_cookie(response, user_id))
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _discard_write(session, previous_transaction):
+    if previous_transaction.parent is None:  # 回滚到保存点时外层事务的写入仍有效
+        session.info.pop('replica_wrote', None)
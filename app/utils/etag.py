@@ -0,0 +1,55 @@
+import hashlib
+from functools import wraps
+from flask import current_app, request, make_response
+from flask_jwt_extended import get_jwt_identity
+from .logger import get_logger
+
+"""
+基于版本号的条件 GET (ETag / If-None-Match)
+
+ETag 由资源的版本信息（计数、最后修改时间等聚合查询结果）计算，而不是序列化后对响应体做哈希,
+客户端携带的 If-None-Match 匹配时直接返回 304, 不再执行视图函数中的查询和序列化.
+
+使用方法 (放在 @log_requests() 之下):
+@user_bp.route('/profile')
+@jwt_required()
+@log_requests()
+@etag(lambda: User.get_profile_version(get_jwt_identity()), per_user=True)
+def get_user_profile(): ...
+"""
+
+def etag(version_func, per_user=False):
+    """
+    条件 GET 装饰器
+
+    :param version_func: 返回资源版本的函数（参数同视图函数）, 返回 None 时不使用 ETag
+    :param per_user: 版本是否与当前 JWT 用户相关（需位于 @jwt_required() 之下）
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                version = version_func(*args, **kwargs)
+            except Exception as e:
+                get_logger(__name__).warning(f"计算资源版本失败, 跳过 ETag: {str(e)}")
+                return f(*args, **kwargs)
+
+            if version is None:
+                return f(*args, **kwargs)
+
+            scope = (get_jwt_identity(),) if per_user else ()
+            tag = hashlib.sha1(repr((request.full_path, *scope, tuple(version))).encode('utf-8')).hexdigest()
+
+            if request.if_none_match.contains_weak(tag):
+                response = current_app.response_class(status=304)
+                response.set_etag(tag, weak=True)
+                # 保持 (response, status) 形式，兼容 log_requests
+                return response, 304
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and response.is_json \
+                    and (response.get_json(silent=True) or {}).get('code') == 200:
+                response.set_etag(tag, weak=True)
+            return response, response.status_code
+        return decorated_function
+    return decorator
@@ -0,0 +1,13 @@
+import sys
+
+"""
+eventlet 运行环境检测
+
+只有 wsgi.py 在启动时 monkey_patch 并以 eventlet 运行服务, 测试、命令行和 flask run 不需要 eventlet.
+导入 eventlet 本身就需要约 0.3 秒 (加载绿色 DNS 等模块), 因此这里只检查已经导入的模块, 不触发导入.
+"""
+
+def eventlet_patched(module='socket'):
+    """当前进程是否已被 eventlet monkey_patch 指定模块"""
+    patcher = sys.modules.get('eventlet.patcher')
+    return patcher is not None and patcher.is_monkey_patched(module)
@@ -0,0 +1,80 @@
+import os
+import random
+import time
+
+"""
+单个服务进程 (worker) 的状态与优雅退出
+
+serve.py 以多进程方式启动服务时, 每个 worker 是一个独立的 wsgi.py 进程 (环境变量 WORKER_ID 为编号),
+各自持有一部分 Socket.IO 连接. worker 收到 SIGTERM (停止或滚动重启) 时:
+1. 标记为 draining, /api/health 返回 503, 负载均衡不再转发新请求
+2. 向本进程的每个连接推送 server_restart {'reconnect_after': 秒}, 然后断开连接;
+   客户端收到后等待 reconnect_after 秒 (随机抖动, 避免所有客户端同时重连) 再重新连接,
+   新连接由仍在运行的其他 worker 处理
+3. 停止接受新连接, 等待处理中的 HTTP 请求完成 (最多 WORKER_DRAIN_TIMEOUT 秒) 后退出
+
+只处理本进程的连接 (ignore_queue=True): 配置 SOCKETIO_MESSAGE_QUEUE 后, 普通的 emit 会经消息队列
+广播到所有 worker, 而重启通知只应发给即将退出的 worker 上的客户端.
+
+--health-port 的内部监听端口经 health_listener 包装, 请求带有 HEALTH_LISTENER 标记,
+只在内部端口开放的接口 (如 /api/metrics/*) 据此判断.
+"""
+
+RESTART_EVENT = 'server_restart'
+HEALTH_LISTENER = 'worker.health_listener'  # WSGI environ 键
+
+def health_listener(app):
+    """内部监听端口使用的 WSGI 应用: 标记请求来自该端口"""
+    def wsgi_app(environ, start_response):
+        environ[HEALTH_LISTENER] = True
+        return app(environ, start_response)
+    return wsgi_app
+
+class WorkerLifecycle:
+    """worker 健康状态与优雅退出"""
+
+    def __init__(self, app=None, socketio=None):
+        self.app = app
+        self.socketio = socketio
+        self.worker_id = os.getenv('WORKER_ID')
+        self.started_at = time.time()
+        self.draining = False
+        if app is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+
+    def local_sessions(self):
+        """本进程上的 Socket.IO 连接 [(命名空间, sid)]"""
+        manager = self.socketio.server.manager
+        return [
+            (namespace, sid)
+            for namespace in list(manager.get_namespaces())
+            for sid, _ in manager.get_participants(namespace, None)
+        ]
+
+    def health(self):
+        """当前 worker 的状态 (供 /api/health 返回)"""
+        return {
+            "status": "draining" if self.draining else "ok",
+            "worker": self.worker_id,
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started_at, 1),
+            "connections": len(self.local_sessions()),
+        }
+
+    def drain(self):
+        """
+        通知本进程的客户端重连并断开连接
+        :return: 断开的连接数
+        """
+        self.draining = True
+        jitter = self.app.config.get('WORKER_RECONNECT_JITTER', 5)
+        sessions = self.local_sessions()
+        for namespace, sid in sessions:
+            self.socketio.emit(RESTART_EVENT, {'reconnect_after': round(random.uniform(0, jitter), 1)},
+                               to=sid, namespace=namespace, ignore_queue=True)
+            self.socketio.server.disconnect(sid, namespace=namespace, ignore_queue=True)
+        return len(sessions)
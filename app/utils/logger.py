@@ -95,8 +95,8 @@ def setup_app_logger(app=None, log_dir: str = 'logs', max_bytes: int = 10*1024*1
     # 设置处理器和日志级别
     app.logger.addHandler(file_handler)
     app.logger.addHandler(console_handler)
-    # app.logger.setLevel(logging.DEBUG if app.debug else logging.INFO)
-    app.logger.setLevel(logging.DEBUG)
+    # 调试模式输出 DEBUG 日志, 否则从 INFO 开始 (LOG_LEVEL 配置优先)
+    app.logger.setLevel(app.config.get('LOG_LEVEL') or (logging.DEBUG if app.debug else logging.INFO))
     
     # 禁止传播到父记录器
     app.logger.propagate = False
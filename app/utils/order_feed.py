@@ -0,0 +1,228 @@
+import threading
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from .socketio_queue import BroadcastMixin
+
+"""
+订单广场实时推送 (Socket.IO 事件 orders_feed)
+
+客户端通过 subscribe_orders_feed 订阅并携带过滤条件:
+    {"orderType": "car-find-person", "keyword": "北京", "startAfter": "2025-05-01T00:00:00", "startBefore": ...}
+服务端在订单提交后按订阅条件推送增量:
+    {"op": "insert", "order": {...}}                      # 订单进入该订阅的范围
+    {"op": "update", "order_id": 1, "changes": {...}}     # 范围内订单字段变化
+    {"op": "delete", "order_id": 1}                       # 订单删除或离开该订阅的范围
+
+订阅按订单类型和出发地关键词建立索引, 新订单只需检查不同关键词的数量而不是全部订阅者.
+
+订阅索引在每个进程内. 配置了 SOCKETIO_MESSAGE_QUEUE (serve.py 多 worker、独立的调度进程) 时,
+订单变化以内部事件经消息队列广播到所有进程 (见 socketio_queue.py), 各进程按本地的订阅索引匹配后只推送给本进程上的客户端.
+"""
+
+FEED_EVENT = 'orders_feed'
+FEED_CHANGE_EVENT = '__orders_feed_change__'  # 内部事件, 不会发送给客户端
+FEED_STATUSES = ('not-started',)  # 与 /api/orders/list 展示范围一致 (已出发的订单由调度器改为 in-progress)
+FEED_FIELDS = ('order_id', 'initiator_id', 'order_type', 'start_loc', 'dest_loc', 'start_time',
+               'price', 'status', 'car_type', 'travel_partner_num', 'spare_seat_num')
+
+def _to_json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def _encode_snapshot(snapshot):
+    """订单快照转为可经消息队列传输的 JSON"""
+    return None if snapshot is None else {k: _to_json_value(v) for k, v in snapshot.items()}
+
+def _decode_snapshot(data):
+    """还原 _encode_snapshot 的结果 (出发时间用于订阅的时间范围匹配)"""
+    if data is None:
+        return None
+    return {**data, 'start_time': datetime.fromisoformat(data['start_time']) if data.get('start_time') else None}
+
+class FeedFilter:
+    """单个订阅的过滤条件"""
+
+    def __init__(self, order_type=None, keyword=None, start_after=None, start_before=None):
+        self.order_type = order_type or None
+        self.keyword = (keyword or '').strip() or None
+        self.start_after = start_after
+        self.start_before = start_before
+
+    @classmethod
+    def from_dict(cls, data):
+        """从客户端参数构造过滤条件，时间格式错误时抛出 ValueError"""
+        data = data or {}
+        # 订单时间按本地时间存储, 忽略客户端传入的时区
+        parse = lambda value: datetime.fromisoformat(value).replace(tzinfo=None) if value else None
+        return cls(
+            order_type=data.get('orderType'),
+            keyword=data.get('keyword'),
+            start_after=parse(data.get('startAfter')),
+            start_before=parse(data.get('startBefore'))
+        )
+
+    def match_time(self, snapshot):
+        start_time = snapshot['start_time']
+        if self.start_after and start_time < self.start_after:
+            return False
+        if self.start_before and start_time > self.start_before:
+            return False
+        return True
+
+class OrderFeedIndex:
+    """订阅索引: 订单类型 -> 关键词 -> {sid}"""
+
+    ANY = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filters = {}                                          # {sid: FeedFilter}
+        self._index = defaultdict(lambda: defaultdict(set))         # {order_type|ANY: {keyword|ANY: {sid}}}
+
+    def subscribe(self, sid, feed_filter):
+        with self._lock:
+            self._remove(sid)
+            self._filters[sid] = feed_filter
+            self._index[feed_filter.order_type][feed_filter.keyword].add(sid)
+
+    def unsubscribe(self, sid):
+        with self._lock:
+            self._remove(sid)
+
+    def _remove(self, sid):
+        feed_filter = self._filters.pop(sid, None)
+        if feed_filter is None:
+            return
+        by_keyword = self._index[feed_filter.order_type]
+        by_keyword[feed_filter.keyword].discard(sid)
+        if not by_keyword[feed_filter.keyword]:
+            del by_keyword[feed_filter.keyword]
+        if not by_keyword:
+            del self._index[feed_filter.order_type]
+
+    def __len__(self):
+        return len(self._filters)
+
+    def match(self, snapshot):
+        """返回订阅条件匹配该订单快照的 sid 集合（订单不在广场展示范围内时为空）"""
+        if snapshot is None or snapshot['status'] not in FEED_STATUSES:
+            return set()
+
+        with self._lock:
+            sids = set()
+            for order_type in (self.ANY, snapshot['order_type']):
+                by_keyword = self._index.get(order_type)
+                if not by_keyword:
+                    continue
+                for keyword, keyword_sids in by_keyword.items():
+                    if keyword is self.ANY or keyword in (snapshot['start_loc'] or ''):
+                        sids.update(sid for sid in keyword_sids if self._filters[sid].match_time(snapshot))
+            return sids
+
+    def route(self, before, after):
+        """
+        根据订单修改前后的快照计算每个订阅者收到的增量
+        :return: [(payload, {sid})]
+        """
+        before_sids = self.match(before)
+        after_sids = self.match(after)
+        deliveries = []
+
+        if after is not None and after_sids - before_sids:
+            deliveries.append(({'op': 'insert', 'order': {k: _to_json_value(v) for k, v in after.items()}},
+                               after_sids - before_sids))
+        if before is not None and before_sids - after_sids:
+            deliveries.append(({'op': 'delete', 'order_id': before['order_id']}, before_sids - after_sids))
+        if before is not None and after is not None and before_sids & after_sids:
+            changes = {k: _to_json_value(v) for k, v in after.items() if before.get(k) != v}
+            if changes:
+                deliveries.append(({'op': 'update', 'order_id': after['order_id'], 'changes': changes},
+                                   before_sids & after_sids))
+        return deliveries
+
+def order_snapshot(obj):
+    """订单推送使用的字段快照"""
+    return {field: getattr(obj, field) for field in FEED_FIELDS}
+
+def _previous_snapshot(obj):
+    """根据属性历史还原 flush 前的快照"""
+    state = inspect(obj)
+    snapshot = {}
+    for field in FEED_FIELDS:
+        history = state.attrs[field].history
+        snapshot[field] = history.deleted[0] if history.deleted else getattr(obj, field)
+    return snapshot
+
+class OrderFeed:
+    """订单推送: 在 flush 时记录订单快照, 事务提交后再推送, 回滚则丢弃"""
+
+    def __init__(self, socketio=None):
+        self.socketio = socketio
+        self.index = OrderFeedIndex()
+        self.broadcast = False  # 是否经消息队列广播到所有进程
+
+    def init_app(self, app, socketio):
+        self.socketio = socketio
+        manager = socketio.server.manager if socketio.server else None
+        self.broadcast = isinstance(manager, BroadcastMixin)
+        if self.broadcast:
+            manager.on_broadcast(FEED_CHANGE_EVENT, self._receive)
+        if not event.contains(Session, 'after_commit', self._after_commit):
+            event.listen(Session, 'after_flush', self._after_flush)
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_soft_rollback', self._after_rollback)
+
+    def _after_flush(self, session, flush_context):
+        from ..models import Order
+
+        pending = session.info.setdefault('order_feed_events', [])
+        for obj in session.new:
+            if isinstance(obj, Order):
+                pending.append((None, order_snapshot(obj)))
+        for obj in session.dirty:
+            if isinstance(obj, Order) and session.is_modified(obj, include_collections=False):
+                pending.append((_previous_snapshot(obj), order_snapshot(obj)))
+        for obj in session.deleted:
+            if isinstance(obj, Order):
+                pending.append((_previous_snapshot(obj), None))
+
+    def record(self, session, before, after):
+        """记录不经过 flush 的订单变化（如 Core UPDATE）, 与 flush 中的变化一样在提交后推送"""
+        session.info.setdefault('order_feed_events', []).append((before, after))
+
+    def _after_commit(self, session):
+        pending = session.info.pop('order_feed_events', None)
+        # 广播时其他进程上可能有订阅者, 不能只看本进程的索引
+        if pending and (self.broadcast or len(self.index)):
+            for before, after in pending:
+                self.publish(before, after)
+
+    def _after_rollback(self, session, previous_transaction):
+        # 只回滚到保存点 (或其中 flush 的子事务) 时外层事务仍可能提交, 暂不清空
+        if previous_transaction.parent is None:
+            session.info.pop('order_feed_events', None)
+
+    def publish(self, before, after):
+        """推送一次订单变化（before/after 为 None 表示新增/删除）"""
+        if self.broadcast:
+            # 本进程和队列上的其他进程都由 _receive 按各自的订阅索引推送
+            self.socketio.server.manager.broadcast(
+                FEED_CHANGE_EVENT, {'before': _encode_snapshot(before), 'after': _encode_snapshot(after)}
+            )
+        else:
+            self.deliver(before, after)
+
+    def deliver(self, before, after):
+        """按本进程的订阅索引推送给本进程上的客户端"""
+        for payload, sids in self.index.route(before, after):
+            self.socketio.emit(FEED_EVENT, payload, to=list(sids), ignore_queue=True)
+
+    def _receive(self, change):
+        """处理经消息队列广播的订单变化"""
+        self.deliver(_decode_snapshot(change['before']), _decode_snapshot(change['after']))
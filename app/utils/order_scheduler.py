@@ -0,0 +1,233 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import and_
+
+"""
+订单生命周期调度: 按出发时间自动推进订单状态
+
+    not-started --(出发时间)--> in-progress --(出发时间 + TRIP_DURATION)--> to-pay
+
+调度器用最小堆保存即将到期的状态变化 (到期时间, 订单ID, 原状态, 新状态),
+每隔 ORDER_SCHEDULER_INTERVAL 秒从数据库补充未来一段时间内到期的订单; 到期后按状态变化分组,
+每组一条 UPDATE 批量修改, 同一事务内刷新订单统计, 提交后向订单群聊推送 order_status_changed
+并从订单广场 (orders_feed) 移除已出发的订单, 同时清除订单成员的日历缓存 (配置了消息队列时广播到所有进程,
+见 app/utils/cache.py). 订单出发时间按本地时间存储.
+
+运行方式:
+# 1. 随服务启动 (wsgi.py 单进程运行时默认开启, serve.py 下需 ORDER_SCHEDULER_ENABLED=True), 在 eventlet 绿色线程中运行
+order_scheduler.start()
+
+# 2. 独立进程 (多实例部署时只需一个调度进程)
+flask order-scheduler           # 持续运行
+flask order-scheduler --once    # 处理当前已到期的订单后退出 (可由 cron 定时执行)
+
+独立进程没有 Socket.IO 客户端, 推送需经 SOCKETIO_MESSAGE_QUEUE 转发给服务进程;
+未配置消息队列时命令拒绝启动, 确需只推进状态而不推送时加 --no-push
+(此时服务进程上的日历缓存也不会被清除, 只能等 CALENDAR_CACHE_TTL 过期).
+"""
+
+STATUS_EVENT = 'order_status_changed'
+
+class OrderLifecycleScheduler:
+    """订单状态定时推进"""
+
+    def __init__(self, app=None, socketio=None):
+        self.app = app
+        self.socketio = socketio
+        self._heap = []           # [(due_at, order_id, from_status, to_status)]
+        self._queued = set()      # {(order_id, to_status)} 避免重复入堆
+        self._lock = threading.Lock()
+        self._running = False
+        if app is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+
+    def transitions(self):
+        """[(原状态, 新状态, 相对出发时间的偏移)]"""
+        from ..models.order import OrderStatus
+        trip_duration = timedelta(minutes=self.app.config['TRIP_DURATION_MINUTES'])
+        return [
+            (OrderStatus.NOT_STARTED.value, OrderStatus.IN_PROGRESS.value, timedelta(0)),
+            (OrderStatus.IN_PROGRESS.value, OrderStatus.TO_PAY.value, trip_duration),
+        ]
+
+    def __len__(self):
+        return len(self._heap)
+
+    def clear(self):
+        with self._lock:
+            self._heap.clear()
+            self._queued.clear()
+
+    def push(self, due_at, order_id, from_status, to_status):
+        with self._lock:
+            if (order_id, to_status) in self._queued:
+                return
+            self._queued.add((order_id, to_status))
+            heapq.heappush(self._heap, (due_at, order_id, from_status, to_status))
+
+    def next_due(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """取出所有已到期的状态变化"""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                self._queued.discard((entry[1], entry[3]))
+                due.append(entry)
+        return due
+
+    def load(self, now=None, horizon=None):
+        """从数据库补充在 now + horizon 之前到期的状态变化（需在应用上下文中调用）"""
+        from ..extensions import db
+        from ..models import Order
+
+        now = now or datetime.now()
+        until = now + (horizon if horizon is not None else self.horizon)
+        for from_status, to_status, offset in self.transitions():
+            rows = db.session.query(Order.order_id, Order.start_time).filter(
+                Order.status == from_status,
+                Order.start_time <= until - offset
+            ).all()
+            for order_id, start_time in rows:
+                self.push(start_time + offset, order_id, from_status, to_status)
+        db.session.rollback()  # 结束只读事务, 不长期占用连接
+
+    @property
+    def horizon(self):
+        """每次从数据库预取的时间窗口（两个调度周期）"""
+        return timedelta(seconds=self.app.config['ORDER_SCHEDULER_INTERVAL'] * 2)
+
+    def run_pending(self, now=None):
+        """
+        执行所有已到期的状态变化（需在应用上下文中调用）
+        :return: 实际修改的订单数
+        """
+        now = now or datetime.now()
+        groups = {}
+        for _, order_id, from_status, to_status in self.pop_due(now):
+            groups.setdefault((from_status, to_status), []).append(order_id)
+
+        offsets = {(from_status, to_status): offset for from_status, to_status, offset in self.transitions()}
+        changed = 0
+        for (from_status, to_status), order_ids in groups.items():
+            batch_size = self.app.config['ORDER_SCHEDULER_BATCH_SIZE']
+            for i in range(0, len(order_ids), batch_size):
+                changed += self.apply(order_ids[i:i + batch_size], from_status, to_status,
+                                      now - offsets[(from_status, to_status)])
+        return changed
+
+    def apply(self, order_ids, from_status, to_status, start_before):
+        """
+        批量修改一组订单的状态: 只修改仍处于原状态且确已到期的订单
+        （出发时间被修改过或已被其他进程处理的订单会被跳过）
+        """
+        from ..extensions import db, order_feed
+        from ..models import Order, Conversation, OrderDailyStat
+        from ..models.Chat_conversation import ConversationType
+        from ..services.order_workflow import get_members_by_order, invalidate_user_calendars
+        from .order_feed import order_snapshot
+        from .logger import get_logger
+
+        logger = get_logger(__name__)
+        try:
+            rows = db.session.query(Order, Conversation.id).outerjoin(
+                Conversation, and_(
+                    Conversation.order_id == Order.order_id,
+                    Conversation.type == ConversationType.GROUP.value
+                )
+            ).filter(
+                Order.order_id.in_(order_ids),
+                Order.status == from_status,
+                Order.start_time <= start_before
+            ).with_for_update(of=Order).all()
+            if not rows:
+                db.session.rollback()
+                return 0
+
+            orders = [order for order, _ in rows]
+            before = [order_snapshot(order) for order in orders]
+            db.session.execute(
+                db.update(Order)
+                .where(Order.order_id.in_([order.order_id for order in orders]), Order.status == from_status)
+                .values(status=to_status)
+                .execution_options(synchronize_session='fetch')
+            )
+            OrderDailyStat.refresh_for(*orders)
+            members = get_members_by_order(before)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"订单状态 {from_status} -> {to_status} 批量更新失败: {str(e)}", exc_info=True)
+            return 0
+
+        logger.info(f"{len(rows)} 个订单状态 {from_status} -> {to_status}")
+        for (_, conversation_id), old in zip(rows, before):
+            order_feed.publish(old, {**old, 'status': to_status})
+            invalidate_user_calendars(members[old['order_id']], old['start_time'])
+            if conversation_id is not None:
+                self.socketio.emit(STATUS_EVENT, {
+                    'order_id': old['order_id'],
+                    'previous_status': from_status,
+                    'status': to_status
+                }, room=f'conversation_{conversation_id}')
+
+        # 刚出发的订单进入下一阶段
+        for to, next_status, offset in self.transitions():
+            if to == to_status:
+                for old in before:
+                    self.push(old['start_time'] + offset, old['order_id'], to_status, next_status)
+        return len(rows)
+
+    def run_once(self, now=None):
+        """处理当前已到期的全部订单（CLI --once）"""
+        now = now or datetime.now()
+        total = 0
+        while True:
+            self.load(now, horizon=timedelta(0))
+            changed = self.run_pending(now)
+            total += changed
+            if not changed:
+                return total
+
+    def start(self):
+        """在后台任务中运行调度循环（eventlet 下为绿色线程）"""
+        if self._running:
+            return
+        self._running = True
+        self.socketio.start_background_task(self.run_forever, self.socketio.sleep)
+
+    def stop(self):
+        self._running = False
+
+    def run_forever(self, sleep=time.sleep):
+        """调度循环: 定期补充堆, 睡眠到下一个到期时间"""
+        from ..extensions import db
+        from .logger import get_logger
+
+        self._running = True
+        interval = self.app.config['ORDER_SCHEDULER_INTERVAL']
+        next_load = datetime.now()
+        while self._running:
+            with self.app.app_context():
+                try:
+                    now = datetime.now()
+                    if now >= next_load:
+                        self.load(now)
+                        next_load = now + timedelta(seconds=interval)
+                    self.run_pending(now)
+                except Exception as e:
+                    get_logger(__name__).error(f"订单调度失败: {str(e)}", exc_info=True)
+                finally:
+                    db.session.remove()
+
+            wake_at = min(filter(None, (self.next_due(), next_load)))
+            sleep(max(0.0, min((wake_at - datetime.now()).total_seconds(), interval)))
@@ -0,0 +1,58 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+"""
+Socket.IO 事务发件箱: 事件先暂存在数据库会话中, 事务提交后才真正推送, 回滚则丢弃
+
+使用方法:
+# 1. 在扩展中初始化 (extensions.py)
+outbox = SocketIOOutbox()
+outbox.init_app(app, socketio)
+
+# 2. 在接口中代替 socketio.emit, 之后统一提交一次
+outbox.emit('message_sent', data, room='conversation_1')
+db.session.commit()     # 提交成功后推送; 提交失败或回滚时不推送
+"""
+
+OUTBOX_KEY = 'socketio_outbox'
+
+class SocketIOOutbox:
+    """按数据库事务推送 Socket.IO 事件"""
+
+    def __init__(self, socketio=None):
+        self.socketio = socketio
+
+    def init_app(self, app, socketio):
+        self.socketio = socketio
+        if not event.contains(Session, 'after_commit', self._after_commit):
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_soft_rollback', self._after_rollback)
+
+    def emit(self, event_name, data, session=None, **kwargs):
+        """
+        暂存一个事件，参数与 socketio.emit 相同
+        :param session: 事件所属的数据库会话，默认 db.session
+        """
+        if session is None:
+            from ..extensions import db
+            session = db.session()
+        if not session.in_transaction():
+            # 事件与事务绑定: 尚未开始事务时先开启, 保证随后的回滚能丢弃该事件
+            session.begin()
+        session.info.setdefault(OUTBOX_KEY, []).append((event_name, data, kwargs))
+
+    def pending(self, session=None):
+        """当前会话中尚未推送的事件"""
+        if session is None:
+            from ..extensions import db
+            session = db.session()
+        return list(session.info.get(OUTBOX_KEY, []))
+
+    def _after_commit(self, session):
+        for event_name, data, kwargs in session.info.pop(OUTBOX_KEY, []):
+            self.socketio.emit(event_name, data, **kwargs)
+
+    def _after_rollback(self, session, previous_transaction):
+        # 只回滚到保存点 (或其中 flush 的子事务) 时外层事务仍可能提交, 暂不清空
+        if previous_transaction.parent is None:
+            session.info.pop(OUTBOX_KEY, None)
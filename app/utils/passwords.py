@@ -0,0 +1,67 @@
+import threading
+from functools import lru_cache
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from .green import eventlet_patched
+
+"""
+密码哈希
+
+scrypt / pbkdf2 每次计算需要几十到上百毫秒的 CPU, 在 eventlet hub 上直接计算会阻塞同一进程的所有连接
+(登录高峰时聊天消息全部停顿). 运行在 eventlet 下时, 哈希计算交给 eventlet.tpool 的系统线程池执行
+(werkzeug 的 hashlib 计算期间释放 GIL), 并用信号量限制同时计算的数量, 避免占满线程池和 CPU.
+
+哈希方法和参数由 PASSWORD_HASH_METHOD 配置 (werkzeug 格式, 如 scrypt:32768:8:1、pbkdf2:sha256:600000),
+修改配置后已有用户的哈希仍可验证, 登录成功时自动用新参数重新计算 (见 User.password_needs_rehash).
+
+使用方法:
+passwords.hash('secret')                  # 生成哈希
+passwords.verify(user.password_hash, pwd)  # 校验密码
+"""
+
+@lru_cache(maxsize=8)
+def _canonical_method(method):
+    """补全默认参数后的哈希方法 (如 pbkdf2 -> pbkdf2:sha256:1000000), 每种方法只计算一次"""
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+class PasswordHasher:
+    """在线程池中计算密码哈希, 限制并发数"""
+
+    def __init__(self, app=None):
+        self._semaphores = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['password_hasher'] = self
+
+    @property
+    def method(self):
+        return current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+
+    def _semaphore(self):
+        # 信号量在首次使用时创建: wsgi.py 先 monkey_patch 再创建应用, 此时得到的是绿色信号量
+        limit = current_app.config.get('PASSWORD_HASH_CONCURRENCY', 4)
+        if limit not in self._semaphores:
+            self._semaphores[limit] = threading.BoundedSemaphore(limit)
+        return self._semaphores[limit]
+
+    def _run(self, func, *args, **kwargs):
+        if not eventlet_patched('thread'):
+            return func(*args, **kwargs)
+        from eventlet import tpool
+        with self._semaphore():
+            return tpool.execute(func, *args, **kwargs)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, method=self.method)
+
+    def verify(self, password_hash, password):
+        if not password_hash or password is None:
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """哈希使用的方法或参数与当前配置不同"""
+        prefix = password_hash.split('$', 1)[0]
+        return prefix != self.method and prefix != _canonical_method(self.method)
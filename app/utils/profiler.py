@@ -0,0 +1,313 @@
+import cProfile
+import hmac
+import io
+import itertools
+import os
+import pstats
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from urllib.parse import parse_qs
+from .logger import get_logger
+from .green import eventlet_patched
+
+"""
+按需的请求级性能剖析
+
+线上某个接口变慢时, 对指定请求或按比例抽样的请求做剖析, 结果写入 PROFILER_DIR (默认 app/logs/profiles):
+- cprofile: cProfile 统计每个函数的调用次数和耗时, 保存为 .prof (pstats / snakeviz 可读)
+- sampling: 在独立的系统线程中每 PROFILER_SAMPLE_INTERVAL_MS 毫秒采样一次请求线程的调用栈,
+  保存为折叠栈 .collapsed (每行 "帧;帧;...;帧 次数", 可直接交给 flamegraph.pl / speedscope 生成火焰图)
+
+触发方式 (均需 PROFILER_ENABLED=True):
+1. 请求头 X-Profile 或查询参数 __profile 等于 PROFILER_TOKEN, 响应头 X-Profile-File 返回结果文件名
+   X-Profile-Mode: sampling 可为单个请求指定剖析方式
+2. PROFILER_SAMPLE_RATE=N 时每 N 个请求剖析 1 个
+
+查看结果:
+flask list-profiles                         # 最近的剖析文件 (时间、接口、耗时)
+flask show-profile <文件名> --limit 30      # 耗时最多的函数
+flask startup-profile                       # 启动耗时: 导入各模块和 create_app 的时间
+
+注意: eventlet 下所有绿色线程共享同一个系统线程, 同一时间只剖析一个请求 (其余请求正常处理不剖析),
+剖析结果中可能混入同一时段其他绿色线程的调用; 采样模式下请求等待 IO 时采到的是 eventlet hub.
+"""
+
+MODES = ('cprofile', 'sampling')
+TOKEN_HEADER = 'HTTP_X_PROFILE'
+MODE_HEADER = 'HTTP_X_PROFILE_MODE'
+TOKEN_PARAM = '__profile'
+FILE_HEADER = 'X-Profile-File'
+
+# 文件名: 时间_方法_路径_耗时ms.扩展名
+FILENAME_PATTERN = re.compile(
+    r'^(?P<time>\d{8}-\d{6}-\d{6})_(?P<method>[A-Z]+)_(?P<path>.*)_(?P<ms>\d+)ms\.(?P<ext>prof|collapsed)$'
+)
+
+def _native_threading():
+    """eventlet monkey_patch 后 threading 是绿色线程, 采样线程必须使用原始的系统线程"""
+    if not eventlet_patched('thread'):
+        return threading
+    from eventlet import patcher
+    return patcher.original('threading')
+
+class StackSampler:
+    """定时采样目标线程的调用栈, 按折叠栈计数"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._threading = _native_threading()
+        self._stop = self._threading.Event()
+        self._target = None
+        self._thread = None
+
+    def start(self):
+        self._target = self._threading.get_ident()
+        self._thread = self._threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                self.stacks[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class RequestProfiler:
+    """请求剖析中间件 (包装 app.wsgi_app)"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self._counter = itertools.count(1)
+        self._busy = threading.Lock()  # 同一时间只剖析一个请求
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        if not app.config.get('PROFILER_ENABLED', False):
+            return
+        mode = app.config.get('PROFILER_MODE', 'cprofile')
+        if mode not in MODES:
+            raise ValueError(f"不支持的 PROFILER_MODE: {mode}, 可选 {MODES}")
+        os.makedirs(self.directory(app), exist_ok=True)
+        app.wsgi_app = self._wrap(app.wsgi_app)
+
+    @staticmethod
+    def directory(app):
+        return os.path.join(app.root_path, app.config.get('PROFILER_DIR', 'logs/profiles'))
+
+    def should_profile(self, environ):
+        """请求携带正确的令牌, 或命中 1/N 抽样"""
+        token = self.app.config.get('PROFILER_TOKEN')
+        if token:
+            supplied = environ.get(TOKEN_HEADER) \
+                or parse_qs(environ.get('QUERY_STRING', '')).get(TOKEN_PARAM, [''])[0]
+            if supplied and hmac.compare_digest(supplied, token):
+                return True
+        rate = self.app.config.get('PROFILER_SAMPLE_RATE', 0)
+        return rate > 0 and next(self._counter) % rate == 0
+
+    def _wrap(self, wsgi_app):
+        def profiled_app(environ, start_response):
+            if not self.should_profile(environ) or not self._busy.acquire(blocking=False):
+                return wsgi_app(environ, start_response)
+            try:
+                return self._profile(wsgi_app, environ, start_response)
+            finally:
+                self._busy.release()
+        return profiled_app
+
+    def _profile(self, wsgi_app, environ, start_response):
+        default_mode = self.app.config.get('PROFILER_MODE', 'cprofile')
+        mode = environ.get(MODE_HEADER, default_mode)
+        if mode not in MODES:
+            mode = default_mode
+
+        # 响应体生成完之后才知道耗时 (文件名的一部分), 先缓存响应状态和头
+        captured = []
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return lambda data: None
+
+        name = f"{datetime.now():%Y%m%d-%H%M%S-%f}_{environ.get('REQUEST_METHOD', 'GET')}_" \
+               f"{self._slug(environ.get('PATH_INFO', '/'))}"
+        started = time.perf_counter()
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                body = self._consume(wsgi_app(environ, capture_start_response))
+            finally:
+                profiler.disable()
+        else:
+            profiler = StackSampler(self.app.config.get('PROFILER_SAMPLE_INTERVAL_MS', 5) / 1000)
+            profiler.start()
+            try:
+                body = self._consume(wsgi_app(environ, capture_start_response))
+            finally:
+                profiler.stop()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        status, headers, exc_info = captured
+        try:
+            filename = self._save(profiler, name, elapsed_ms, mode)
+        except OSError as e:
+            get_logger(__name__).error(f"保存剖析结果失败: {str(e)}")
+        else:
+            get_logger(__name__).info(f"已剖析 {environ.get('PATH_INFO')} ({elapsed_ms:.1f}ms): {filename}")
+            headers = headers + [(FILE_HEADER, filename)]
+        start_response(status, headers, exc_info)
+        return [body]
+
+    @staticmethod
+    def _consume(iterable):
+        """读出完整响应体, 并按 WSGI 规范关闭可迭代对象"""
+        try:
+            return b''.join(iterable)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    @staticmethod
+    def _slug(path):
+        return re.sub(r'[^A-Za-z0-9.-]+', '-', path.strip('/').replace('/', '.')) or 'root'
+
+    def _save(self, profiler, name, elapsed_ms, mode):
+        directory = self.directory(self.app)
+        filename = f"{name}_{elapsed_ms:.0f}ms.{'prof' if mode == 'cprofile' else 'collapsed'}"
+        path = os.path.join(directory, filename)
+        if mode == 'cprofile':
+            profiler.dump_stats(path)
+        else:
+            profiler.dump(path)
+        self._prune(directory)
+        return filename
+
+    def _prune(self, directory):
+        """只保留最近的 PROFILER_MAX_FILES 个文件"""
+        max_files = self.app.config.get('PROFILER_MAX_FILES', 500)
+        files = sorted(name for name in os.listdir(directory) if FILENAME_PATTERN.match(name))
+        for name in files[:max(len(files) - max_files, 0)]:
+            os.remove(os.path.join(directory, name))
+
+def list_profiles(directory):
+    """按时间倒序列出剖析文件 [{'file', 'time', 'method', 'path', 'ms', 'mode'}]"""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        match = FILENAME_PATTERN.match(name)
+        if match:
+            profiles.append({
+                'file': name,
+                'time': datetime.strptime(match['time'], '%Y%m%d-%H%M%S-%f'),
+                'method': match['method'],
+                'path': '/' + match['path'].replace('.', '/') if match['path'] != 'root' else '/',
+                'ms': int(match['ms']),
+                'mode': 'cprofile' if match['ext'] == 'prof' else 'sampling',
+            })
+    return profiles
+
+def summarize_profile(path, sort='cumulative', limit=20):
+    """返回剖析文件的文本摘要: .prof 按 sort 排序的函数表, .collapsed 按采样数统计的热点帧"""
+    if path.endswith('.prof'):
+        stream = io.StringIO()
+        stats = pstats.Stats(path, stream=stream)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    inclusive, exclusive, total = Counter(), Counter(), 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if not stack:
+                continue
+            count = int(count)
+            frames = stack.split(';')
+            total += count
+            exclusive[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+
+    lines = [f"共 {total} 个采样", "", f"{'总占比':>8} {'自身占比':>8}  帧"]
+    for frame, count in inclusive.most_common(limit):
+        lines.append(f"{count / total:>8.1%} {exclusive[frame] / total:>8.1%}  {frame}")
+    return '\n'.join(lines) + '\n'
+
+# 在子进程中测量冷启动: python -X importtime 把每个模块的导入耗时写到 stderr, stdout 输出两段耗时
+STARTUP_SCRIPT = """
+import time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app({config!r})
+print(imported - started, time.perf_counter() - imported)
+"""
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \| (?P<name>.+)$')
+
+def parse_importtime(output):
+    """解析 -X importtime 输出, 返回 [(模块名, 自身微秒, 累计微秒)]"""
+    modules = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            modules.append((match['name'].strip(), int(match['self']), int(match['cumulative'])))
+    return modules
+
+def profile_startup(root, config=None):
+    """
+    在新的解释器中导入应用并调用 create_app, 统计启动耗时
+    :param root: 项目根目录 (子进程的工作目录)
+    :return: {'import': 秒, 'create_app': 秒, 'modules': [(模块名, 自身微秒, 累计微秒)]}
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT.format(config=config)],
+        cwd=root, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else '子进程启动失败')
+    import_seconds, create_seconds = map(float, result.stdout.split()[-2:])
+    return {'import': import_seconds, 'create_app': create_seconds, 'modules': parse_importtime(result.stderr)}
+
+def summarize_startup(startup, limit=20):
+    """启动耗时摘要: 总耗时、按顶层包汇总的导入时间、自身耗时最多的模块"""
+    packages = Counter()
+    for name, self_us, _ in startup['modules']:
+        packages[name.split('.', 1)[0]] += self_us
+    total_us = sum(packages.values()) or 1
+
+    lines = [
+        f"导入 app: {startup['import'] * 1000:.1f}ms, create_app: {startup['create_app'] * 1000:.1f}ms, "
+        f"共导入 {len(startup['modules'])} 个模块 ({total_us / 1000:.1f}ms)",
+        "", f"{'包':<30} {'导入(ms)':>9} {'占比':>7}"
+    ]
+    for package, self_us in packages.most_common(limit):
+        lines.append(f"{package:<30} {self_us / 1000:>9.1f} {self_us / total_us:>7.1%}")
+    lines += ["", f"{'模块':<50} {'自身(ms)':>9} {'累计(ms)':>9}"]
+    for name, self_us, cumulative_us in sorted(startup['modules'], key=lambda m: m[1], reverse=True)[:limit]:
+        lines.append(f"{name:<50} {self_us / 1000:>9.1f} {cumulative_us / 1000:>9.1f}")
+    return '\n'.join(lines) + '\n'
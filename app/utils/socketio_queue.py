@@ -0,0 +1,72 @@
+from importlib.metadata import version
+import socketio
+
+"""
+Socket.IO 消息队列管理器: 在 Flask-SocketIO 默认的队列管理器上增加进程间的内部广播
+
+配置了 SOCKETIO_MESSAGE_QUEUE 时 extensions.py 用 create_client_manager() 创建管理器, 作为 client_manager 传给 SocketIO.
+其他扩展登记处理函数后即可向所有进程广播 (不会发送给 Socket.IO 客户端):
+
+manager.on_broadcast('__orders_feed_change__', handler)   # handler(payload) 在每个进程 (含发送方) 上调用一次
+manager.broadcast('__orders_feed_change__', payload)      # payload 需可 JSON 序列化
+
+广播消息使用队列上 emit 消息的格式, 其他进程的监听线程把它交给 _handle_emit, 在这里按事件名分发;
+发送方在本进程直接调用处理函数 (监听线程忽略本进程发出的消息). 消息发往空房间 BROADCAST_ROOM,
+没有登记该事件的进程 (如滚动重启中的旧 worker) 按普通 emit 处理时也不会送达任何客户端.
+
+依赖 python-socketio PubSubManager 的子类扩展点 (_publish 与监听线程调用的 _handle_emit),
+按 python-socketio 5.17 (Flask-SocketIO 5.7) 编写, 其他主版本拒绝启动; 升级前需确认 tests/test_socketio_queue.py 通过.
+"""
+
+SUPPORTED_SOCKETIO_VERSION = '5.'
+BROADCAST_ROOM = '__internal_broadcast__'
+
+class BroadcastMixin:
+    """为 PubSubManager 增加按事件名分发的进程间广播"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.broadcast_handlers = {}  # {事件名: handler(payload)}
+
+    def on_broadcast(self, event, handler):
+        self.broadcast_handlers[event] = handler
+
+    def broadcast(self, event, payload):
+        """在本进程处理后发布到消息队列, 其他进程收到后各自处理"""
+        self.broadcast_handlers[event](payload)
+        self._publish({'method': 'emit', 'event': event, 'data': payload, 'namespace': '/',
+                       'room': BROADCAST_ROOM, 'skip_sid': None, 'callback': None, 'host_id': self.host_id})
+
+    def _handle_emit(self, message):
+        handler = self.broadcast_handlers.get(message.get('event'))
+        if handler is None:
+            return super()._handle_emit(message)
+        handler(message['data'])
+
+class RedisBroadcastManager(BroadcastMixin, socketio.RedisManager):
+    pass
+
+class KafkaBroadcastManager(BroadcastMixin, socketio.KafkaManager):
+    pass
+
+class ZmqBroadcastManager(BroadcastMixin, socketio.ZmqManager):
+    pass
+
+class KombuBroadcastManager(BroadcastMixin, socketio.KombuManager):
+    pass
+
+def create_client_manager(url, channel='flask-socketio'):
+    """按消息队列地址选择管理器 (与 Flask-SocketIO 根据 message_queue 的选择规则一致)"""
+    installed = version('python-socketio')
+    if not installed.startswith(SUPPORTED_SOCKETIO_VERSION):
+        raise RuntimeError(f"消息队列广播按 python-socketio {SUPPORTED_SOCKETIO_VERSION}x 编写, 当前版本为 {installed}")
+
+    if url.startswith(('redis://', 'rediss://')):
+        manager_class = RedisBroadcastManager
+    elif url.startswith('kafka://'):
+        manager_class = KafkaBroadcastManager
+    elif url.startswith('zmq'):
+        manager_class = ZmqBroadcastManager
+    else:
+        manager_class = KombuBroadcastManager
+    return manager_class(url, channel=channel)
@@ -0,0 +1 @@
+"""性能压测脚本（不参与应用运行, 在项目根目录下以 python -m benchmarks.<脚本名> 执行）"""
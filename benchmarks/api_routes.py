@@ -0,0 +1,351 @@
+"""
+接口压测: 通过 Flask 测试客户端逐个调用所有蓝图路由, 统计延迟分位数、每次请求的 SQL 条数和响应体大小
+
+每个路由对应 SCENARIOS 中的一个场景函数, 负责在计时之外准备请求所需的数据 (新订单、申请消息等),
+返回传给 client.open 的参数. 没有场景的路由会列在结果的 skipped 中, 新增路由时需要补充场景.
+数据库为空时先用 benchmarks.datagen 生成数据 (--users 指定规模).
+
+用法:
+    python -m benchmarks.api_routes --users 10000 --repeat 50 --output before.json
+    python -m benchmarks.api_routes --only /api/orders --output after.json
+    python -m benchmarks.api_routes --diff before.json after.json     # 对比两次结果
+"""
+import argparse
+import base64
+import itertools
+import json
+import logging
+import platform
+import statistics
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from flask_jwt_extended import create_access_token, create_refresh_token
+from app import create_app
+from app.extensions import db
+from app.models import User, Car, Order, OrderParticipant, Conversation, ConversationParticipant, Message
+from app.models.association import user_car
+from app.models.order import OrderStatus, OrderType
+from benchmarks.datagen import generate, identity_id
+from benchmarks.utils import load_config, percentile, fmt
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="全部接口的延迟 / SQL 条数 / 响应大小压测")
+    parser.add_argument('--config', default='config.BenchmarkConfig', help='配置类 (数据库地址取自该配置)')
+    parser.add_argument('--users', type=int, default=10000, help='数据库为空时生成的用户数')
+    parser.add_argument('--repeat', type=int, default=20, help='每个路由的计时请求次数')
+    parser.add_argument('--warmup', type=int, default=2, help='每个路由计时前的预热请求次数')
+    parser.add_argument('--only', default=None, help='只压测路径包含该字符串的路由')
+    parser.add_argument('--output', default=None, help='结果写入的 JSON 文件')
+    parser.add_argument('--diff', nargs=2, metavar=('BEFORE', 'AFTER'), help='对比两个结果文件后退出')
+    parser.add_argument('--threshold', type=float, default=10, help='--diff 时标记为退化的 p50 增幅(%%)')
+    return parser.parse_args()
+
+class SqlCounter:
+    """统计执行的 SQL 语句数（所有引擎）"""
+
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+class BenchContext:
+    """压测使用的样本数据: 一个有车且发起过订单的司机, 以及按需创建的新订单/用户/消息"""
+
+    def __init__(self):
+        self._serial = itertools.count(int(time.time()) % 100000 * 1000)
+        row = db.session.execute(
+            db.select(Order.initiator_id, db.func.count(Order.order_id).label('orders'))
+            .join(user_car, user_car.c.user_id == Order.initiator_id)
+            .group_by(Order.initiator_id)
+            .order_by(db.text('orders DESC'))
+            .limit(1)
+        ).first()
+        self.user_id = row.initiator_id
+        self.headers = self.auth(self.user_id)
+        car = db.session.get(User, self.user_id).cars.first()
+        self.car_id, self.license = car.car_id, car.license
+        self.other_id, self.other_headers = self.new_user()
+        self.order_id, self.conversation_id = self.new_order()
+        db.session.commit()
+
+    @staticmethod
+    def auth(user_id):
+        return {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+
+    def serial(self):
+        return next(self._serial)
+
+    def new_user(self):
+        n = self.serial()
+        user = User(username=f'bench_new_{n}', realname='压测用户', identity_id=identity_id(n, '220101'),
+                    gender='male', telephone=f'15{n:09d}', password_hash='-')
+        db.session.add(user)
+        db.session.commit()
+        return user.user_id, self.auth(user.user_id)
+
+    def new_order(self, initiator_id=None, status=OrderStatus.NOT_STARTED.value,
+                  order_type=OrderType.CAR_FIND_PERSON.value):
+        """创建订单及其群聊（发起人入单入群），返回 (订单ID, 群聊ID)"""
+        initiator_id = initiator_id or self.user_id
+        order = Order(initiator_id=initiator_id, start_loc='北京西站', dest_loc='首都机场',
+                      start_time=datetime.now() + timedelta(days=1), price=20, status=status,
+                      order_type=order_type, spare_seat_num=3)
+        db.session.add(order)
+        db.session.flush()
+        identity = 'driver' if order_type == OrderType.CAR_FIND_PERSON.value else 'passenger'
+        db.session.add(OrderParticipant(order_id=order.order_id, participator_id=initiator_id,
+                                        initiator_id=initiator_id, identity=identity))
+        conversation = Conversation(type='group', title='北京西站→首都机场', order_id=order.order_id)
+        db.session.add(conversation)
+        db.session.flush()
+        db.session.add(ConversationParticipant(conversation_id=conversation.id, user_id=initiator_id))
+        db.session.commit()
+        return order.order_id, conversation.id
+
+    def new_message(self, conversation_id, sender_id, message_type, order_id):
+        message = Message(conversation_id=conversation_id, sender_id=sender_id, content='压测',
+                          message_type=message_type, order_id=order_id)
+        db.session.add(message)
+        db.session.commit()
+        return message.id
+
+    def new_car(self):
+        n = self.serial()
+        car = Car(license=f'京Z{n % 10**7:07d}', car_type='轿车', color='白色', seat_num=5)
+        db.session.add(car)
+        db.session.flush()
+        db.session.execute(db.insert(user_car).values(user_id=self.user_id, car_id=car.car_id))
+        db.session.commit()
+        return car.license
+
+def application(ctx, message_type, order_type=OrderType.CAR_FIND_PERSON.value):
+    """发起人 ctx.user 收到新用户的申请"""
+    applicant_id, _ = ctx.new_user()
+    order_id, conversation_id = ctx.new_order(order_type=order_type)
+    message_id = ctx.new_message(conversation_id, applicant_id, message_type, order_id)
+    return {'headers': ctx.headers, 'json': {'orderId': order_id, 'userId': applicant_id, 'messageId': message_id}}
+
+def invitation(ctx):
+    """新用户收到 ctx.user 的拼车邀请"""
+    passenger_id, passenger_headers = ctx.new_user()
+    order_id, conversation_id = ctx.new_order()
+    message_id = ctx.new_message(conversation_id, ctx.user_id, 'invitation', order_id)
+    return {'headers': passenger_headers, 'json': {'orderId': order_id, 'userId': ctx.user_id, 'messageId': message_id}}
+
+def car_payload(number):
+    return {'number': number, 'color': '白色', 'model': '轿车', 'seats': 5}
+
+MONTH = {'year': datetime.now().year, 'month': datetime.now().month}
+
+# 路由规则 (同一规则的不同方法场景不同时写作 "方法 规则") -> 场景函数(ctx) -> client.open 的参数
+# (path 缺省时使用路由规则本身)
+SCENARIOS = {
+    '/api/': lambda ctx: {},
+    '/api/hello/<name>': lambda ctx: {'path': '/api/hello/bench'},
+    '/api/metrics/cache': lambda ctx: {},
+    '/api/metrics/db-pool': lambda ctx: {},
+    '/api/sync': lambda ctx: {'headers': ctx.headers, 'query_string': {'since': 0, 'limit': 100}},
+
+    '/api/auth/login': lambda ctx: {'json': {'username': f'bench_{ctx.user_id}', 'password': 'benchmark'}},
+    '/api/auth/refresh': lambda ctx: {
+        'headers': {'Authorization': f'Bearer {create_refresh_token(identity=str(ctx.user_id))}'}},
+    '/api/auth/register': lambda ctx: (lambda n: {'json': {
+        'username': f'bench_reg_{n}', 'realname': '压测用户', 'identity_id': identity_id(n, '330101'),
+        'gender': 'female', 'telephone': f'17{n:09d}', 'password': 'benchmark'}})(ctx.serial()),
+
+    '/api/user/basic': lambda ctx: {'headers': ctx.headers},
+    '/api/user/profile': lambda ctx: {'headers': ctx.headers},
+    '/api/user/modifiable_data': lambda ctx: {'headers': ctx.headers},
+    '/api/user/avatar': lambda ctx: {'headers': ctx.headers},
+    '/api/user/<int:user_id>/avatar': lambda ctx: {'path': f'/api/user/{ctx.user_id}/avatar'},
+    '/api/user/<int:user_id>/trips': lambda ctx: {'path': f'/api/user/{ctx.user_id}/trips', 'headers': ctx.headers},
+    '/api/user/update': lambda ctx: {'headers': ctx.headers, 'json': {'gender': 'male'}},
+    '/api/user/upload_avatar/<int:user_id>': lambda ctx: {
+        'path': f'/api/user/upload_avatar/{ctx.other_id}',
+        'json': {'base64_data': base64.b64encode(b'\xff\xd8' + bytes(4096)).decode()}},
+
+    '/api/user/cars': lambda ctx: {'headers': ctx.headers},
+    '/api/user/cars/add': lambda ctx: {'headers': ctx.headers,
+                                       'json': car_payload(f'京Y{ctx.serial() % 10**7:07d}')},
+    '/api/user/cars/<int:user_id>/<string:old_number>': lambda ctx: {
+        'path': f'/api/user/cars/{ctx.user_id}/{ctx.license}', 'json': car_payload(ctx.license)},
+    '/api/user/cars/<int:user_id>/<string:number>': lambda ctx: {
+        'path': f'/api/user/cars/{ctx.user_id}/{ctx.new_car()}'},
+
+    '/api/chat/conversations': lambda ctx: {'headers': ctx.headers},
+    '/api/chat/conversations/<int:conversation_id>/messages': lambda ctx: {
+        'path': f'/api/chat/conversations/{ctx.conversation_id}/messages', 'headers': ctx.headers},
+    '/api/chat/conversations/private': lambda ctx: {
+        'headers': ctx.new_user()[1], 'json': {'target_user_id': ctx.user_id, 'order_id': ctx.order_id}},
+    '/api/chat/messages': lambda ctx: {
+        'headers': ctx.headers,
+        'json': {'conversation_id': ctx.conversation_id, 'order_id': ctx.order_id, 'content': '压测消息'}},
+
+    '/api/orders': lambda ctx: {'headers': ctx.headers, 'json': {
+        'identity': 'driver', 'startAddress': '北京西站', 'endAddress': '首都机场',
+        'departureTime': (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S'),
+        'price': 20, 'initiator_id': ctx.user_id, 'order_type': '车找人', 'availableSeats': 3}},
+    '/api/orders/<int:order_id>': lambda ctx: {'path': f'/api/orders/{ctx.order_id}', 'headers': ctx.headers},
+    'DELETE /api/orders/<int:order_id>': lambda ctx: {'path': f'/api/orders/{ctx.new_order()[0]}', 'headers': ctx.headers},
+    '/api/orders/list': lambda ctx: {'headers': ctx.headers},
+    '/api/orders/active': lambda ctx: {'headers': ctx.headers},
+    '/api/orders/not-started': lambda ctx: {'headers': ctx.headers},
+    '/api/orders/user/trips': lambda ctx: {'headers': ctx.headers},
+    '/api/orders/user/trips/list': lambda ctx: {'headers': ctx.headers, 'query_string': {'limit': 20}},
+    '/api/orders/calendar/<int:user_id>': lambda ctx: {
+        'path': f'/api/orders/calendar/{ctx.user_id}', 'headers': ctx.headers, 'query_string': MONTH},
+    '/api/orders/calendar/<int:user_id>/summary': lambda ctx: {
+        'path': f'/api/orders/calendar/{ctx.user_id}/summary', 'headers': ctx.headers, 'query_string': MONTH},
+    '/api/orders/manage/list': lambda ctx: {},
+    '/api/orders/manage/stats': lambda ctx: {},
+    '/api/orders/manage/<int:order_id>/approve': lambda ctx: {
+        'path': f'/api/orders/manage/{ctx.new_order(status=OrderStatus.PENDING.value)[0]}/approve'},
+    '/api/orders/manage/<int:order_id>/reject': lambda ctx: {
+        'path': f'/api/orders/manage/{ctx.new_order(status=OrderStatus.PENDING.value)[0]}/reject',
+        'json': {'reason': '压测'}},
+    '/api/orders/<int:order_id>/paid': lambda ctx: {
+        'path': f'/api/orders/{ctx.new_order(status=OrderStatus.TO_PAY.value)[0]}/paid', 'headers': ctx.headers},
+    '/api/orders/<int:order_id>/rate': lambda ctx: {
+        'path': f'/api/orders/{ctx.new_order(status=OrderStatus.TO_REVIEW.value)[0]}/rate',
+        'headers': ctx.headers, 'json': {'rating_value': 5}},
+
+    '/api/orders/apply/accept': lambda ctx: application(ctx, 'apply_join'),
+    '/api/orders/apply/reject': lambda ctx: application(ctx, 'apply_join'),
+    '/api/orders/driver/accept': lambda ctx: application(ctx, 'apply_order', OrderType.PERSON_FIND_CAR.value),
+    '/api/orders/driver/reject': lambda ctx: application(ctx, 'apply_order', OrderType.PERSON_FIND_CAR.value),
+    '/api/orders/invitation/accept': invitation,
+    '/api/orders/invitation/reject': invitation,
+    '/api/orders/driver/apply': lambda ctx: {'headers': ctx.headers, 'json': {
+        'orderId': ctx.new_order(initiator_id=ctx.other_id, order_type=OrderType.PERSON_FIND_CAR.value)[0],
+        'vehicleId': ctx.car_id}},
+    '/api/orders/passenger/apply': lambda ctx: {'headers': ctx.other_headers, 'json': {
+        'orderId': ctx.new_order()[0]}},
+    '/api/orders/passenger/invite': lambda ctx: {'headers': ctx.headers, 'json': {'orderId': ctx.order_id}},
+}
+
+def response_code(response):
+    """业务状态码: JSON 响应体中的 code, 没有时使用 HTTP 状态码"""
+    body = response.get_json(silent=True)
+    if isinstance(body, dict) and isinstance(body.get('code'), int):
+        return body['code']
+    return response.status_code
+
+def run_route(app, client, ctx, counter, rule, method, scenario, warmup, repeat):
+    latencies, sql_counts, sizes, codes = [], [], [], {}
+    for i in range(warmup + repeat):
+        with app.app_context():
+            kwargs = scenario(ctx)  # 准备数据, 不计时
+        kwargs.setdefault('path', rule)
+
+        counter.count = 0
+        start = time.perf_counter()
+        try:
+            response = client.open(method=method, **kwargs)
+            code, size = response_code(response), len(response.data)
+        except Exception as e:
+            code, size = type(e).__name__, 0
+        elapsed = (time.perf_counter() - start) * 1000
+
+        if i >= warmup:
+            latencies.append(elapsed)
+            sql_counts.append(counter.count)
+            sizes.append(size)
+            codes[str(code)] = codes.get(str(code), 0) + 1
+
+    return {
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'mean_ms': statistics.fmean(latencies),
+        'sql': statistics.median(sql_counts),
+        'bytes': statistics.median(sizes),
+        'codes': codes,
+    }
+
+def run(args):
+    app = create_app(load_config(args.config))
+    logging.disable(logging.WARNING - 1)  # 压测时关闭应用的请求日志和调试日志 (只保留警告和错误)
+    counter = SqlCounter()
+
+    with app.app_context():
+        db.create_all()
+        if not db.session.query(user_car).first():
+            print(f"数据库为空, 生成 {args.users} 个用户的压测数据...")
+            generate(args.users)
+        ctx = BenchContext()
+
+    client = app.test_client()
+    routes, skipped = {}, []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if rule.endpoint == 'static' or (args.only and args.only not in rule.rule):
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            key = f'{method} {rule.rule}'
+            scenario = SCENARIOS.get(key, SCENARIOS.get(rule.rule))
+            if scenario is None:
+                skipped.append(key)
+                continue
+            routes[key] = run_route(app, client, ctx, counter, rule.rule, method, scenario, args.warmup, args.repeat)
+            result = routes[key]
+            print(f"{key:62} p50 {fmt(result['p50_ms'], 2):>8}ms  p99 {fmt(result['p99_ms'], 2):>8}ms  "
+                  f"sql {fmt(result['sql'], 0):>4}  {fmt(result['bytes'], 0):>8}B  {result['codes']}")
+
+    if skipped:
+        print(f"\n没有压测场景的路由: {', '.join(skipped)}")
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'config': args.config,
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1],
+            'repeat': args.repeat,
+            'python': platform.python_version(),
+        },
+        'routes': routes,
+        'skipped': skipped,
+    }
+
+def diff(before_path, after_path, threshold):
+    """对比两次结果, p50 增幅超过 threshold% 的路由标记为退化; 有退化时返回 1"""
+    with open(before_path, encoding='utf-8') as f:
+        before = json.load(f)['routes']
+    with open(after_path, encoding='utf-8') as f:
+        after = json.load(f)['routes']
+
+    def change(old, new):
+        return (new - old) / old * 100 if old else 0.0
+
+    regressions = 0
+    print(f"{'route':62} {'p50(ms)':>20} {'p99(ms)':>20} {'sql':>10} {'bytes':>16}")
+    for key in sorted(set(before) | set(after)):
+        if key not in before or key not in after:
+            print(f"{key:62} {'只在 ' + ('AFTER' if key in after else 'BEFORE') + ' 中':>20}")
+            continue
+        old, new = before[key], after[key]
+        p50_change = change(old['p50_ms'], new['p50_ms'])
+        flag = ''
+        if p50_change > threshold:
+            flag = '  <-- 退化'
+            regressions += 1
+        print(f"{key:62} {fmt(old['p50_ms'], 2):>7}->{fmt(new['p50_ms'], 2):<7}({p50_change:+5.0f}%) "
+              f"{fmt(old['p99_ms'], 2):>7}->{fmt(new['p99_ms'], 2):<7}({change(old['p99_ms'], new['p99_ms']):+5.0f}%) "
+              f"{fmt(old['sql'], 0):>4}->{fmt(new['sql'], 0):<4} {fmt(old['bytes'], 0):>7}->{fmt(new['bytes'], 0):<7}{flag}")
+    print(f"\n{regressions} 个路由 p50 增幅超过 {threshold}%")
+    return 1 if regressions else 0
+
+def main():
+    args = parse_args()
+    if args.diff:
+        raise SystemExit(diff(*args.diff, args.threshold))
+
+    result = run(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+压测数据生成: 按规模批量写入用户(含头像二进制)、车辆、订单、订单参与者、群聊/私聊会话和消息
+
+所有数据通过 Core 批量 INSERT (executemany) 分块写入, 主键在生成时直接分配 (从各表当前最大值之后递增),
+不经过 ORM 对象和会话事件, 100 万用户级别的数据也只需要几分钟. 生成的用户密码统一为 --password.
+
+用法:
+    python -m benchmarks.datagen --users 10000
+    python -m benchmarks.datagen --users 1000000 --chunk 20000 --config config.ProductionConfig
+    python -m benchmarks.datagen --users 10000 --reset        # 先清空所有表
+"""
+import argparse
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from app import create_app
+from app.extensions import db, passwords
+from app.models import (User, Car, Order, OrderParticipant, Conversation, ConversationParticipant,
+                        Message, OrderDailyStat)
+from app.models.association import user_car
+from app.models.order import OrderStatus, OrderType
+from benchmarks.utils import load_config
+
+PLACES = ['北京西站', '首都机场', '大兴机场', '北京南站', '中关村', '国贸', '望京', '五道口',
+          '天通苑', '回龙观', '亦庄', '通州北苑', '西单', '王府井', '奥林匹克公园', '798艺术区']
+CAR_TYPES = ['轿车', 'SUV', 'MPV', '新能源']
+COLORS = ['白色', '黑色', '银色', '红色', '蓝色']
+MESSAGES = ['几点出发?', '我在门口等你', '马上到', '好的', '路上有点堵', '谢谢师傅', '行李有点多可以吗?']
+
+# 过去的订单大多已结束, 未来的订单处于未开始
+PAST_STATUSES = [OrderStatus.COMPLETED.value] * 6 + [OrderStatus.TO_REVIEW.value, OrderStatus.TO_PAY.value,
+                                                     OrderStatus.REJECTED.value]
+FUTURE_STATUSES = [OrderStatus.NOT_STARTED.value] * 8 + [OrderStatus.PENDING.value]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="生成压测数据")
+    parser.add_argument('--config', default='config.BenchmarkConfig', help='配置类 (数据库地址取自该配置)')
+    parser.add_argument('--users', type=int, default=10000, help='用户数 (其余数据按比例生成)')
+    parser.add_argument('--orders-per-user', type=float, default=2, help='平均每个用户发起的订单数')
+    parser.add_argument('--messages-per-order', type=int, default=5, help='每个订单群聊的消息数')
+    parser.add_argument('--avatar-ratio', type=float, default=0.5, help='有头像的用户比例')
+    parser.add_argument('--avatar-bytes', type=int, default=8192, help='头像二进制大小')
+    parser.add_argument('--chunk', type=int, default=5000, help='每次 executemany 的行数')
+    parser.add_argument('--password', default='benchmark', help='生成用户的密码')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--reset', action='store_true', help='生成前清空并重建所有表')
+    return parser.parse_args()
+
+def identity_id(n, region='110101'):
+    """生成第 n 个用户的身份证号（出生日期有效, 1500 万以内不重复）"""
+    birthday = datetime(1960, 1, 1) + timedelta(days=n % 15000)
+    return f"{region}{birthday:%Y%m%d}{n // 15000 % 1000:03d}{n % 10}"
+
+def next_id(column):
+    return (db.session.scalar(db.select(db.func.max(column))) or 0) + 1
+
+class BulkWriter:
+    """按表缓存待写入的行, 任一表满 chunk 行时按表首次出现的顺序 (先父表后子表) 全部写入"""
+
+    def __init__(self, chunk):
+        self.chunk = chunk
+        self.pending = {}
+        self.counts = {}
+
+    def add(self, table, row):
+        rows = self.pending.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        for table, rows in self.pending.items():
+            if rows:
+                db.session.execute(db.insert(table), rows)
+                self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+                self.pending[table] = []
+        db.session.commit()
+
+def generate(users, orders_per_user=2, messages_per_order=5, avatar_ratio=0.5, avatar_bytes=8192,
+             chunk=5000, password='benchmark', seed=42):
+    """
+    生成压测数据（需在应用上下文中调用）
+    :return: {表名: 写入行数}
+    """
+    rng = random.Random(seed)
+    writer = BulkWriter(chunk)
+    now = datetime.now().replace(microsecond=0)
+    password_hash = passwords.hash(password)  # 所有用户共用, 避免逐个计算哈希
+    avatar = rng.randbytes(avatar_bytes)
+
+    user_start = next_id(User.user_id)
+    car_start = next_id(Car.car_id)
+    order_start = next_id(Order.order_id)
+    conversation_start = next_id(Conversation.id)
+    message_start = next_id(Message.id)
+
+    # 1. 用户, 每 4 个用户中有 1 个司机拥有车辆
+    user_ids = range(user_start, user_start + users)
+    drivers = []
+    for user_id in user_ids:
+        writer.add(User.__table__, {
+            'user_id': user_id,
+            'username': f'bench_{user_id}',
+            'realname': f'压测用户{user_id}',
+            'identity_id': identity_id(user_id),
+            'gender': rng.choice(('male', 'female')),
+            'telephone': f'13{user_id:09d}',
+            'password_hash': password_hash,
+            'user_avatar': avatar if rng.random() < avatar_ratio else None,
+            'status': '离线',
+            'updated_at': now,
+        })
+        if user_id % 4 == 0:
+            car_id = car_start + len(drivers)
+            drivers.append(user_id)
+            writer.add(Car.__table__, {
+                'car_id': car_id,
+                'license': f'京B{car_id:05d}',
+                'car_type': rng.choice(CAR_TYPES),
+                'color': rng.choice(COLORS),
+                'seat_num': rng.choice((4, 5, 7)),
+                'updated_at': now,
+            })
+            writer.add(user_car, {'user_id': user_id, 'car_id': car_id})
+    writer.flush()
+
+    # 2. 订单、参与者、订单群聊及消息
+    conversation_id = conversation_start
+    message_id = message_start
+    # 两人之间只有一个私聊会话 (唯一索引 uq_conversations_private_pair), 跳过已有私聊的用户对
+    private_pairs = {tuple(pair) for pair in db.session.query(Conversation.min_user_id, Conversation.max_user_id).filter(
+        Conversation.min_user_id.isnot(None)
+    )}
+    for order_id in range(order_start, order_start + int(users * orders_per_user)):
+        start_time = now + timedelta(minutes=rng.randint(-60 * 24 * 90, 60 * 24 * 30))
+        is_car = bool(drivers) and rng.random() < 0.6
+        initiator_id = rng.choice(drivers) if is_car else rng.choice(user_ids)
+        passengers = {rng.choice(user_ids) for _ in range(rng.randint(0, 3))} - {initiator_id}
+        status = rng.choice(PAST_STATUSES if start_time < now else FUTURE_STATUSES)
+        start_loc, dest_loc = rng.sample(PLACES, 2)
+
+        writer.add(Order.__table__, {
+            'order_id': order_id,
+            'initiator_id': initiator_id,
+            'start_loc': start_loc,
+            'dest_loc': dest_loc,
+            'start_time': start_time,
+            'price': rng.randint(10, 200),
+            'status': status,
+            'order_type': OrderType.CAR_FIND_PERSON.value if is_car else OrderType.PERSON_FIND_CAR.value,
+            'car_type': rng.choice(CAR_TYPES),
+            'travel_partner_num': None if is_car else rng.randint(1, 3),
+            'spare_seat_num': rng.randint(0, 3) if is_car else None,
+            'rate': str(rng.randint(3, 5)) if status == OrderStatus.COMPLETED.value and rng.random() < 0.5 else None,
+            'updated_at': now,
+        })
+        members = [initiator_id, *passengers]
+        for member_id in members:
+            writer.add(OrderParticipant.__table__, {
+                'participator_id': member_id,
+                'order_id': order_id,
+                'initiator_id': initiator_id,
+                'identity': 'driver' if is_car and member_id == initiator_id else 'passenger',
+            })
+
+        writer.add(Conversation.__table__, {
+            'id': conversation_id,
+            'type': 'group',
+            'title': f'{start_loc}→{dest_loc}',
+            'order_id': order_id,
+            'created_at': start_time - timedelta(days=1),
+            'updated_at': now,
+            'min_user_id': None,
+            'max_user_id': None,
+        })
+        for member_id in members:
+            writer.add(ConversationParticipant.__table__, {
+                'user_id': member_id,
+                'conversation_id': conversation_id,
+                'unread_count': rng.randint(0, messages_per_order),
+            })
+        for i in range(messages_per_order):
+            writer.add(Message.__table__, {
+                'id': message_id,
+                'conversation_id': conversation_id,
+                'sender_id': rng.choice(members),
+                'content': rng.choice(MESSAGES),
+                'message_type': 'text',
+                'created_at': start_time - timedelta(hours=24 - i),
+            })
+            message_id += 1
+        conversation_id += 1
+
+        # 部分订单的发起人与乘客另有私聊
+        pair = Conversation.private_pair(initiator_id, min(passengers)) if passengers else None
+        if pair and pair not in private_pairs and rng.random() < 0.3:
+            private_pairs.add(pair)
+            passenger_id = min(passengers)
+            writer.add(Conversation.__table__, {
+                'id': conversation_id,
+                'type': 'private',
+                'title': None,
+                'order_id': order_id,
+                'created_at': start_time - timedelta(days=2),
+                'updated_at': now,
+                'min_user_id': pair[0],
+                'max_user_id': pair[1],
+            })
+            for member_id in (initiator_id, passenger_id):
+                writer.add(ConversationParticipant.__table__, {
+                    'user_id': member_id,
+                    'conversation_id': conversation_id,
+                    'unread_count': 0,
+                })
+            for sender_id in (passenger_id, initiator_id):
+                writer.add(Message.__table__, {
+                    'id': message_id,
+                    'conversation_id': conversation_id,
+                    'sender_id': sender_id,
+                    'content': rng.choice(MESSAGES),
+                    'message_type': 'text',
+                    'created_at': start_time - timedelta(days=2),
+                })
+                message_id += 1
+            conversation_id += 1
+    writer.flush()
+
+    OrderDailyStat.rebuild()
+    db.session.commit()
+    return writer.counts
+
+def main():
+    args = parse_args()
+    app = create_app(load_config(args.config))
+    logging.getLogger().setLevel(logging.WARNING)  # 压测时关闭应用的调试日志
+
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        counts = generate(args.users, args.orders_per_user, args.messages_per_order, args.avatar_ratio,
+                          args.avatar_bytes, args.chunk, args.password, args.seed)
+        elapsed = time.perf_counter() - started
+
+    for table, count in counts.items():
+        print(f"{table:28} {count:>10}")
+    print(f"耗时: {elapsed:.1f}s, 共 {sum(counts.values())} 行, {sum(counts.values()) / elapsed:.0f} 行/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+座位占用压测: 大量绿色线程同时抢同一订单的座位, 检查是否超卖并统计吞吐量
+
+atomic 模式使用 Order.reserve_seats 的条件 UPDATE; naive 模式先读取剩余座位再写回 (旧做法),
+读写之间让出绿色线程以暴露竞争, 用于对比.
+
+用法:
+    python -m benchmarks.seat_reservation --threads 500 --seats 4
+    python -m benchmarks.seat_reservation --mode naive
+    python -m benchmarks.seat_reservation --config config.ProductionConfig
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta
+from app import create_app
+from app.extensions import db
+from app.models import User, Order
+from app.models.order import OrderStatus, OrderType
+from benchmarks.utils import load_config
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="订单座位并发占用压测")
+    parser.add_argument('--config', default='config.TestingConfig', help='配置类 (数据库地址取自该配置)')
+    parser.add_argument('--threads', type=int, default=200, help='并发绿色线程数')
+    parser.add_argument('--attempts', type=int, default=5, help='每个线程的占座次数')
+    parser.add_argument('--seats', type=int, default=4, help='订单初始座位数')
+    parser.add_argument('--mode', choices=('atomic', 'naive'), default='atomic', help='占座方式')
+    return parser.parse_args()
+
+def setup_order(seats):
+    """创建压测用的司机和订单，返回 (user_id, order_id)"""
+    user = User(
+        username=f'bench_{int(time.time() * 1000)}',
+        realname='Seat Benchmark',
+        identity_id='110101199001010000',
+        gender='male',
+        telephone=str(int(time.time() * 1000))[-11:],
+        password='benchmark'
+    )
+    db.session.add(user)
+    db.session.flush()
+    order = Order(
+        initiator_id=user.user_id,
+        start_loc='压测出发地',
+        dest_loc='压测目的地',
+        start_time=datetime.now() + timedelta(days=1),
+        price=0,
+        status=OrderStatus.NOT_STARTED.value,
+        order_type=OrderType.CAR_FIND_PERSON.value,
+        spare_seat_num=seats
+    )
+    db.session.add(order)
+    db.session.commit()
+    return user.user_id, order.order_id
+
+def reserve_naive(order_id):
+    """先读后写: 并发时多个请求会读到同一个剩余座位数"""
+    order = db.session.get(Order, order_id)
+    if order.spare_seat_num < 1:
+        return False
+    eventlet.sleep(0)  # 模拟读写之间的业务处理
+    order.spare_seat_num -= 1
+    return True
+
+def main():
+    args = parse_args()
+    app = create_app(load_config(args.config))
+    logging.getLogger().setLevel(logging.WARNING)  # 压测时关闭应用的调试日志
+    reserve = Order.reserve_seats if args.mode == 'atomic' else reserve_naive
+
+    with app.app_context():
+        db.create_all()
+        user_id, order_id = setup_order(args.seats)
+
+    granted, rejected, errors = [0], [0], [0]
+
+    def worker():
+        for _ in range(args.attempts):
+            with app.app_context():
+                try:
+                    if reserve(order_id):
+                        db.session.commit()
+                        granted[0] += 1
+                    else:
+                        db.session.rollback()
+                        rejected[0] += 1
+                except Exception:
+                    db.session.rollback()
+                    errors[0] += 1
+                finally:
+                    db.session.remove()
+
+    pool = eventlet.GreenPool(args.threads)
+    started = time.perf_counter()
+    for _ in range(args.threads):
+        pool.spawn(worker)
+    pool.waitall()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        seats_left = db.session.get(Order, order_id).spare_seat_num
+        db.session.query(Order).filter_by(order_id=order_id).delete()
+        db.session.query(User).filter_by(user_id=user_id).delete()
+        db.session.commit()
+
+    attempts = args.threads * args.attempts
+    oversold = granted[0] - args.seats if granted[0] > args.seats else 0
+    print(f"模式: {args.mode}, 并发线程: {args.threads}, 每线程占座: {args.attempts}, 初始座位: {args.seats}")
+    print(f"占座成功: {granted[0]}, 座位不足: {rejected[0]}, 出错: {errors[0]}, 剩余座位: {seats_left}")
+    print(f"耗时: {elapsed:.3f}s, 吞吐量: {attempts / elapsed:.1f} 次/s")
+    if oversold or seats_left != args.seats - granted[0]:
+        print(f"超卖! 成功 {granted[0]} 次, 座位只有 {args.seats} 个, 剩余座位记录为 {seats_left}")
+        raise SystemExit(1)
+    print("未超卖")
+
+if __name__ == '__main__':
+    main()
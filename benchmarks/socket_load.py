@@ -0,0 +1,387 @@
+"""
+Socket.IO 聊天压测: 测量单个 eventlet worker 能承载多少同时在线的聊天用户
+
+流程 (全部在本机完成, 不需要外网, 可在 CI 中运行):
+1. 在压测数据库 (默认 BenchmarkConfig 的 SQLite) 中创建 --clients 个用户, 每 --room-size 人一个群聊
+2. 以子进程启动 wsgi.py (--config 指定配置, 监听 127.0.0.1 的空闲端口, 关闭订单调度)
+3. 每个客户端通过 /api/auth/login 登录, 建立 Socket.IO 连接并 join_conversation 加入自己的群聊
+4. 以 --rate 条/秒的总速率轮流让客户端 send_message, 持续 --duration 秒
+5. 消息内容携带发送时间, 房间内每个成员 (包括发送者) 收到 new_message 时记录端到端延迟
+6. --login-rate 大于 0 时, 发送期间另以该速率并发调用登录接口, 观察密码哈希对聊天延迟的影响
+
+输出: 投递延迟 p50/p99、发送和投递速率、丢失的投递数、服务端进程的 CPU 占用和内存 (RSS).
+
+用法:
+    python -m benchmarks.socket_load --clients 200 --rate 100 --duration 30
+    python -m benchmarks.socket_load --clients 50 --transport polling --output socket.json
+    python -m benchmarks.socket_load --clients 100 --rate 50 --login-rate 20   # 登录高峰 + 聊天
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import requests
+import socketio
+from app import create_app
+from app.extensions import db, passwords
+from app.models import User, Conversation, ConversationParticipant
+from benchmarks.datagen import identity_id
+from benchmarks.utils import load_config, percentile, fmt
+
+try:
+    import psutil
+except ImportError:  # 非 Linux 且未安装 psutil 时不统计服务端资源
+    psutil = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PASSWORD = 'socket-load'
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Socket.IO 聊天吞吐量压测")
+    parser.add_argument('--config', default='config.BenchmarkConfig', help='服务端和数据准备使用的配置类')
+    parser.add_argument('--clients', type=int, default=100, help='并发 Socket.IO 客户端数')
+    parser.add_argument('--room-size', type=int, default=5, help='每个群聊的人数')
+    parser.add_argument('--rate', type=float, default=50, help='所有客户端合计的发送速率 (条/秒)')
+    parser.add_argument('--duration', type=float, default=20, help='发送持续秒数')
+    parser.add_argument('--login-rate', type=float, default=0, help='发送期间同时发起的登录请求速率 (次/秒), 0 表示不登录')
+    parser.add_argument('--drain-timeout', type=float, default=10, help='发送结束后等待投递完成的秒数')
+    parser.add_argument('--transport', choices=('websocket', 'polling'), default=None,
+                        help='客户端传输方式 (默认: 安装了 websocket-client 时用 websocket, 否则 polling)')
+    parser.add_argument('--server-log', default=None, help='服务端输出写入的文件 (默认丢弃)')
+    parser.add_argument('--output', default=None, help='结果写入的 JSON 文件')
+    return parser.parse_args()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def default_transport():
+    try:
+        import websocket  # noqa: F401  python-socketio 的 websocket 客户端依赖
+        return 'websocket'
+    except ImportError:
+        return 'polling'
+
+def prepare_users(config, clients, room_size):
+    """创建压测用户和群聊，返回 [(username, conversation_id)] 与每个群聊的人数"""
+    app = create_app(config)
+    logging.disable(logging.WARNING - 1)  # 只保留警告和错误, 避免调试日志干扰结果输出
+    run = int(time.time())
+    with app.app_context():
+        db.create_all()
+        password_hash = passwords.hash(PASSWORD)  # 使用配置中的哈希方法, 与登录时的校验成本一致
+        users = [User(username=f'sock{run}_{i}', realname=f'聊天压测{i}', identity_id=identity_id(run * 10000 + i, '440101'),
+                      gender='male', telephone=f'16{(run * 10000 + i) % 10**9:09d}', password_hash=password_hash)
+                 for i in range(clients)]
+        db.session.add_all(users)
+        db.session.flush()
+
+        members, room_sizes = [], {}
+        for start in range(0, clients, room_size):
+            conversation = Conversation(type='group', title=f'聊天压测 {start // room_size}')
+            db.session.add(conversation)
+            db.session.flush()
+            for user in users[start:start + room_size]:
+                db.session.add(ConversationParticipant(conversation_id=conversation.id, user_id=user.user_id))
+                members.append((user.username, conversation.id))
+            room_sizes[conversation.id] = len(users[start:start + room_size])
+        db.session.commit()
+    return members, room_sizes
+
+class ServerProcess:
+    """以子进程运行 wsgi.py, 并采样其 CPU 时间和内存"""
+
+    def __init__(self, config, port, log_path=None):
+        self.port = port
+        self.url = f'http://127.0.0.1:{port}'
+        self.log = open(log_path, 'w') if log_path else subprocess.DEVNULL
+        env = dict(os.environ, ORDER_SCHEDULER_ENABLED='False')
+        self.process = subprocess.Popen(
+            [sys.executable, 'wsgi.py', '--config', config, '--host', '127.0.0.1', '--port', str(port)],
+            cwd=PROJECT_ROOT, env=env, stdout=self.log, stderr=subprocess.STDOUT
+        )
+        self.peak_rss = 0
+        self._sampling = False
+
+    def wait_ready(self, timeout=30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"服务端启动失败, 退出码 {self.process.returncode}")
+            try:
+                requests.get(f'{self.url}/api/', timeout=1)
+                return
+            except requests.RequestException:
+                time.sleep(0.2)
+        raise RuntimeError(f"服务端 {timeout}s 内未就绪")
+
+    def cpu_seconds(self):
+        """进程累计 CPU 时间 (用户态 + 内核态)"""
+        if psutil is not None:
+            times = psutil.Process(self.process.pid).cpu_times()
+            return times.user + times.system
+        try:
+            with open(f'/proc/{self.process.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        except OSError:
+            return None
+
+    def rss_bytes(self):
+        if psutil is not None:
+            return psutil.Process(self.process.pid).memory_info().rss
+        try:
+            with open(f'/proc/{self.process.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            return None
+
+    def start_sampling(self, interval=0.5):
+        def sample():
+            while self._sampling:
+                self.peak_rss = max(self.peak_rss, self.rss_bytes() or 0)
+                time.sleep(interval)
+        self._sampling = True
+        threading.Thread(target=sample, daemon=True).start()
+
+    def stop(self):
+        self._sampling = False
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        if self.log is not subprocess.DEVNULL:
+            self.log.close()
+
+class ChatClient:
+    """一个聊天用户: 登录、连接、加入群聊、统计收到的消息"""
+
+    def __init__(self, index, username, conversation_id, stats):
+        self.index = index
+        self.username = username
+        self.conversation_id = conversation_id
+        self.stats = stats
+        self.sio = socketio.Client(reconnection=False)
+        self.sio.on('new_message', self.on_message)
+        self.sio.on('message_error', lambda data: stats.record_error())
+
+    def start(self, url, transport):
+        response = requests.post(f'{url}/api/auth/login', json={'username': self.username, 'password': PASSWORD},
+                                 timeout=60)
+        token = response.json()['data']['access_token']
+        self.sio.connect(url, headers={'Authorization': f'Bearer {token}'}, transports=[transport], wait_timeout=30)
+        result = self.sio.call('join_conversation', {'conversationId': self.conversation_id}, timeout=30)
+        if result and result.get('code') != 200:
+            raise RuntimeError(f"加入群聊失败: {result}")
+
+    def send(self, seq):
+        self.sio.emit('send_message', {
+            'conversationId': self.conversation_id,
+            'content': f'{self.index}|{seq}|{time.time():.6f}'
+        })
+
+    def on_message(self, data):
+        try:
+            sent_at = float(data['content'].rsplit('|', 1)[1])
+        except (KeyError, IndexError, ValueError):
+            return
+        self.stats.record_delivery(time.time() - sent_at)
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+
+    def record_delivery(self, latency):
+        with self.lock:
+            self.latencies.append(latency * 1000)
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    @property
+    def delivered(self):
+        with self.lock:
+            return len(self.latencies)
+
+class LoginStorm:
+    """发送期间以固定速率并发登录, 记录登录接口的延迟"""
+
+    def __init__(self, url, usernames, rate, workers=32):
+        self.url = url
+        self.usernames = usernames
+        self.rate = rate
+        self.latencies = []
+        self.failures = 0
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.pool.shutdown(wait=True)
+
+    def _run(self):
+        interval = 1 / self.rate
+        next_login = time.perf_counter()
+        count = 0
+        while not self._stop.is_set():
+            self.pool.submit(self._login, self.usernames[count % len(self.usernames)])
+            count += 1
+            next_login += interval
+            delay = next_login - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+
+    def _login(self, username):
+        started = time.perf_counter()
+        try:
+            response = requests.post(f'{self.url}/api/auth/login', json={'username': username, 'password': PASSWORD},
+                                     timeout=60)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        with self.lock:
+            if ok:
+                self.latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                self.failures += 1
+
+def run(args):
+    transport = args.transport or default_transport()
+    config = load_config(args.config)
+    print(f"准备 {args.clients} 个用户, 每 {args.room_size} 人一个群聊...")
+    members, room_sizes = prepare_users(config, args.clients, args.room_size)
+
+    server = ServerProcess(args.config, free_port(), args.server_log)
+    stats = Stats()
+    clients = []
+    try:
+        server.wait_ready()
+        print(f"服务端已启动: {server.url} (pid {server.process.pid}), 客户端传输方式: {transport}")
+
+        clients = [ChatClient(i, username, conversation_id, stats)
+                   for i, (username, conversation_id) in enumerate(members)]
+        connect_started = time.perf_counter()
+        failed = 0
+        with ThreadPoolExecutor(max_workers=min(50, len(clients))) as pool:
+            futures = [pool.submit(client.start, server.url, transport) for client in clients]
+            for future in futures:
+                if future.exception() is not None:
+                    failed += 1
+        connect_elapsed = time.perf_counter() - connect_started
+        connected = [client for client in clients if client.sio.connected]
+        print(f"{len(connected)} 个客户端已登录并加入群聊 ({failed} 个失败), 耗时 {connect_elapsed:.1f}s")
+        if not connected:
+            raise RuntimeError("没有客户端连接成功")
+
+        # 每条消息应投递给发送者所在群聊中已连接的全部成员 (包括自己)
+        online = {}
+        for client in connected:
+            online[client.conversation_id] = online.get(client.conversation_id, 0) + 1
+
+        server.start_sampling()
+        logins = LoginStorm(server.url, [username for username, _ in members], args.login_rate) \
+            if args.login_rate > 0 else None
+        cpu_before, wall_before = server.cpu_seconds(), time.perf_counter()
+        if logins:
+            logins.start()
+        interval = 1 / args.rate
+        sent = expected = 0
+        next_send = time.perf_counter()
+        deadline = next_send + args.duration
+        while next_send < deadline:
+            client = connected[sent % len(connected)]
+            try:
+                client.send(sent)
+                expected += online[client.conversation_id]
+            except Exception:
+                stats.record_error()
+            sent += 1
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        send_elapsed = time.perf_counter() - wall_before
+        if logins:
+            logins.stop()
+
+        drain_deadline = time.time() + args.drain_timeout
+        while stats.delivered < expected and time.time() < drain_deadline:
+            time.sleep(0.1)
+        elapsed = time.perf_counter() - wall_before
+        cpu_after = server.cpu_seconds()
+    finally:
+        for client in clients:
+            if client.sio.connected:
+                client.sio.disconnect()
+        server.stop()
+
+    latencies = stats.latencies
+    cpu = (cpu_after - cpu_before) / elapsed * 100 if cpu_before is not None and cpu_after is not None else None
+    return {
+        'clients': args.clients,
+        'connected': len(connected),
+        'room_size': args.room_size,
+        'transport': transport,
+        'target_rate': args.rate,
+        'sent': sent,
+        'send_rate': sent / send_elapsed,
+        'expected_deliveries': expected,
+        'delivered': len(latencies),
+        'dropped': max(0, expected - len(latencies)),
+        'errors': stats.errors,
+        'deliveries_per_sec': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': max(latencies) if latencies else None,
+        'login_rate': args.login_rate,
+        'logins': len(logins.latencies) if logins else 0,
+        'login_failures': logins.failures if logins else 0,
+        'login_p50_ms': percentile(logins.latencies, 50) if logins else None,
+        'login_p99_ms': percentile(logins.latencies, 99) if logins else None,
+        'server_cpu_percent': cpu,
+        'server_peak_rss_mb': server.peak_rss / 2**20 if server.peak_rss else None,
+    }
+
+def main():
+    args = parse_args()
+    result = run(args)
+
+    print(f"\n客户端: {result['connected']}/{result['clients']}, 群聊人数: {result['room_size']}, 传输: {result['transport']}")
+    print(f"发送: {result['sent']} 条 ({fmt(result['send_rate'])} 条/s, 目标 {fmt(result['target_rate'])} 条/s)")
+    print(f"投递: {result['delivered']}/{result['expected_deliveries']} ({fmt(result['deliveries_per_sec'])} 次/s), "
+          f"丢失: {result['dropped']}, 错误: {result['errors']}")
+    print(f"端到端延迟: p50 {fmt(result['p50_ms'], 2)}ms, p99 {fmt(result['p99_ms'], 2)}ms, max {fmt(result['max_ms'], 2)}ms")
+    if result['login_rate']:
+        print(f"登录: {result['logins']} 次成功, {result['login_failures']} 次失败 (目标 {fmt(result['login_rate'])} 次/s), "
+              f"延迟 p50 {fmt(result['login_p50_ms'], 2)}ms, p99 {fmt(result['login_p99_ms'], 2)}ms")
+    print(f"服务端: CPU {fmt(result['server_cpu_percent'])}%, 内存峰值 {fmt(result['server_peak_rss_mb'])}MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+    if result['dropped'] or result['errors'] or result['login_failures']:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+"""压测脚本共用的工具函数（不导入 eventlet, 不需要 monkey_patch 的脚本也可以使用）"""
+
+def load_config(path):
+    module_name, class_name = path.rsplit('.', 1)
+    module = __import__(module_name, fromlist=[class_name])
+    return getattr(module, class_name)
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def fmt(value, digits=1):
+    return '-' if value is None else f"{value:.{digits}f}"
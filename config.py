@@ -1,5 +1,6 @@
 # 配置文件
 import os
+import tempfile
 from datetime import timedelta
 from dotenv import load_dotenv
 
@@ -14,6 +15,65 @@ class Config:
     TESTING = os.getenv("TESTING", "False") == "True"
     DEFAULT_AVATAR_URL = "../../static/user.jpeg" # 默认头像URL
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'} # 允许上传的文件格式
+    LOG_LEVEL = os.getenv("LOG_LEVEL")  # 日志级别 (DEBUG/INFO/WARNING...), 默认调试模式为 DEBUG, 否则为 INFO
+    SOCKETIO_ASYNC_MODE = os.getenv("SOCKETIO_ASYNC_MODE")  # 默认 eventlet monkey_patch 后用 eventlet, 否则 threading
+
+    # 多进程部署 (见 serve.py 和 app/utils/lifecycle.py)
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE")  # 如 redis://localhost:6379/0, 多个 worker 时必须配置
+    SOCKETIO_CHANNEL = os.getenv("SOCKETIO_CHANNEL", "flask-socketio")  # 消息队列频道, 同一队列上的多套服务需区分
+    SOCKETIO_TRANSPORTS = os.getenv("SOCKETIO_TRANSPORTS", "").split(",") if os.getenv("SOCKETIO_TRANSPORTS") else None  # 多个 worker 时为 websocket (轮询请求无法保证落到同一进程)
+    WORKER_DRAIN_TIMEOUT = int(os.getenv("WORKER_DRAIN_TIMEOUT", "30"))  # 收到 SIGTERM 后等待处理中请求的最长秒数
+    WORKER_RECONNECT_JITTER = float(os.getenv("WORKER_RECONNECT_JITTER", "5"))  # 通知客户端重连时的随机等待上限 (秒)
+    METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "False") == "True"  # /api/metrics/* 是否在服务端口开放 (默认只在 --health-port 内部端口提供)
+
+    # 缓存配置
+    CACHE_ENABLED = os.getenv("CACHE_ENABLED", "True") == "True"
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # 缓存后端, 见 app/utils/cache.py BACKENDS
+    CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", "30"))  # 默认过期秒数
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))  # 每个命名空间的最大条目数
+    CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", "1024")) # 日历汇总缓存容量 (用户, 年, 月)
+    CALENDAR_CACHE_TTL = int(os.getenv("CALENDAR_CACHE_TTL", "300"))  # 日历汇总过期秒数 (订单创建/删除、成员或状态变化时主动失效, 多进程时需配置 SOCKETIO_MESSAGE_QUEUE 才能清除其他进程的缓存)
+    JWT_USER_CACHE_SIZE = int(os.getenv("JWT_USER_CACHE_SIZE", "10000"))  # JWT 当前用户精简信息缓存容量
+    JWT_USER_CACHE_TTL = int(os.getenv("JWT_USER_CACHE_TTL", "60"))  # 过期秒数 (资料修改/上传头像/删除用户时主动失效)
+
+    # 数据库连接池配置 (见 app/utils/db_pool.py, 可用 benchmarks/pool_sizing.py 压测选择合适的大小)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))  # 常驻连接数
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))  # 高峰期可额外创建的连接数
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))  # 等待空闲连接的最长秒数
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # 连接最长使用秒数, 需小于 MySQL wait_timeout
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True") == "True"  # 取出连接前检测是否可用, 避免使用已被断开的连接
+
+    # 读写分离 (见 app/utils/db_routing.py): 配置从库地址后, 标记 @read_replica 的只读接口使用从库
+    SQLALCHEMY_BINDS = {"replica": os.getenv("REPLICA_DATABASE_URL")} if os.getenv("REPLICA_DATABASE_URL") else {}
+    REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))  # 用户提交修改后继续读主库的秒数
+
+    # 订单生命周期调度 (见 app/utils/order_scheduler.py)
+    ORDER_SCHEDULER_ENABLED = {"True": True, "False": False}.get(os.getenv("ORDER_SCHEDULER_ENABLED"))  # wsgi.py 启动时是否在后台运行调度器; 未设置时单进程 (python wsgi.py) 开启, serve.py 的 worker 关闭 (设为 True 时在 0 号 worker 开启, 或用 flask order-scheduler)
+    ORDER_SCHEDULER_INTERVAL = int(os.getenv("ORDER_SCHEDULER_INTERVAL", "30"))  # 从数据库补充待处理订单的间隔秒数
+    ORDER_SCHEDULER_BATCH_SIZE = int(os.getenv("ORDER_SCHEDULER_BATCH_SIZE", "500"))  # 每条 UPDATE 最多修改的订单数
+    TRIP_DURATION_MINUTES = int(os.getenv("TRIP_DURATION_MINUTES", "120"))  # 出发多久后进入待付款
+
+    # 数据归档 (flask archive, 见 app/models/archive.py)
+    ARCHIVE_ORDER_DAYS = int(os.getenv("ARCHIVE_ORDER_DAYS", "180"))  # 出发超过多少天的已完成/已拒绝订单归档
+    ARCHIVE_MESSAGE_DAYS = int(os.getenv("ARCHIVE_MESSAGE_DAYS", "365"))  # 超过多少天的聊天消息归档
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))  # 每批迁移的订单/消息数
+
+    # 增量同步 (见 app/routes/sync_api.py, 过期变更记录用 flask prune-changelog 清理)
+    CHANGELOG_GAP_SECONDS = int(os.getenv("CHANGELOG_GAP_SECONDS", "60"))  # 同步令牌不越过该时间内出现的序号空洞, 需大于最长事务耗时
+    CHANGELOG_RETENTION_DAYS = int(os.getenv("CHANGELOG_RETENTION_DAYS", "30"))  # 变更记录保留天数, 更早的令牌需要全量同步
+
+    # 密码哈希 (见 app/utils/passwords.py)
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")  # werkzeug 格式, 修改后用户下次登录时自动重新哈希
+    PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", "4"))  # 同时计算哈希的线程数上限, 建议不超过 CPU 核数
+
+    # 请求性能剖析 (见 app/utils/profiler.py, 结果用 flask list-profiles / flask show-profile 查看)
+    PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "False") == "True"
+    PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")  # 请求头 X-Profile 或参数 __profile 等于该值时剖析此请求
+    PROFILER_SAMPLE_RATE = int(os.getenv("PROFILER_SAMPLE_RATE", "0"))  # 每 N 个请求剖析 1 个, 0 表示不抽样
+    PROFILER_MODE = os.getenv("PROFILER_MODE", "cprofile")  # cprofile (.prof) 或 sampling (折叠栈 .collapsed)
+    PROFILER_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILER_SAMPLE_INTERVAL_MS", "5"))  # sampling 模式的采样间隔
+    PROFILER_DIR = os.getenv("PROFILER_DIR", "logs/profiles")  # 相对于 app 目录, 与应用日志在一起
+    PROFILER_MAX_FILES = int(os.getenv("PROFILER_MAX_FILES", "500"))  # 只保留最近的 N 个剖析文件
 
     # JWT 配置
     # JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", SECRET_KEY)  # 默认使用SECRET_KEY
@@ -28,6 +88,8 @@ class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.getenv("DEV_DATABASE_URL", "sqlite:///dev.db")
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=3)  # 开发环境延长有效期
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
 
 class TestingConfig(Config):
     """测试环境配置"""
@@ -36,6 +98,19 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.getenv("TEST_DATABASE_URL", "sqlite:///test.db")
     SQLALCHEMY_ECHO = False  # 测试时关闭SQL日志
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(seconds=300)  # 测试环境短有效期
+    DB_POOL_SIZE = 5
+    DB_MAX_OVERFLOW = 10
+    DB_POOL_PRE_PING = False  # 本地 SQLite 无需检测连接
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"  # 测试时使用低成本哈希
+
+class BenchmarkConfig(TestingConfig):
+    """压测配置（benchmarks/ 下的脚本使用, 独立的数据库文件, 不影响单元测试）"""
+    ENV = "benchmark"
+    # 默认放在系统临时目录, 压测数据不进入项目目录
+    SQLALCHEMY_DATABASE_URI = os.getenv("BENCHMARK_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'carpool_benchmark.db')}")
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=3)  # 大规模压测耗时较长
+    METRICS_PUBLIC = True  # 压测脚本直接请求指标接口
+    PASSWORD_HASH_METHOD = Config.PASSWORD_HASH_METHOD  # 与生产环境相同的哈希成本
 
 class ProductionConfig(Config):
     """生产环境配置"""
@@ -44,4 +119,6 @@ class ProductionConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.getenv("PROD_DATABASE_URL", "sqlite:///prod.db")
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")  # 生产环境必须显式配置
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=30)  # 生产环境较短有效期
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "30"))
     # 其他生产环境配置
\ No newline at end of file
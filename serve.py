@@ -0,0 +1,187 @@
+import os, sys, argparse, logging, select, signal, subprocess, time
+
+"""
+多进程启动 (生产环境)
+
+主进程不加载应用, 只负责启动和看护 N 个 worker (每个 worker 是一个独立的 wsgi.py 进程, 环境变量
+WORKER_ID 为编号). worker 的监听套接字设置 SO_REUSEPORT, 共用同一端口, 由内核把新连接分配给各个 worker.
+
+python serve.py --workers 4 --port 5000 --config config.ProductionConfig --health-port 9000
+
+信号:
+- SIGTERM / SIGINT: 所有 worker 优雅退出 (通知 Socket.IO 客户端重连, 等待处理中的请求), 然后主进程退出
+- SIGHUP: 滚动重启, 逐个启动新 worker (加载新代码和配置), 新 worker 开始监听后再让对应的旧 worker 退出,
+  整个过程中始终有 N 个 worker 在服务
+worker 意外退出时自动重新启动.
+
+注意:
+- 多个 worker 时必须配置 SOCKETIO_MESSAGE_QUEUE (如 redis://), 否则拒绝启动: 推送 (含订单广场, 各 worker 按本地订阅匹配)
+  都经消息队列转发到其他 worker 上的客户端
+- 读己之写的粘滞标记随签名 Cookie 返回客户端 (app/utils/db_routing.py), 不依赖某个 worker 的进程内缓存
+- 长轮询的多次请求可能落到不同 worker, 多个 worker 时默认 SOCKETIO_TRANSPORTS=websocket
+- 订单状态调度器默认不在 worker 中运行: 设置 ORDER_SCHEDULER_ENABLED=True (只在 0 号 worker 运行) 或单独运行 flask order-scheduler
+- --health-port 为每个 worker 额外监听 端口+WORKER_ID, 可分别检查 /api/health; /api/metrics/* 只在该端口开放
+- 进程内缓存 (app/utils/cache.py) 各 worker 独立, 其他 worker 上的缓存只能等过期
+"""
+
+logger = logging.getLogger('serve')
+
+class WorkerSupervisor:
+    """启动、看护和滚动重启 worker 进程"""
+
+    def __init__(self, command, workers=2, drain_timeout=30, ready_timeout=60, env=None):
+        """
+        :param command: worker 命令行, 每个 worker 额外得到 WORKER_ID / WORKER_READY_FD 环境变量
+        :param drain_timeout: 等待 worker 优雅退出的秒数, 超时后强制结束
+        :param ready_timeout: 等待新 worker 开始监听的秒数
+        """
+        self.command = command
+        self.workers = workers
+        self.drain_timeout = drain_timeout
+        self.ready_timeout = ready_timeout
+        self.env = env or {}
+        self.processes = {}  # {WORKER_ID: Popen}
+        self._spawned_at = {}
+        self._stopping = False
+        self._reload_requested = False
+
+    def spawn(self, slot):
+        """
+        启动一个 worker 并等待它开始监听
+        :return: (Popen, 是否就绪)
+        """
+        read_fd, write_fd = os.pipe()
+        env = {**os.environ, **self.env, 'WORKER_ID': str(slot), 'WORKER_READY_FD': str(write_fd)}
+        # 单独的会话: 终端 Ctrl-C 只发给主进程, 由主进程统一通知 worker 退出
+        process = subprocess.Popen(self.command, env=env, pass_fds=(write_fd,), start_new_session=True)
+        os.close(write_fd)
+        self._spawned_at[slot] = time.monotonic()
+        try:
+            ready = self._wait_ready(read_fd, process)
+        finally:
+            os.close(read_fd)
+        if ready:
+            logger.info(f"worker {slot} 已启动 (pid {process.pid})")
+        else:
+            logger.error(f"worker {slot} 未能在 {self.ready_timeout} 秒内开始监听 (pid {process.pid})")
+        return process, ready
+
+    def _wait_ready(self, fd, process):
+        deadline = time.monotonic() + self.ready_timeout
+        while time.monotonic() < deadline:
+            readable, _, _ = select.select([fd], [], [], 0.2)
+            if readable:
+                return os.read(fd, 1) == b'1'
+            if process.poll() is not None:
+                return False
+        return False
+
+    def retire(self, processes):
+        """向 worker 发送 SIGTERM, 等待优雅退出, 超时后强制结束"""
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+        deadline = time.monotonic() + self.drain_timeout + 5
+        for process in processes:
+            try:
+                process.wait(max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                logger.warning(f"worker pid {process.pid} 未在限定时间内退出, 强制结束")
+                process.kill()
+                process.wait()
+
+    def start(self):
+        for slot in range(self.workers):
+            self.processes[slot], _ = self.spawn(slot)
+
+    def reload(self):
+        """滚动重启: 新 worker 就绪后才让旧 worker 退出; 新 worker 启动失败时保留旧 worker 并停止重启"""
+        logger.info("开始滚动重启")
+        for slot in range(self.workers):
+            process, ready = self.spawn(slot)
+            if not ready:
+                self.retire([process])
+                logger.error("滚动重启已中止, 其余 worker 保持不变")
+                return False
+            old, self.processes[slot] = self.processes.get(slot), process
+            if old is not None:
+                self.retire([old])
+        logger.info("滚动重启完成")
+        return True
+
+    def check(self):
+        """重新启动意外退出的 worker (同一编号 1 秒内最多启动一次, 避免启动即崩溃时空转)"""
+        for slot, process in list(self.processes.items()):
+            if process.poll() is None or self._stopping:
+                continue
+            if time.monotonic() - self._spawned_at.get(slot, 0) < 1:
+                continue
+            logger.warning(f"worker {slot} (pid {process.pid}) 已退出, 退出码 {process.returncode}, 重新启动")
+            self.processes[slot], _ = self.spawn(slot)
+
+    def stop(self):
+        self._stopping = True
+        self.retire(list(self.processes.values()))
+        self.processes.clear()
+
+    def run(self):
+        """启动 worker 并看护, 直到收到 SIGTERM / SIGINT"""
+        def on_stop(signum, frame):
+            self._stopping = True
+
+        def on_reload(signum, frame):
+            self._reload_requested = True
+
+        signal.signal(signal.SIGTERM, on_stop)
+        signal.signal(signal.SIGINT, on_stop)
+        signal.signal(signal.SIGHUP, on_reload)
+
+        self.start()
+        try:
+            while not self._stopping:
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.reload()
+                self.check()
+                time.sleep(0.5)
+        finally:
+            logger.info("正在停止所有 worker")
+            self.stop()
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Multi-worker Flask SocketIO Server")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes')
+    parser.add_argument('--host', default='0.0.0.0', help='Host to bind')
+    parser.add_argument('--port', type=int, default=5000, help='Port shared by all workers')
+    parser.add_argument('--config', default='config.ProductionConfig', help='Config class path')
+    parser.add_argument('--health-port', type=int, help='Base port for per-worker health checks (port + WORKER_ID)')
+    parser.add_argument('--drain-timeout', type=int, default=int(os.getenv('WORKER_DRAIN_TIMEOUT', '30')),
+                        help='Seconds to wait for a worker to drain before killing it')
+    return parser.parse_args()
+
+def main():
+    """主函数入口"""
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - serve - %(levelname)s - %(message)s')
+
+    if args.workers > 1 and not os.getenv('SOCKETIO_MESSAGE_QUEUE'):
+        logger.error("多个 worker 时必须配置 SOCKETIO_MESSAGE_QUEUE, 否则推送无法送达其他 worker 上的客户端")
+        sys.exit(1)
+
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wsgi.py'),
+               '--host', args.host, '--port', str(args.port), '--config', args.config]
+    if args.health_port:
+        command += ['--health-port', str(args.health_port)]
+
+    env = {'WORKER_DRAIN_TIMEOUT': str(args.drain_timeout)}
+    if args.workers > 1 and not os.getenv('SOCKETIO_TRANSPORTS'):
+        env['SOCKETIO_TRANSPORTS'] = 'websocket'
+
+    supervisor = WorkerSupervisor(command, args.workers, drain_timeout=args.drain_timeout, env=env)
+    logger.info(f"主进程 pid {os.getpid()}: {args.workers} 个 worker 监听 {args.host}:{args.port} "
+                f"(kill -HUP {os.getpid()} 滚动重启)")
+    supervisor.run()
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,109 @@
 # pytest 的全局 fixture 配置
+import itertools
+from datetime import datetime, timedelta
 import pytest
+from flask_jwt_extended import create_access_token
+from socketio.pubsub_manager import PubSubManager
 from app import create_app
-from app.extensions import db
+from app.models import User
+from app.extensions import db, socketio
+from app.utils.socketio_queue import BroadcastMixin
 
 @pytest.fixture
 def app():
     app = create_app('config.TestingConfig')
-    
+
     with app.app_context():
         db.create_all()
         yield app
+        db.session.remove()
         db.drop_all()
 
 @pytest.fixture
 def client(app):
-    return app.test_client()
\ No newline at end of file
+    return app.test_client()
+
+@pytest.fixture
+def test_user(app):
+    """创建测试用户"""
+    with app.app_context():
+        user = User(
+            username='testuser',
+            realname='Test User',
+            identity_id='310101200407154222',
+            gender='male',
+            telephone='15800993469',
+            password='password123'
+        )
+        db.session.add(user)
+        db.session.commit()
+        return user.user_id
+
+@pytest.fixture
+def auth_headers(app, test_user):
+    """获取认证头"""
+    with app.app_context():
+        access_token = create_access_token(identity=str(test_user))
+        return {'Authorization': f'Bearer {access_token}'}
+
+@pytest.fixture
+def create_users(app):
+    """批量创建测试用户: create_users(count) 返回 [(user_id, 认证头)]，同一测试内多次调用编号连续"""
+    numbers = itertools.count()
+
+    def create(count):
+        users = [User(
+            username=f'user{i}',
+            realname=f'User {i}',
+            identity_id=f'3101012004071542{i:02d}',
+            gender='male',
+            telephone=f'158009934{i:02d}',
+            password='password123'
+        ) for i in [next(numbers) for _ in range(count)]]
+        db.session.add_all(users)
+        db.session.commit()
+        return [(user.user_id, {'Authorization': f'Bearer {create_access_token(identity=str(user.user_id))}'})
+                for user in users]
+    return create
+
+@pytest.fixture
+def create_order(client):
+    """通过接口发布订单（待审核状态）: create_order(user_id, 认证头, ...) 返回接口的 data（含 order_id、conversation_id）"""
+    def create(user_id, headers, departure=None, identity='driver', start_loc='北京西站', price=20, seats=3):
+        response = client.post('/api/orders', json={
+            'identity': identity,
+            'startAddress': start_loc,
+            'endAddress': '首都机场',
+            'departureTime': (departure or datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S'),
+            'price': price,
+            'initiator_id': user_id,
+            'order_type': '车找人' if identity == 'driver' else '人找车',
+            'availableSeats': seats,
+            'passengerCount': 1
+        }, headers=headers)
+        assert response.json['code'] == 200
+        return response.json['data']
+    return create
+
+class MemoryQueueManager(BroadcastMixin, PubSubManager):
+    """内存中的消息队列: 记录发布的消息, 监听时依次返回 incoming 中的消息"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.published = []
+        self.incoming = []
+
+    def _publish(self, data):
+        self.published.append(data)
+
+    def _listen(self):
+        yield from self.incoming
+
+@pytest.fixture
+def memory_queue(app):
+    """创建模拟一个进程的内存消息队列管理器 (manager._thread() 处理 incoming 中的消息后返回)"""
+    def create():
+        manager = MemoryQueueManager()
+        manager.set_server(socketio.server)
+        return manager
+    return create
@@ -0,0 +1,131 @@
+import pytest
+from click.testing import CliRunner
+from app.models import (Order, OrderParticipant, Conversation, ConversationParticipant, Message,
+                        OrderArchive, OrderParticipantArchive, ConversationArchive,
+                        ConversationParticipantArchive, MessageArchive, OrderDailyStat)
+from app.extensions import db
+from datetime import datetime, timedelta
+
+def create_finished_order(create_order, driver_id, headers, passenger_id, days_ago, status='completed'):
+    """发布订单并加入一名乘客，然后改为 days_ago 天前已结束，返回 (订单ID, 群聊ID)"""
+    created = create_order(driver_id, headers)
+    order_id, conversation_id = created['order_id'], created['conversation_id']
+    order = db.session.get(Order, order_id)
+    order.status = status
+    order.start_time = datetime.now() - timedelta(days=days_ago)
+    db.session.add(OrderParticipant(order_id=order_id, participator_id=passenger_id, identity='passenger'))
+    db.session.add(ConversationParticipant(conversation_id=conversation_id, user_id=passenger_id))
+    db.session.add(Message(conversation_id=conversation_id, sender_id=driver_id, content='出发了'))
+    db.session.commit()
+    return order_id, conversation_id
+
+def trip_ids(client, headers, **params):
+    response = client.get('/api/orders/user/trips/list', query_string=params, headers=headers)
+    assert response.json['code'] == 200
+    return [trip['id'] for trip in response.json['data']]
+
+
+# ================ 路径测试 ================
+
+def test_archive_moves_finished_orders_with_conversations(client, create_users, create_order):
+    """路径测试：旧的已结束订单连同参与者、群聊、成员和消息分批迁移到归档表，新订单保留"""
+    (driver_id, driver_headers), (passenger_id, passenger_headers) = create_users(2)
+    old_orders = [create_finished_order(create_order, driver_id, driver_headers, passenger_id, days_ago=40),
+                  create_finished_order(create_order, driver_id, driver_headers, passenger_id, days_ago=50, status='rejected')]
+    recent_id, recent_conv = create_finished_order(create_order, driver_id, driver_headers, passenger_id, days_ago=5)
+
+    # 私聊中引用旧订单的邀请消息
+    private = Conversation(type='private', order_id=old_orders[0][0])
+    db.session.add(private)
+    db.session.flush()
+    invitation = Message(conversation_id=private.id, sender_id=driver_id, content='邀请',
+                         message_type='invitation', order_id=old_orders[0][0])
+    db.session.add(invitation)
+    db.session.commit()
+    OrderDailyStat.rebuild()
+    db.session.commit()
+    stats_before = {(row.stat_date, row.status): (row.order_count, row.matched_count) for row in OrderDailyStat.query.all()}
+
+    archived = OrderArchive.archive_before(datetime.now() - timedelta(days=30), batch_size=1)
+    assert archived == 2
+
+    db.session.expire_all()
+    old_ids = [order_id for order_id, _ in old_orders]
+    old_convs = [conversation_id for _, conversation_id in old_orders]
+    assert Order.query.filter(Order.order_id.in_(old_ids)).count() == 0
+    assert OrderParticipant.query.filter(OrderParticipant.order_id.in_(old_ids)).count() == 0
+    assert Conversation.query.filter(Conversation.id.in_(old_convs)).count() == 0
+    assert Message.query.filter(Message.conversation_id.in_(old_convs)).count() == 0
+    assert {row.order_id for row in OrderArchive.query.all()} == set(old_ids)
+    assert OrderParticipantArchive.query.count() == 4  # 每个订单: 司机 + 乘客
+    assert {row.id for row in ConversationArchive.query.all()} == set(old_convs)
+    assert ConversationParticipantArchive.query.count() == 4
+    assert MessageArchive.query.filter(MessageArchive.conversation_id.in_(old_convs)).count() >= 2
+
+    # 新订单不受影响, 私聊保留但解除与订单的关联
+    assert db.session.get(Order, recent_id) is not None
+    assert Message.query.filter_by(conversation_id=recent_conv).count() >= 1
+    assert db.session.get(Conversation, private.id).order_id is None
+    assert db.session.get(Message, invitation.id).order_id is None
+
+    # 行程记录默认只查热表, include_archived 时合并归档表
+    assert trip_ids(client, passenger_headers) == [recent_id]
+    assert trip_ids(client, passenger_headers, include_archived='true') == [recent_id] + old_ids
+    page = client.get('/api/orders/user/trips/list', query_string={'include_archived': 'true'},
+                      headers=driver_headers).json['data']
+    assert [len(trip['participants']) for trip in page] == [2, 2, 2]
+
+    # 统计重建时包含归档订单
+    OrderDailyStat.rebuild()
+    db.session.commit()
+    stats_after = {(row.stat_date, row.status): (row.order_count, row.matched_count) for row in OrderDailyStat.query.all()}
+    assert stats_after == stats_before
+
+def test_archive_old_messages_keeps_read_marks(client, create_users, create_order):
+    """路径测试：旧消息归档时保留仍被成员作为最后已读位置的消息"""
+    (driver_id, driver_headers), (passenger_id, _) = create_users(2)
+    order_id, conversation_id = create_finished_order(create_order, driver_id, driver_headers, passenger_id,
+                                                      days_ago=1, status='not-started')
+    old_time = datetime.now() - timedelta(days=400)
+    messages = [Message(conversation_id=conversation_id, sender_id=driver_id, content=f'旧消息{i}', created_at=old_time)
+                for i in range(3)]
+    db.session.add_all(messages)
+    db.session.flush()
+    ConversationParticipant.query.filter_by(conversation_id=conversation_id, user_id=passenger_id).one() \
+        .last_read_message_id = messages[1].id
+    db.session.commit()
+    message_ids = [message.id for message in messages]
+
+    runner = CliRunner()
+    result = runner.invoke(client.application.cli, ['archive', '--message-days', '365', '--batch-size', '1'])
+    assert result.exit_code == 0, result.output
+
+    db.session.expire_all()
+    remaining = {message.id for message in Message.query.filter_by(conversation_id=conversation_id).all()}
+    assert message_ids[1] in remaining
+    assert message_ids[0] not in remaining and message_ids[2] not in remaining
+    assert {row.id for row in MessageArchive.query.all()} == {message_ids[0], message_ids[2]}
+    assert db.session.get(Order, order_id) is not None
+
+def test_message_history_includes_archived_messages(client, create_users, create_order):
+    """路径测试：消息记录默认只查热表, include_archived 时合并归档的旧消息；会话列表回退到归档的最后一条消息"""
+    (driver_id, driver_headers), (passenger_id, passenger_headers) = create_users(2)
+    _, conversation_id = create_finished_order(create_order, driver_id, driver_headers, passenger_id,
+                                               days_ago=1, status='not-started')
+    Message.query.filter_by(conversation_id=conversation_id).delete()
+    old_time = datetime.now() - timedelta(days=400)
+    db.session.add_all([Message(conversation_id=conversation_id, sender_id=driver_id, content=f'旧消息{i}',
+                                created_at=old_time + timedelta(minutes=i)) for i in range(2)])
+    db.session.commit()
+
+    assert MessageArchive.archive_before(datetime.now() - timedelta(days=365)) == 2
+    url = f'/api/chat/conversations/{conversation_id}/messages'
+
+    assert client.get(url, headers=passenger_headers).json['data'] == []
+    history = client.get(url, query_string={'include_archived': 'true'}, headers=passenger_headers).json['data']
+    assert [message['content'] for message in history] == ['旧消息0', '旧消息1']
+    assert history[0]['sender']['user_id'] == driver_id
+
+    conversations = client.get('/api/chat/conversations', headers=passenger_headers).json['data']
+    assert [conv['last_message']['content'] for conv in conversations if conv['conversation_id'] == conversation_id] \
+        == ['旧消息1']
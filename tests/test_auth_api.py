@@ -331,3 +331,111 @@ def test_refresh_token_with_expired_token(client, app, test_user):
         assert 'message' in response.json
         assert 'Token已过期，请重新登录' in response.json['message']
 
+
+def test_login_rehashes_outdated_password(client, app, test_user):
+    """路径测试：哈希参数调整后，登录成功时用新参数重新计算密码哈希，登录失败时不修改"""
+    user = db.session.get(User, test_user)
+    assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+    assert not user.password_needs_rehash()
+
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    old_hash = user.password_hash
+    assert user.password_needs_rehash()
+
+    response = client.post('/api/auth/login', json={'username': 'testuser', 'password': 'wrong'})
+    assert response.status_code == 401
+    db.session.expire_all()
+    assert db.session.get(User, test_user).password_hash == old_hash
+
+    response = client.post('/api/auth/login', json={'username': 'testuser', 'password': 'password123'})
+    assert response.status_code == 200
+    db.session.expire_all()
+    user = db.session.get(User, test_user)
+    assert user.password_hash.startswith('pbkdf2:sha256:2000$')
+    assert not user.password_needs_rehash()
+    assert user.verify_password('password123')
+
+    # 只写方法名时按补全默认参数后的结果比较
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2'
+    assert user.password_needs_rehash()
+
+def test_login_fast_path_and_refresh(client, app, test_user):
+    """路径测试：登录只执行一次查询并返回头像地址和 refresh_token，refresh_token 可换取新的 access_token"""
+    from sqlalchemy import event
+    from app.models import Manager
+
+    user = db.session.get(User, test_user)
+    user.user_avatar = b'\x89PNG' * 1000
+    db.session.add(Manager(user_id=test_user))
+    db.session.commit()
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = client.post('/api/auth/login', json={'username': 'testuser', 'password': 'password123'})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    assert response.status_code == 200
+    assert len(statements) == 1
+    assert 'user_avatar IS NOT NULL' in statements[0]
+    data = response.json['data']
+    assert data['user']['avatar'] == f'/api/user/{test_user}/avatar?sig={User.avatar_signature(test_user)}'
+    assert data['user']['is_manager'] is True
+
+    response = client.post('/api/auth/refresh', headers={'Authorization': f"Bearer {data['refresh_token']}"})
+    assert response.status_code == 200
+    new_token = response.json['data']['access_token']
+    claims = jwt.decode(new_token, options={'verify_signature': False})
+    assert claims['sub'] == str(test_user)
+    assert claims['user_info']['username'] == 'testuser'
+
+    # access_token 不能用于刷新
+    response = client.post('/api/auth/refresh', headers={'Authorization': f"Bearer {data['access_token']}"})
+    assert response.status_code != 200
+
+def test_register_single_probe_and_conflict(client, app, test_user, monkeypatch):
+    """路径测试：注册只用一次查询检查唯一字段并一次提交，并发注册冲突时返回 409"""
+    from sqlalchemy import event
+
+    data = {
+        'username': 'another',
+        'realname': 'Another User',
+        'identity_id': '310101200407154299',
+        'gender': 'female',
+        'telephone': '15800993499',
+        'password': 'password123'
+    }
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement.split()[0].upper())
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = client.post('/api/auth/register', json=data)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert response.json['code'] == 200
+    assert statements.count('SELECT') == 1 and statements.count('INSERT') == 1
+    assert db.session.get(User, response.json['data']['userId']).last_active is not None
+
+    assert User.find_conflicts('testuser', '15800993499', 'none') == ['username', 'telephone']
+
+    # 检查通过后被并发注册占用: 唯一约束拦截并返回冲突
+    monkeypatch.setattr(User, 'find_conflicts', classmethod(lambda cls, *args: []))
+    response = client.post('/api/auth/register', json={**data, 'username': 'third'})
+    assert response.status_code == 409
+    assert response.json['message'] == User.CONFLICT
+
+def test_seed_users_command(app):
+    """路径测试：seed-users 批量创建可登录的测试用户"""
+    from click.testing import CliRunner
+
+    result = CliRunner().invoke(app.cli, ['seed-users', '--count', '25', '--chunk', '10', '--prefix', 'load'])
+    assert result.exit_code == 0, result.output
+    users = User.query.filter(User.username.like('load_%')).all()
+    assert len(users) == 25
+    assert len({user.identity_id for user in users}) == 25
+    assert User.calculate_age(users[0].identity_id) > 0
+    assert users[0].verify_password('password123')
@@ -0,0 +1,64 @@
+import pytest
+from click.testing import CliRunner
+from datetime import datetime
+from decimal import Decimal
+from app.extensions import db
+from app.models import User, Conversation, Message
+
+def create_rows():
+    """创建带头像、金额、时间和空值的用户，以及一段会话消息"""
+    users = [User(username=f'user{i}', realname=f'用户{i}', identity_id=f'3101012004071542{i:02d}', gender='male',
+                  telephone=f'158009934{i:02d}', password='password123', rate=Decimal('4.50'),
+                  user_avatar=b'\x00\xffavatar' if i == 0 else None) for i in range(3)]
+    db.session.add_all(users)
+    conversation = Conversation(type='group', title='北京西站→首都机场')
+    db.session.add(conversation)
+    db.session.flush()
+    db.session.add_all([Message(conversation_id=conversation.id, sender_id=users[0].user_id, content=content,
+                                created_at=datetime(2025, 5, 1, 8, 0, i, 123456))
+                        for i, content in enumerate(['出发了', '', '带,逗号"和引号\n换行'])])
+    db.session.commit()
+
+def snapshot(table):
+    return [tuple(row) for row in db.session.execute(table.select().order_by(*table.primary_key.columns))]
+
+
+# ================ 路径测试 ================
+
+@pytest.mark.parametrize('suffix', ['ndjson', 'csv'])
+def test_export_import_round_trip(app, tmp_path, suffix):
+    """路径测试：导出后清空表再导入，数据（含二进制、金额、时间、空值和空字符串）完全一致"""
+    create_rows()
+    runner = CliRunner()
+    expected = {}
+    for name in ('user', 'messages'):
+        table = db.metadata.tables[name]
+        expected[name] = snapshot(table)
+        path = tmp_path / f'{name}.{suffix}'
+        result = runner.invoke(app.cli, ['export', name, str(path), '--chunk', '2'])
+        assert result.exit_code == 0, result.output
+        assert path.read_text(encoding='utf-8')
+
+    db.session.execute(db.metadata.tables['messages'].delete())
+    db.session.execute(db.metadata.tables['user'].delete())
+    db.session.commit()
+
+    for name in ('user', 'messages'):
+        result = runner.invoke(app.cli, ['import', name, str(tmp_path / f'{name}.{suffix}'), '--chunk', '2'])
+        assert result.exit_code == 0, result.output
+        assert snapshot(db.metadata.tables[name]) == expected[name]
+
+    assert db.session.get(User, 1).verify_password('password123')
+
+def test_import_rejects_unknown_table_and_column(app, tmp_path):
+    """路径测试：表名或列名不存在时报错，不写入数据"""
+    runner = CliRunner()
+    result = runner.invoke(app.cli, ['export', 'no_such_table', str(tmp_path / 'x.ndjson')])
+    assert result.exit_code != 0
+    assert '表不存在' in result.output
+
+    path = tmp_path / 'bad.ndjson'
+    path.write_text('{"id": 1, "nickname": "x"}\n', encoding='utf-8')
+    result = runner.invoke(app.cli, ['import', 'messages', str(path)])
+    assert result.exit_code != 0
+    assert Message.query.count() == 0
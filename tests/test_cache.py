@@ -0,0 +1,108 @@
+import pytest
+import time
+from types import SimpleNamespace
+from app.models import User
+from app.extensions import db, cache
+from app.utils.cache import Cache, MemoryCacheBackend, INVALIDATE_EVENT
+from app.utils.lifecycle import HEALTH_LISTENER
+
+# ================ 语句测试 ================
+
+def test_memory_backend_lru_and_ttl():
+    """语句测试：命名空间容量满时淘汰最久未使用的条目，过期条目视为未命中"""
+    backend = MemoryCacheBackend(default_ttl=30, max_entries=2)
+    backend.set('ns', 'a', 1)
+    backend.set('ns', 'b', 2)
+    assert backend.get('ns', 'a') == 1      # a 变为最近使用
+    backend.set('ns', 'c', 3)               # 淘汰 b
+    assert backend.get('ns', 'b') is None
+    assert backend.get('other', 'a') is None
+
+    backend.set('ns', 'short', 4, ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get('ns', 'short') is None
+
+    stats = backend.stats()['ns']
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['evictions'] == 2
+    assert stats['expired'] == 1
+
+def test_memory_backend_skips_stale_write():
+    """语句测试：计算期间命名空间被清空时，放弃写入旧结果"""
+    backend = MemoryCacheBackend()
+    generation = backend.generation('ns')
+    backend.clear('ns')
+    backend.set('ns', 'key', 'stale', generation=generation)
+    assert backend.get('ns', 'key') is None
+
+def test_cached_route_invalidated_on_commit(client, app, test_user, auth_headers):
+    """语句测试：车辆列表命中缓存，添加车辆提交后自动失效"""
+    first = client.get('/api/user/cars', headers=auth_headers)
+    assert first.json['data']['count'] == 0
+    second = client.get('/api/user/cars', headers=auth_headers)
+    assert second.json == first.json
+
+    stats = client.get('/api/metrics/cache', environ_overrides={HEALTH_LISTENER: True}).json['data']['user_cars']
+    print(f"\n缓存指标: {stats}")
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+    response = client.post('/api/user/cars/add', json={
+        'number': '沪A12345', 'color': '白色', 'model': '大众朗逸', 'seats': 5
+    }, headers=auth_headers)
+    assert response.json['code'] == 200
+
+    third = client.get('/api/user/cars', headers=auth_headers)
+    assert third.json['data']['count'] == 1
+
+def test_cached_route_bulk_update_invalidates(client, app, test_user, auth_headers):
+    """语句测试：批量 UPDATE 语句同样触发失效"""
+    assert client.get('/api/user/basic', headers=auth_headers).json['data']['username'] == 'testuser'
+
+    db.session.execute(db.update(User).where(User.user_id == test_user).values(username='renamed'))
+    db.session.commit()
+
+    assert client.get('/api/user/basic', headers=auth_headers).json['data']['username'] == 'renamed'
+
+# ================ 路径测试 ================
+
+def test_cached_route_skips_errors(client):
+    """路径测试：参数错误的响应不写入缓存"""
+    response = client.get('/api/orders/not-started?identity=unknown')
+    assert response.status_code == 400
+    assert cache.stats()['orders_not_started']['sets'] == 0
+
+def test_cached_route_rollback_keeps_cache(client, app, test_user, auth_headers):
+    """路径测试：回滚的修改不触发失效"""
+    client.get('/api/user/basic', headers=auth_headers)
+    invalidations = cache.stats()['user_basic']['invalidations']
+
+    user = db.session.get(User, test_user)
+    user.username = 'rolled-back'
+    db.session.flush()
+    db.session.rollback()
+
+    assert cache.stats()['user_basic']['invalidations'] == invalidations
+    assert client.get('/api/user/basic', headers=auth_headers).json['data']['username'] == 'testuser'
+
+def test_invalidation_broadcasts_to_other_processes(app, memory_queue):
+    """路径测试：配置消息队列时 delete/clear 经队列广播，其他进程清除各自的缓存"""
+    sender, receiver = memory_queue(), memory_queue()
+    with app.app_context():
+        cache.init_app(app, SimpleNamespace(server=SimpleNamespace(manager=sender)))
+        remote = MemoryCacheBackend()
+        receiver.on_broadcast(INVALIDATE_EVENT, lambda message: Cache._invalidate(remote, **message))
+        for backend in (app.extensions['cache'], remote):
+            backend.set('calendar', '1:2030:5', ['2030-05-01'])
+            backend.set('orders_list', '/api/orders/list?', 'page')
+
+        cache.delete('calendar', '1:2030:5')
+        cache.clear('orders_list')
+        assert cache.get('calendar', '1:2030:5') is None and cache.get('orders_list', '/api/orders/list?') is None
+        assert remote.get('calendar', '1:2030:5') is not None
+
+        receiver.incoming = list(sender.published)
+        receiver._thread()
+        assert remote.get('calendar', '1:2030:5') is None
+        assert remote.get('orders_list', '/api/orders/list?') is None
@@ -0,0 +1,204 @@
+import pytest
+from click.testing import CliRunner
+from app.models import User, Order, Conversation, ConversationParticipant, Message, MessageArchive, ConversationArchive
+from app.extensions import db, socketio, outbox
+from datetime import datetime
+
+@pytest.fixture
+def users(create_users):
+    """创建两个测试用户（乘客、司机），返回 [(user_id, 认证头)]"""
+    return create_users(2)
+
+@pytest.fixture
+def emitted(monkeypatch):
+    """记录 Socket.IO 推送, 同时记录推送时数据库中已提交的会话和消息数量"""
+    events = []
+
+    def record(event_name, data, **kwargs):
+        with db.engine.connect() as conn:
+            committed = (conn.scalar(db.select(db.func.count()).select_from(Conversation.__table__)),
+                         conn.scalar(db.select(db.func.count()).select_from(Message.__table__)))
+        events.append((event_name, data, kwargs, committed))
+
+    monkeypatch.setattr(socketio, 'emit', record)
+    return events
+
+# ================ 语句测试 ================
+
+def test_outbox_emits_only_after_commit(app, emitted):
+    """语句测试：事件暂存到提交后推送，回滚时丢弃"""
+    outbox.emit('discarded', {'n': 1}, room='1')
+    assert len(outbox.pending()) == 1
+    db.session.rollback()
+    assert outbox.pending() == []
+
+    outbox.emit('kept', {'n': 2}, room='1')
+    assert emitted == []
+    db.session.commit()
+
+    assert [(name, data, kwargs) for name, data, kwargs, _ in emitted] == [('kept', {'n': 2}, {'room': '1'})]
+    assert outbox.pending() == []
+
+def test_private_conversation_insert_or_fetch(app, users, monkeypatch):
+    """语句测试：私聊按成员对唯一；并发创建冲突时回滚到保存点并返回已存在的会话，外层事务不受影响"""
+    (passenger_id, _), (driver_id, _) = users
+    conv, created = Conversation.get_or_create_private(driver_id, passenger_id)
+    db.session.commit()
+    assert created and (conv.min_user_id, conv.max_user_id) == (passenger_id, driver_id)
+    assert sorted(p.user_id for p in conv.participants) == [passenger_id, driver_id]
+    assert Conversation.get_or_create_private(str(passenger_id), str(driver_id)) == (conv, False)
+
+    # 模拟另一个请求在本次查找之后提交了同一对用户的私聊
+    db.session.get(User, passenger_id).realname = 'Renamed'
+    db.session.flush()
+    outbox.emit('kept', {'n': 1}, room='1')
+    monkeypatch.setattr(Conversation, 'find_private', classmethod(lambda cls, a, b: None))
+    assert Conversation.get_or_create_private(passenger_id, driver_id) == (conv, False)
+    assert User in db.session.info['cache_changed_models']
+    assert len(outbox.pending()) == 1
+    db.session.commit()
+
+    assert db.session.get(User, passenger_id).realname == 'Renamed'
+    assert Conversation.query.filter_by(type='private').count() == 1
+
+
+# ================ 路径测试 ================
+
+def test_private_conversation_and_message_emit_after_commit(client, users, emitted, create_order):
+    """路径测试：创建私聊会话和发送消息各提交一次，推送时数据已提交"""
+    (passenger_id, passenger_headers), (driver_id, driver_headers) = users
+    order_id = create_order(driver_id, driver_headers)['order_id']
+    emitted.clear()
+    conversations = Conversation.query.count()  # 发布订单时已创建群聊
+
+    response = client.post('/api/chat/conversations/private', json={
+        'target_user_id': driver_id,
+        'order_id': order_id
+    }, headers=passenger_headers)
+    assert response.json['code'] == 200
+    conversation_id = response.json['data']['conversation_id']
+    assert Conversation.query.get(conversation_id).order_id is None  # 私聊按成员对复用, 不关联订单
+
+    response = client.post('/api/chat/messages', json={
+        'conversation_id': conversation_id,
+        'order_id': order_id,
+        'content': '您好，还有座位吗？'
+    }, headers=passenger_headers)
+    assert response.json['code'] == 200
+    message_id = response.json['data']['mess_id']
+    assert Message.query.get(message_id).order_id == order_id
+
+    assert [(name, kwargs, committed) for name, _, kwargs, committed in emitted] == [
+        ('conversation_created', {'room': str(driver_id)}, (conversations + 1, 0)),
+        ('message_sent', {'room': str(conversation_id)}, (conversations + 1, 1)),
+    ]
+    assert emitted[1][1]['mess_id'] == message_id
+
+def test_deleting_order_keeps_private_conversation(client, users, create_order):
+    """路径测试：删除订单不影响通过该订单发起的私聊及其消息"""
+    (passenger_id, passenger_headers), (driver_id, driver_headers) = users
+    order_id = create_order(driver_id, driver_headers)['order_id']
+    conversation_id = client.post('/api/chat/conversations/private', json={
+        'target_user_id': driver_id,
+        'order_id': order_id
+    }, headers=passenger_headers).json['data']['conversation_id']
+    client.post('/api/chat/messages', json={
+        'conversation_id': conversation_id,
+        'order_id': order_id,
+        'content': '您好，还有座位吗？'
+    }, headers=passenger_headers)
+
+    order = db.session.get(Order, order_id)
+    order.status = 'not-started'
+    db.session.commit()
+    assert client.delete(f'/api/orders/{order_id}', headers=driver_headers).json['code'] == 200
+
+    db.session.expire_all()
+    assert db.session.get(Conversation, conversation_id) is not None
+    assert [message.order_id for message in Message.query.filter_by(conversation_id=conversation_id)] == [None]
+
+def test_failed_message_is_not_emitted(client, users, emitted, create_users, create_order):
+    """路径测试：没有会话权限时不写入消息也不推送"""
+    (passenger_id, passenger_headers), (driver_id, driver_headers) = users
+    order_id = create_order(driver_id, driver_headers)['order_id']
+    response = client.post('/api/chat/conversations/private', json={
+        'target_user_id': driver_id,
+        'order_id': order_id
+    }, headers=passenger_headers)
+    conversation_id = response.json['data']['conversation_id']
+    emitted.clear()
+
+    (outsider_id, outsider_headers), = create_users(1)
+
+    response = client.post('/api/chat/messages', json={
+        'conversation_id': conversation_id,
+        'order_id': order_id,
+        'content': 'hello'
+    }, headers=outsider_headers)
+    assert response.status_code == 403
+    assert emitted == []
+    assert outbox.pending() == []
+    assert Message.query.count() == 0
+
+def test_migrate_private_pairs(app, users, create_users):
+    """路径测试：旧库补充成员对列，回填并合并同一对用户的重复私聊，然后创建唯一索引"""
+    (passenger_id, _), (driver_id, _) = users
+    (outsider_id, _), = create_users(1)
+
+    # 模拟迁移前的旧表结构和重复数据
+    with db.engine.begin() as conn:
+        conn.execute(db.text("DROP INDEX uq_conversations_private_pair"))
+        conn.execute(db.text("ALTER TABLE conversations DROP COLUMN min_user_id"))
+        conn.execute(db.text("ALTER TABLE conversations DROP COLUMN max_user_id"))
+        for conv_id, members in ((1, (passenger_id, driver_id)), (2, (driver_id, passenger_id)),
+                                 (3, (passenger_id, outsider_id))):
+            conn.execute(db.text(
+                "INSERT INTO conversations (id, type, order_id, created_at, updated_at) "
+                "VALUES (:id, 'private', :order_id, :now, :now)"
+            ), {'id': conv_id, 'order_id': 99 if conv_id == 2 else None, 'now': datetime.now()})
+            for user_id in members:
+                conn.execute(db.text(
+                    "INSERT INTO conversation_participants (user_id, conversation_id, unread_count) VALUES (:u, :c, :n)"
+                ), {'u': user_id, 'c': conv_id, 'n': 1 if user_id == driver_id else 0})
+            conn.execute(db.text(
+                "INSERT INTO messages (conversation_id, sender_id, content, message_type, created_at) "
+                "VALUES (:c, :s, 'hi', 'text', :now)"
+            ), {'c': conv_id, 's': members[0], 'now': datetime.now()})
+        # 重复私聊中已归档的消息, 以及已归档的私聊会话
+        conn.execute(db.text(
+            "INSERT INTO messages_archive (id, conversation_id, sender_id, content, message_type, created_at, archived_at) "
+            "VALUES (100, 2, :s, 'old', 'text', :now, :now)"
+        ), {'s': driver_id, 'now': datetime.now()})
+        conn.execute(db.text(
+            "INSERT INTO conversations_archive (id, type, created_at, updated_at, archived_at) "
+            "VALUES (10, 'private', :now, :now, :now)"
+        ), {'now': datetime.now()})
+        for user_id in (driver_id, outsider_id):
+            conn.execute(db.text(
+                "INSERT INTO conversation_participants_archive (user_id, conversation_id, unread_count, archived_at) "
+                "VALUES (:u, 10, 0, :now)"
+            ), {'u': user_id, 'now': datetime.now()})
+
+    result = CliRunner().invoke(app.cli, ['migrate-private-pairs'])
+    assert result.exit_code == 0, result.output
+    db.session.expire_all()
+
+    assert [(c.id, c.min_user_id, c.max_user_id, c.order_id) for c in Conversation.query.order_by(Conversation.id)] == [
+        (1, passenger_id, driver_id, None), (3, passenger_id, outsider_id, None)
+    ]
+    assert Message.query.filter_by(conversation_id=1).count() == 2
+    assert db.session.get(MessageArchive, 100).conversation_id == 1
+    archived = db.session.get(ConversationArchive, 10)
+    assert (archived.min_user_id, archived.max_user_id) == tuple(sorted((driver_id, outsider_id)))
+    driver = db.session.get(ConversationParticipant, (driver_id, 1))
+    assert driver.unread_count == 2
+    assert db.session.get(ConversationParticipant, (driver_id, 2)) is None
+    assert 'uq_conversations_private_pair' in {
+        index['name'] for index in db.inspect(db.engine).get_indexes('conversations')
+    }
+    assert Conversation.get_or_create_private(driver_id, passenger_id)[0].id == 1
+
+    # 再次执行不做任何修改
+    result = CliRunner().invoke(app.cli, ['migrate-private-pairs'])
+    assert result.exit_code == 0, result.output
+    assert Conversation.query.count() == 2
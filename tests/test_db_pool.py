@@ -0,0 +1,50 @@
+import pytest
+from app import create_app
+from app.extensions import db
+from app.utils.db_pool import InstrumentedQueuePool, PoolWaitStats
+from app.utils.lifecycle import HEALTH_LISTENER
+from config import TestingConfig
+
+# ================ 语句测试 ================
+
+def test_pool_options_from_config(app, client):
+    """语句测试：连接池参数来自环境配置，checkout 等待时间可通过指标接口查看"""
+    pool = db.engine.pool
+    assert isinstance(pool, InstrumentedQueuePool)
+    assert pool.size() == TestingConfig.DB_POOL_SIZE
+    assert pool._max_overflow == TestingConfig.DB_MAX_OVERFLOW
+
+    db.session.execute(db.text('SELECT 1'))
+    db.session.commit()
+
+    assert client.get('/api/metrics/db-pool').status_code == 403  # 服务端口不开放指标接口
+    response = client.get('/api/metrics/db-pool', environ_overrides={HEALTH_LISTENER: True})
+    print(f"\n连接池指标: {response.json}")
+    assert response.status_code == 200
+    assert response.json['data']['wait']['checkouts'] >= 1
+
+def test_pool_wait_stats_histogram():
+    """语句测试：等待时间按桶统计并估算分位数"""
+    stats = PoolWaitStats()
+    for wait in (0.0005, 0.0005, 0.003, 0.2):
+        stats.record(wait)
+    stats.record(10, timed_out=True)
+
+    data = stats.to_dict()
+    assert data['checkouts'] == 4
+    assert data['timeouts'] == 1
+    assert data['wait_histogram']['<=1ms'] == 2
+    assert data['wait_histogram']['>5000ms'] == 1
+    assert stats.percentile(50) == 5
+
+# ================ 路径测试 ================
+
+def test_pool_options_skipped_for_memory_sqlite():
+    """路径测试：内存 SQLite 不设置连接池参数"""
+    class MemoryConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+    app = create_app(MemoryConfig)
+    assert 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config or not app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    with app.app_context():
+        assert not isinstance(db.engine.pool, InstrumentedQueuePool)
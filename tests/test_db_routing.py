@@ -0,0 +1,124 @@
+import pytest
+import time
+from app import create_app
+from app.models import User
+from app.extensions import db, cache
+from config import TestingConfig
+from datetime import datetime, timedelta
+
+class ReplicaTestingConfig(TestingConfig):
+    """使用两个 SQLite 文件模拟主库和从库（文件位于每个测试的临时目录）"""
+    REPLICA_STICKY_SECONDS = 0.5
+
+@pytest.fixture
+def app(tmp_path):
+    """创建测试应用实例（主库与从库都建表）"""
+    config = type('ReplicaTestingConfig', (ReplicaTestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'routing_primary.db'}",
+        'SQLALCHEMY_BINDS': {'replica': f"sqlite:///{tmp_path / 'routing_replica.db'}"},
+    })
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(bind=db.engines['replica'])
+        yield app
+        db.session.remove()
+        db.drop_all()
+        db.metadata.drop_all(bind=db.engines['replica'])
+        # init_app 会为每个绑定键登记一份 MetaData, 移除后其他测试的 create_all 不再查找 replica
+        db.metadatas.pop('replica', None)
+
+def replicate():
+    """模拟主从复制：把主库数据全部同步到从库"""
+    db.session.commit()
+    with db.engines['replica'].begin() as replica:
+        for table in reversed(db.metadata.sorted_tables):
+            replica.execute(table.delete())
+        with db.engine.connect() as primary:
+            for table in db.metadata.sorted_tables:
+                rows = [dict(row._mapping) for row in primary.execute(table.select())]
+                if rows:
+                    replica.execute(table.insert(), rows)
+
+def managed_order_count(client, headers=None):
+    response = client.get('/api/orders/manage/list', headers=headers or {})
+    assert response.status_code == 200
+    return len(response.json['data'])
+
+# ================ 语句测试 ================
+
+def test_reads_use_replica_with_read_your_writes(client, app, create_users, create_order):
+    """语句测试：只读接口读从库，写入者在粘滞时间内读主库"""
+    (writer_id, writer_headers), (_, reader_headers) = create_users(2)
+    replicate()
+
+    create_order(writer_id, writer_headers)
+
+    # 从库尚未同步：其他用户看不到新订单，写入者读主库能看到
+    assert managed_order_count(client, reader_headers) == 0
+    assert managed_order_count(client) == 0
+    assert managed_order_count(client, writer_headers) == 1
+
+    # 粘滞时间过后写入者也读从库
+    time.sleep(0.6)
+    assert managed_order_count(client, writer_headers) == 0
+
+    replicate()
+    assert managed_order_count(client, reader_headers) == 1
+
+# ================ 路径测试 ================
+
+def test_read_your_writes_survives_other_worker(client, app, create_users):
+    """路径测试：粘滞标记随 Cookie 返回，进程内缓存中没有标记（请求落到其他 worker）时写入者仍读主库"""
+    (writer_id, headers), = create_users(1)
+    replicate()
+
+    response = client.post('/api/orders', json={
+        'identity': 'driver',
+        'startAddress': '北京西站',
+        'endAddress': '首都机场',
+        'departureTime': (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S'),
+        'price': 20,
+        'initiator_id': writer_id,
+        'order_type': '车找人',
+        'availableSeats': 3,
+        'passengerCount': 1
+    }, headers=headers)
+    assert response.json['code'] == 200
+    assert 'replica_sticky=' in response.headers.get('Set-Cookie', '')
+
+    cache.clear('replica_sticky')
+    assert managed_order_count(client, headers) == 1
+
+    # Cookie 只对写入者本人有效
+    (_, other_headers), = create_users(1)
+    assert managed_order_count(client, other_headers) == 0
+
+def test_writes_always_use_primary(client, app, create_users):
+    """路径测试：从库路由只影响读取，写入始终落在主库"""
+    (_, headers), = create_users(1)
+    replicate()
+
+    response = client.post('/api/user/update', headers=headers, json={'username': 'renamed'})
+    assert response.json['code'] == 200
+
+    with db.engine.connect() as primary:
+        assert primary.execute(db.select(User.username)).scalar() == 'renamed'
+    with db.engines['replica'].connect() as replica:
+        assert replica.execute(db.select(User.username)).scalar() == 'user0'
+
+def test_sticky_cookie_skips_stale_caches(client, app, create_users):
+    """路径测试：粘滞 Cookie 对没有 @read_replica 的缓存接口同样生效，其他 worker 上未失效的缓存不会返回修改前的数据"""
+    (user_id, headers), = create_users(1)
+    replicate()
+    assert client.get('/api/user/basic', headers=headers).json['data']['username'] == 'user0'
+    key = f'{user_id}:/api/user/basic?'
+    stale = cache.get('user_basic', key)
+    assert stale is not None
+
+    assert client.post('/api/user/update', headers=headers, json={'username': 'renamed'}).json['code'] == 200
+
+    # 模拟请求落到其他 worker: 该进程的缓存尚未失效, 也没有进程内的粘滞标记
+    cache.set('user_basic', key, stale)
+    cache.clear('replica_sticky')
+    assert client.get('/api/user/basic', headers=headers).json['data']['username'] == 'renamed'
@@ -0,0 +1,88 @@
+import os
+import signal
+import sys
+import time
+import pytest
+from app.extensions import socketio, worker
+from app.utils.lifecycle import RESTART_EVENT
+from serve import WorkerSupervisor
+
+# 模拟 worker: 通知主进程已就绪, 收到 SIGTERM 后正常退出
+FAKE_WORKER = """
+import os, signal, sys, time
+signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+os.write(int(os.environ['WORKER_READY_FD']), b'1')
+while True:
+    time.sleep(0.05)
+"""
+
+@pytest.fixture(autouse=True)
+def reset_draining():
+    """测试结束后恢复 worker 的排空状态"""
+    yield
+    worker.draining = False
+
+def make_supervisor(script, workers=2):
+    return WorkerSupervisor([sys.executable, '-c', script], workers, drain_timeout=5, ready_timeout=10)
+
+
+# ================ 语句测试 ================
+
+def test_health_reports_draining(client):
+    """语句测试：健康检查返回 worker 状态，优雅退出期间返回 503"""
+    response = client.get('/api/health')
+    assert response.status_code == 200
+    assert response.json['data']['status'] == 'ok'
+    assert response.json['data']['pid'] == os.getpid()
+
+    worker.draining = True
+    response = client.get('/api/health')
+    assert response.status_code == 503
+    assert response.json['data']['status'] == 'draining'
+
+
+# ================ 路径测试 ================
+
+def test_drain_notifies_local_clients(app, auth_headers):
+    """路径测试：退出前通知本进程的每个 Socket.IO 连接重连并断开"""
+    clients = [socketio.test_client(app, headers=auth_headers) for _ in range(2)]
+    assert all(c.is_connected() for c in clients)
+    assert worker.health()['connections'] == 2
+
+    assert worker.drain() == 2
+    for c in clients:
+        # 已断开的测试客户端不能再调用 get_received, 直接读取收到的事件
+        events = [event for event in c.queue if event['name'] == RESTART_EVENT]
+        assert len(events) == 1
+        assert 0 <= events[0]['args'][0]['reconnect_after'] <= app.config['WORKER_RECONNECT_JITTER']
+        assert not c.is_connected()
+    assert worker.health()['connections'] == 0
+
+def test_supervisor_rolling_reload():
+    """路径测试：滚动重启逐个替换 worker；新 worker 启动失败时保留旧 worker；意外退出的 worker 被重新启动"""
+    supervisor = make_supervisor(FAKE_WORKER)
+    supervisor.start()
+    try:
+        old = dict(supervisor.processes)
+        assert all(process.poll() is None for process in old.values())
+
+        assert supervisor.reload()
+        assert all(process.returncode == 0 for process in old.values())  # 旧 worker 收到 SIGTERM 正常退出
+        current = dict(supervisor.processes)
+        assert all(process.poll() is None for process in current.values())
+
+        supervisor.command = [sys.executable, '-c', 'import sys; sys.exit(3)']
+        assert not supervisor.reload()
+        assert supervisor.processes == current
+        assert all(process.poll() is None for process in current.values())
+
+        supervisor.command = [sys.executable, '-c', FAKE_WORKER]
+        current[0].send_signal(signal.SIGKILL)
+        current[0].wait()
+        time.sleep(1)
+        supervisor.check()
+        assert supervisor.processes[0] is not current[0]
+        assert supervisor.processes[0].poll() is None
+    finally:
+        supervisor.stop()
+    assert all(process.poll() is not None for process in current.values())
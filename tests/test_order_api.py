@@ -0,0 +1,192 @@
+import pytest
+from app.models import Order, OrderDailyStat
+from app.extensions import db
+import json
+from datetime import datetime, timedelta
+
+# ================ 语句测试 ================
+
+def test_order_stats_follow_state_changes(client, app, test_user, auth_headers, create_order):
+    """语句测试：订单状态变化后统计接口返回增量汇总数据"""
+    departure = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    first = create_order(test_user, auth_headers, departure, price=20)['order_id']
+    second = create_order(test_user, auth_headers, departure, price=30)['order_id']
+
+    assert client.post(f'/api/orders/manage/{first}/approve').status_code == 200
+    assert client.post(f'/api/orders/manage/{second}/reject', json={'reason': '信息不完整'}).status_code == 200
+
+    day = departure.date().isoformat()
+    response = client.get(f'/api/orders/manage/stats?start={day}&end={day}')
+
+    print("\n=== 测试1: 订单统计 ===")
+    print(f"响应内容: {json.dumps(response.json, ensure_ascii=False, indent=2)}")
+
+    assert response.status_code == 200
+    data = response.json['data']
+    assert data['summary']['order_count'] == 2
+    assert data['summary']['gmv'] == 50.0
+    assert data['by_day'][0]['date'] == day
+    by_status = {item['status']: item['order_count'] for item in data['by_status']}
+    assert by_status == {'not-started': 1, 'rejected': 1}
+
+def test_order_stats_rating_and_rebuild(client, app, test_user, auth_headers, create_order):
+    """语句测试：评分计入平均分，全量重建结果与增量结果一致"""
+    departure = datetime.now().replace(microsecond=0) + timedelta(days=2)
+    order_id = create_order(test_user, auth_headers, departure)['order_id']
+
+    with app.app_context():
+        order = Order.query.get(order_id)
+        order.status = 'to-pay'
+        db.session.commit()
+
+    assert client.post(f'/api/orders/{order_id}/paid').status_code == 200
+    assert client.post(f'/api/orders/{order_id}/rate', json={'rating_value': 4}).status_code == 200
+
+    day = departure.date().isoformat()
+    incremental = client.get(f'/api/orders/manage/stats?start={day}&end={day}').json['data']
+    assert incremental['summary']['avg_rating'] == 4.0
+
+    with app.app_context():
+        OrderDailyStat.rebuild()
+        db.session.commit()
+
+    rebuilt = client.get(f'/api/orders/manage/stats?start={day}&end={day}').json['data']
+    assert rebuilt == incremental
+
+# ================ 路径测试 ================
+
+def test_order_stats_invalid_date(client):
+    """路径测试：统计接口日期格式错误"""
+    response = client.get('/api/orders/manage/stats?start=2024/01/01')
+    assert response.status_code == 400
+    assert response.json['code'] == 400
+
+def test_order_stats_empty_range(client):
+    """路径测试：无订单时返回空汇总"""
+    response = client.get('/api/orders/manage/stats?start=2020-01-01&end=2020-01-31')
+    assert response.status_code == 200
+    data = response.json['data']
+    assert data['summary']['order_count'] == 0
+    assert data['summary']['avg_rating'] is None
+    assert data['by_day'] == []
+
+def test_calendar_summary_cached_and_invalidated(client, app, test_user, auth_headers, create_order):
+    """语句测试：日历汇总按天分桶，创建订单后缓存失效"""
+    departure = datetime(2030, 5, 15, 14, 30)
+    first = create_order(test_user, auth_headers, departure)['order_id']
+
+    params = json.dumps({'year': 2030, 'month': 5})
+    response = client.get(f'/api/orders/calendar/{test_user}/summary', query_string={'params': params})
+
+    print("\n=== 测试3: 日历汇总 ===")
+    print(f"响应内容: {json.dumps(response.json, ensure_ascii=False, indent=2)}")
+
+    assert response.status_code == 200
+    days = response.json['data']['days']
+    assert days == [{
+        'date': '2030-05-15',
+        'count': 1,
+        'orders': [{'order_id': first, 'time': '14:30', 'status': 'pending', 'participants_count': 1}]
+    }]
+
+    # 再创建一个同日订单，缓存应被清除
+    second = create_order(test_user, auth_headers, departure + timedelta(hours=2))['order_id']
+    days = client.get(f'/api/orders/calendar/{test_user}/summary?year=2030&month=5').json['data']['days']
+    assert days[0]['count'] == 2
+    assert [o['order_id'] for o in days[0]['orders']] == [first, second]
+
+    # 完整日历接口复用汇总中的参与人数
+    orders = client.get(f'/api/orders/calendar/{test_user}', query_string={'params': params}).json['data']
+    assert [o['participants_count'] for o in orders] == [1, 1]
+
+    # 订单状态变化后缓存同样失效
+    assert client.post(f'/api/orders/manage/{first}/approve').status_code == 200
+    days = client.get(f'/api/orders/calendar/{test_user}/summary?year=2030&month=5').json['data']['days']
+    assert [o['status'] for o in days[0]['orders']] == ['not-started', 'pending']
+
+def test_calendar_summary_missing_month(client, test_user):
+    """路径测试：日历汇总缺少月份参数"""
+    response = client.get(f'/api/orders/calendar/{test_user}/summary?year=2030')
+    assert response.status_code == 400
+
+def test_user_trip_list_keyset_pagination(client, app, test_user, auth_headers, create_users, create_order):
+    """语句测试：行程记录合并发起与参与的订单，并按游标分页"""
+    from app.models import OrderParticipant
+
+    base = datetime(2030, 6, 1, 8, 0)
+    own = [create_order(test_user, auth_headers, base + timedelta(days=i))['order_id'] for i in range(3)]
+
+    # 另一位用户发起的订单，测试用户以乘客身份参与
+    (other_id, other_headers), = create_users(1)
+    joined = create_order(other_id, other_headers, base + timedelta(days=10))['order_id']
+    with app.app_context():
+        db.session.add(OrderParticipant(order_id=joined, participator_id=test_user,
+                                        initiator_id=other_id, identity='passenger'))
+        db.session.commit()
+
+    first_page = client.get('/api/orders/user/trips/list?limit=2', headers=auth_headers)
+    assert first_page.status_code == 200
+    assert [t['id'] for t in first_page.json['data']] == [joined, own[2]]
+    assert first_page.json['data'][0]['orderCount'] == 2
+    assert {p['id'] for p in first_page.json['data'][0]['participants']} == {other_id, test_user}
+    cursor = first_page.headers['X-Next-Cursor']
+
+    second_page = client.get('/api/orders/user/trips/list', query_string={'limit': 2, 'cursor': cursor}, headers=auth_headers)
+    assert [t['id'] for t in second_page.json['data']] == [own[1], own[0]]
+
+    # 不分页时返回全部行程
+    everything = client.get('/api/orders/user/trips/list', headers=auth_headers)
+    assert len(everything.json['data']) == 4
+    assert 'X-Next-Cursor' not in everything.headers
+
+def test_user_trip_list_invalid_cursor(client, auth_headers):
+    """路径测试：行程分页游标格式错误"""
+    response = client.get('/api/orders/user/trips/list?cursor=abc', headers=auth_headers)
+    assert response.json['code'] == 400
+
+def test_order_list_etag(client, app, test_user, auth_headers, create_order):
+    """语句测试：订单列表未变化时返回 304，新订单使 ETag 失效"""
+    departure = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    order_id = create_order(test_user, auth_headers, departure)['order_id']
+    with app.app_context():
+        Order.query.get(order_id).status = 'not-started'
+        db.session.commit()
+
+    response = client.get('/api/orders/list', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(response.json['data']) == 1
+    etag = response.headers['ETag']
+
+    response = client.get('/api/orders/list', headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    with app.app_context():
+        Order.query.get(order_id).price = 25
+        db.session.commit()
+
+    response = client.get('/api/orders/list', headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json['data'][0]['price'] == 25.0
+
+def test_conversation_list_etag_follows_messages(client, app, test_user, auth_headers, create_order):
+    """语句测试：会话有新消息时刷新 updated_at，会话列表 ETag 随之变化"""
+    from app.models import Conversation, Message
+
+    departure = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    create_order(test_user, auth_headers, departure)
+
+    response = client.get('/api/chat/conversations', headers=auth_headers)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert client.get('/api/chat/conversations', headers={**auth_headers, 'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        conversation = Conversation.query.first()
+        before = conversation.updated_at
+        db.session.add(Message(conversation_id=conversation.id, sender_id=test_user, content='你好'))
+        db.session.commit()
+        assert Conversation.query.get(conversation.id).updated_at > before
+
+    response = client.get('/api/chat/conversations', headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json['data'][0]['last_message']['content'] == '你好'
@@ -0,0 +1,145 @@
+import pytest
+from app.models import User, Order, Message, ConversationParticipant
+from app.extensions import db, socketio, order_feed
+from app.utils.order_feed import OrderFeedIndex, FeedFilter, FEED_CHANGE_EVENT
+from datetime import datetime
+
+@pytest.fixture
+def socket_client(app, auth_headers):
+    """创建带认证的 Socket.IO 测试客户端"""
+    client = socketio.test_client(app, headers=auth_headers)
+    yield client
+    if client.is_connected():
+        client.disconnect()
+
+def feed_events(socket_client):
+    return [event['args'][0] for event in socket_client.get_received() if event['name'] == 'orders_feed']
+
+# ================ 语句测试 ================
+
+def test_feed_index_routes_by_type_and_keyword():
+    """语句测试：订阅索引按类型、出发地关键词和时间窗口匹配"""
+    index = OrderFeedIndex()
+    index.subscribe('all', FeedFilter())
+    index.subscribe('car', FeedFilter(order_type='car-find-person'))
+    index.subscribe('beijing', FeedFilter(keyword='北京'))
+    index.subscribe('later', FeedFilter(start_after=datetime(2030, 1, 1)))
+
+    snapshot = {'order_id': 1, 'order_type': 'person-find-car', 'start_loc': '北京西站',
+                'start_time': datetime(2029, 1, 1), 'status': 'not-started'}
+    assert index.match(snapshot) == {'all', 'beijing'}
+    assert index.match({**snapshot, 'status': 'pending'}) == set()
+
+    index.unsubscribe('beijing')
+    assert index.match(snapshot) == {'all'}
+    assert len(index) == 3
+
+def test_feed_pushes_diffs_after_commit(client, app, test_user, auth_headers, socket_client, create_order):
+    """语句测试：订单审核通过推送 insert，修改推送 update，删除推送 delete"""
+    ack = socket_client.emit('subscribe_orders_feed', {'keyword': '北京'}, callback=True)
+    assert ack['code'] == 200
+
+    order_id = create_order(test_user, auth_headers)['order_id']
+    other_id = create_order(test_user, auth_headers, start_loc='上海虹桥')['order_id']
+    assert feed_events(socket_client) == []     # 待审核订单不在广场展示
+
+    client.post(f'/api/orders/manage/{order_id}/approve')
+    client.post(f'/api/orders/manage/{other_id}/approve')
+    events = feed_events(socket_client)
+    print(f"\n推送内容: {events}")
+    assert [(e['op'], e['order']['order_id']) for e in events] == [('insert', order_id)]
+
+    with app.app_context():
+        Order.query.get(order_id).price = 35
+        db.session.commit()
+    assert feed_events(socket_client) == [{'op': 'update', 'order_id': order_id, 'changes': {'price': 35.0}}]
+
+    assert client.delete(f'/api/orders/{order_id}').status_code == 200
+    assert feed_events(socket_client) == [{'op': 'delete', 'order_id': order_id}]
+
+def test_feed_pushes_reserved_seats(client, app, test_user, auth_headers, socket_client, create_order):
+    """语句测试：同意乘客申请后（条件 UPDATE 占座）推送剩余座位变化"""
+    socket_client.emit('subscribe_orders_feed', {}, callback=True)
+    order_id = create_order(test_user, auth_headers)['order_id']
+    client.post(f'/api/orders/manage/{order_id}/approve')
+    feed_events(socket_client)
+
+    passenger = User(username='passenger', realname='Passenger', identity_id='310101199001011234',
+                     gender='female', telephone='15800000000', password='password123')
+    db.session.add(passenger)
+    db.session.flush()
+    conversation_id = ConversationParticipant.query.filter_by(user_id=test_user).one().conversation_id
+    message = Message(conversation_id=conversation_id, sender_id=passenger.user_id, content='申请加入',
+                      message_type='apply_join', order_id=order_id)
+    db.session.add(message)
+    db.session.commit()
+
+    result = client.post('/api/orders/apply/accept', json={
+        'orderId': order_id, 'userId': passenger.user_id, 'messageId': message.id
+    }, headers=auth_headers).json
+    assert result['code'] == 200
+    assert feed_events(socket_client) == [{'op': 'update', 'order_id': order_id, 'changes': {'spare_seat_num': 2}}]
+
+# ================ 路径测试 ================
+
+def test_feed_skips_rolled_back_changes(client, app, test_user, auth_headers, socket_client, create_order):
+    """路径测试：回滚的修改不推送"""
+    socket_client.emit('subscribe_orders_feed', {}, callback=True)
+    order_id = create_order(test_user, auth_headers)['order_id']
+    client.post(f'/api/orders/manage/{order_id}/approve')
+    feed_events(socket_client)
+
+    with app.app_context():
+        Order.query.get(order_id).price = 99
+        db.session.flush()
+        db.session.rollback()
+    assert feed_events(socket_client) == []
+
+def test_feed_unsubscribe_and_invalid_filter(client, app, test_user, auth_headers, socket_client, create_order):
+    """路径测试：时间格式错误时拒绝订阅，取消订阅后不再推送"""
+    ack = socket_client.emit('subscribe_orders_feed', {'startAfter': 'tomorrow'}, callback=True)
+    assert ack['code'] == 400
+
+    socket_client.emit('subscribe_orders_feed', {}, callback=True)
+    socket_client.emit('unsubscribe_orders_feed', callback=True)
+    order_id = create_order(test_user, auth_headers)['order_id']
+    client.post(f'/api/orders/manage/{order_id}/approve')
+    assert feed_events(socket_client) == []
+
+def test_feed_broadcasts_through_message_queue(app, monkeypatch, memory_queue):
+    """路径测试：配置消息队列时订单变化经队列广播，每个进程按本地订阅索引推送给本进程的客户端"""
+    sent = []
+    manager = memory_queue()
+    emit = manager.emit
+
+    def capture(event, data, namespace=None, room=None, **kwargs):
+        """记录本进程的推送"""
+        if kwargs.get('ignore_queue'):
+            sent.append((event, data, room))
+            return
+        return emit(event, data, namespace=namespace, room=room, **kwargs)
+
+    monkeypatch.setattr(manager, 'emit', capture)
+    manager.on_broadcast(FEED_CHANGE_EVENT, order_feed._receive)
+    monkeypatch.setattr(socketio.server, 'manager', manager)
+    monkeypatch.setattr(order_feed, 'broadcast', True)
+    order_feed.index.subscribe('local-sid', FeedFilter(keyword='北京', start_after=datetime(2030, 1, 1)))
+
+    try:
+        snapshot = {'order_id': 1, 'initiator_id': 1, 'order_type': 'car-find-person', 'start_loc': '北京西站',
+                    'dest_loc': '首都机场', 'start_time': datetime(2030, 5, 1, 8, 0), 'price': 20,
+                    'status': 'not-started', 'car_type': None, 'travel_partner_num': 1, 'spare_seat_num': 3}
+        order_feed.publish(None, snapshot)
+
+        # 本进程按本地订阅推送, 同时把变化发到队列 (内部事件不会直接发给客户端)
+        assert sent == [('orders_feed', {'op': 'insert', 'order': {**snapshot, 'start_time': '2030-05-01T08:00:00'}},
+                         ['local-sid'])]
+        assert [message['event'] for message in manager.published] == [FEED_CHANGE_EVENT]
+
+        # 其他进程的监听线程收到队列消息后同样按自己的订阅索引推送
+        sent.clear()
+        manager.incoming = [{**manager.published[0], 'host_id': 'other-worker'}]
+        manager._thread()
+        assert [(event, data['op'], to) for event, data, to in sent] == [('orders_feed', 'insert', ['local-sid'])]
+    finally:
+        order_feed.index.unsubscribe('local-sid')
@@ -0,0 +1,113 @@
+import pytest
+from app.models import Order, OrderDailyStat
+from app.extensions import db, socketio, order_scheduler
+from datetime import datetime, timedelta
+
+@pytest.fixture
+def scheduler():
+    """每个测试使用空的调度堆"""
+    order_scheduler.clear()
+    yield order_scheduler
+    order_scheduler.clear()
+
+@pytest.fixture
+def emitted(monkeypatch):
+    """记录 Socket.IO 推送"""
+    events = []
+    monkeypatch.setattr(socketio, 'emit', lambda event_name, data, **kwargs: events.append((event_name, data, kwargs)))
+    return events
+
+@pytest.fixture
+def create_approved_order(client, create_order):
+    """发布并审核通过订单: create_approved_order(user_id, 认证头, 出发时间) 返回 (订单ID, 群聊ID)"""
+    def create(user_id, headers, departure):
+        created = create_order(user_id, headers, departure)
+        assert client.post(f"/api/orders/manage/{created['order_id']}/approve").status_code == 200
+        return created['order_id'], created['conversation_id']
+    return create
+
+def order_status(order_id):
+    db.session.expire_all()
+    return db.session.get(Order, order_id).status
+
+
+# ================ 语句测试 ================
+
+def test_scheduler_heap_orders_and_dedupes(app, scheduler):
+    """语句测试：按到期时间出堆，同一订单的同一状态变化只入堆一次"""
+    now = datetime.now()
+    scheduler.push(now + timedelta(minutes=5), 1, 'not-started', 'in-progress')
+    scheduler.push(now - timedelta(minutes=1), 2, 'not-started', 'in-progress')
+    scheduler.push(now - timedelta(minutes=2), 3, 'in-progress', 'to-pay')
+    scheduler.push(now - timedelta(minutes=2), 3, 'in-progress', 'to-pay')
+    assert len(scheduler) == 3
+
+    assert [entry[1] for entry in scheduler.pop_due(now)] == [3, 2]
+    assert scheduler.next_due() == now + timedelta(minutes=5)
+
+
+# ================ 路径测试 ================
+
+def test_run_once_advances_due_orders(client, test_user, auth_headers, scheduler, emitted, create_approved_order):
+    """路径测试：已出发的订单变为进行中，行程结束的订单变为待付款，并推送状态变化"""
+    now = datetime.now().replace(microsecond=0)
+    trip = timedelta(minutes=client.application.config['TRIP_DURATION_MINUTES'])
+    departed, departed_conv = create_approved_order(test_user, auth_headers, now - timedelta(minutes=5))
+    finished, _ = create_approved_order(test_user, auth_headers, now - trip - timedelta(minutes=5))
+    upcoming, _ = create_approved_order(test_user, auth_headers, now + timedelta(hours=1))
+
+    # 调度前: 出发时间已过的订单仍为未开始, 列表只按状态筛选
+    listed = client.get('/api/orders/list', headers=auth_headers).json['data']
+    assert {order['id'] for order in listed} == {departed, finished, upcoming}
+
+    def calendar_status(order_id):
+        month = {'year': (now - timedelta(minutes=5)).year, 'month': (now - timedelta(minutes=5)).month}
+        days = client.get(f'/api/orders/calendar/{test_user}/summary', query_string=month).json['data']['days']
+        return {o['order_id']: o['status'] for day in days for o in day['orders']}[order_id]
+    assert calendar_status(departed) == 'not-started'
+
+    assert scheduler.run_once(now) == 3  # departed 一次, finished 两次
+    assert order_status(departed) == 'in-progress'
+    assert order_status(finished) == 'to-pay'
+    assert order_status(upcoming) == 'not-started'
+    assert calendar_status(departed) == 'in-progress'  # 日历缓存已失效
+
+    listed = client.get('/api/orders/list', headers=auth_headers).json['data']
+    assert [order['id'] for order in listed] == [upcoming]
+
+    stats = {(row.status, row.order_count) for row in OrderDailyStat.query.all()}
+    assert ('in-progress', 1) in stats and ('to-pay', 1) in stats
+
+    status_events = [(data, kwargs) for name, data, kwargs in emitted if name == 'order_status_changed']
+    assert ({'order_id': departed, 'previous_status': 'not-started', 'status': 'in-progress'},
+            {'room': f'conversation_{departed_conv}'}) in status_events
+    assert len(status_events) == 3
+
+    # 再次运行没有新的变化
+    assert scheduler.run_once(now) == 0
+
+def test_rescheduled_order_is_skipped(client, test_user, auth_headers, scheduler, create_approved_order):
+    """路径测试：入堆后出发时间被推迟的订单到期时不会被修改"""
+    now = datetime.now().replace(microsecond=0)
+    order_id, _ = create_approved_order(test_user, auth_headers, now + timedelta(seconds=30))
+    scheduler.load(now, horizon=timedelta(minutes=1))
+    assert len(scheduler) == 1
+
+    order = db.session.get(Order, order_id)
+    order.start_time = now + timedelta(hours=2)
+    db.session.commit()
+
+    assert scheduler.run_pending(now + timedelta(minutes=1)) == 0
+    assert order_status(order_id) == 'not-started'
+    assert len(scheduler) == 0
+
+def test_standalone_scheduler_requires_message_queue(app, scheduler):
+    """路径测试：未配置消息队列时独立调度进程拒绝启动, 加 --no-push 后照常推进状态"""
+    runner = app.test_cli_runner()
+    assert not app.config['SOCKETIO_MESSAGE_QUEUE']
+
+    result = runner.invoke(args=['order-scheduler', '--once'])
+    assert result.exit_code == 1
+
+    result = runner.invoke(args=['order-scheduler', '--once', '--no-push'])
+    assert result.exit_code == 0
@@ -0,0 +1,146 @@
+import threading
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import Order, OrderParticipant, Conversation, ConversationParticipant, Message, OrderDailyStat
+from app.extensions import db
+
+def create_application(order_id, applicant_id, conversation_id):
+    """插入一条乘客申请消息，返回消息ID"""
+    message = Message(conversation_id=conversation_id, sender_id=applicant_id, content='申请加入',
+                      message_type='apply_join', order_id=order_id)
+    db.session.add(message)
+    db.session.commit()
+    return message.id
+
+def accept(client, order_id, applicant_id, message_id, headers):
+    return client.post('/api/orders/apply/accept', json={
+        'orderId': order_id,
+        'userId': applicant_id,
+        'messageId': message_id
+    }, headers=headers).json
+
+
+# ================ 路径测试 ================
+
+def test_accept_application_single_commit(client, create_users, create_order):
+    """路径测试：同意申请在一个事务中完成入单、入群、扣减座位和更新申请消息"""
+    (driver_id, driver_headers), (passenger_id, _) = create_users(2)
+    order_id = create_order(driver_id, driver_headers, seats=2)['order_id']
+    conversation_id = ConversationParticipant.query.filter_by(user_id=driver_id).one().conversation_id
+    message_id = create_application(order_id, passenger_id, conversation_id)
+
+    commits = []
+    listener = lambda session: commits.append(session)
+    event.listen(Session, 'after_commit', listener)
+    try:
+        result = accept(client, order_id, passenger_id, message_id, driver_headers)
+    finally:
+        event.remove(Session, 'after_commit', listener)
+
+    assert result['code'] == 200
+    assert result['data']['conversation_id'] == conversation_id
+    assert len(commits) == 1
+
+    db.session.expire_all()
+    assert Order.query.get(order_id).spare_seat_num == 1
+    assert OrderParticipant.query.filter_by(order_id=order_id, participator_id=passenger_id).count() == 1
+    assert ConversationParticipant.query.filter_by(conversation_id=conversation_id, user_id=passenger_id).count() == 1
+    assert Message.query.get(message_id).message_type == 'apply_join_accept'
+    # 参与人数变化后汇总表中的已成团订单数同步刷新
+    assert [row.matched_count for row in OrderDailyStat.query.all()] == [1]
+
+    # 重复同意不再占用座位
+    assert accept(client, order_id, passenger_id, message_id, driver_headers)['code'] == 200
+    db.session.expire_all()
+    assert Order.query.get(order_id).spare_seat_num == 1
+
+def test_accept_application_rejected_when_full(client, create_users, create_order):
+    """路径测试：座位已满时返回 409 且不留下部分写入"""
+    (driver_id, driver_headers), (passenger_id, _) = create_users(2)
+    order_id = create_order(driver_id, driver_headers, seats=0)['order_id']
+    conversation_id = ConversationParticipant.query.filter_by(user_id=driver_id).one().conversation_id
+    message_id = create_application(order_id, passenger_id, conversation_id)
+
+    result = accept(client, order_id, passenger_id, message_id, driver_headers)
+    assert result['code'] == 409
+
+    db.session.expire_all()
+    assert OrderParticipant.query.filter_by(order_id=order_id, participator_id=passenger_id).count() == 0
+    assert ConversationParticipant.query.filter_by(user_id=passenger_id).count() == 0
+    assert Message.query.get(message_id).message_type == 'apply_join'
+
+def test_reject_application_requires_initiator(client, create_users, create_order):
+    """路径测试：只有订单发起人可以拒绝申请"""
+    (driver_id, driver_headers), (passenger_id, passenger_headers) = create_users(2)
+    order_id = create_order(driver_id, driver_headers, seats=2)['order_id']
+    conversation_id = ConversationParticipant.query.filter_by(user_id=driver_id).one().conversation_id
+    message_id = create_application(order_id, passenger_id, conversation_id)
+    payload = {'orderId': order_id, 'userId': passenger_id, 'messageId': message_id}
+
+    assert client.post('/api/orders/apply/reject', json=payload, headers=passenger_headers).json['code'] == 403
+    updated_at = db.session.get(Conversation, conversation_id).updated_at
+    assert client.post('/api/orders/apply/reject', json=payload, headers=driver_headers).json['code'] == 200
+    db.session.expire_all()
+    assert Message.query.get(message_id).message_type == 'apply_join_reject'
+    # 申请消息状态变化刷新会话版本（ETag）
+    assert db.session.get(Conversation, conversation_id).updated_at > updated_at
+
+def test_parallel_accepts_do_not_overbook(app, client, create_users, create_order):
+    """路径测试：多个线程同时同意申请，成功人数不超过座位数"""
+    seats, applicants = 2, 6
+    (driver_id, driver_headers), *passengers = create_users(applicants + 1)
+    order_id = create_order(driver_id, driver_headers, seats=seats)['order_id']
+    conversation_id = ConversationParticipant.query.filter_by(user_id=driver_id).one().conversation_id
+    message_ids = {passenger_id: create_application(order_id, passenger_id, conversation_id)
+                   for passenger_id, _ in passengers}
+
+    barrier = threading.Barrier(applicants)
+    results = {}
+
+    def worker(passenger_id):
+        thread_client = app.test_client()
+        barrier.wait()
+        results[passenger_id] = accept(thread_client, order_id, passenger_id, message_ids[passenger_id], driver_headers)
+
+    threads = [threading.Thread(target=worker, args=(passenger_id,)) for passenger_id, _ in passengers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    codes = sorted(result['code'] for result in results.values())
+    assert codes == [200] * seats + [409] * (applicants - seats)
+
+    db.session.expire_all()
+    assert Order.query.get(order_id).spare_seat_num == 0
+    joined = OrderParticipant.query.filter_by(order_id=order_id, identity='passenger').count()
+    assert joined == seats
+
+def test_reserve_seats_never_oversubscribes(app, client, create_users, create_order):
+    """路径测试：大量线程直接抢占同一订单的座位，条件 UPDATE 保证不超卖"""
+    seats, workers, attempts = 5, 20, 5
+    (driver_id, driver_headers), = create_users(1)
+    order_id = create_order(driver_id, driver_headers, seats=seats)['order_id']
+
+    granted = []
+    barrier = threading.Barrier(workers)
+
+    def worker():
+        barrier.wait()
+        for _ in range(attempts):
+            with app.app_context():
+                if Order.reserve_seats(order_id):
+                    granted.append(1)
+                db.session.commit()
+                db.session.remove()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(granted) == seats
+    db.session.expire_all()
+    assert Order.query.get(order_id).spare_seat_num == 0
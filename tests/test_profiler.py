@@ -0,0 +1,122 @@
+import os
+import pytest
+from click.testing import CliRunner
+from app import create_app
+from app.extensions import db
+from app.utils.profiler import list_profiles, summarize_profile, parse_importtime
+from config import TestingConfig
+
+@pytest.fixture
+def profile_dir(tmp_path):
+    return str(tmp_path / 'profiles')
+
+def make_app(profile_dir, **options):
+    """创建开启剖析的测试应用"""
+    config = type('ProfilerConfig', (TestingConfig,), {
+        'PROFILER_ENABLED': True,
+        'PROFILER_TOKEN': 'secret-token',
+        'PROFILER_DIR': profile_dir,
+        **options
+    })
+    return create_app(config)
+
+@pytest.fixture
+def app(profile_dir):
+    """创建测试应用实例"""
+    app = make_app(profile_dir)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+
+# ================ 语句测试 ================
+
+def test_profiler_disabled_by_default(tmp_path):
+    """语句测试：未开启 PROFILER_ENABLED 时携带令牌也不剖析"""
+    config = type('NoProfilerConfig', (TestingConfig,), {
+        'PROFILER_TOKEN': 'secret-token', 'PROFILER_DIR': str(tmp_path / 'profiles')
+    })
+    client = create_app(config).test_client()
+    response = client.get('/api/', headers={'X-Profile': 'secret-token'})
+    assert 'X-Profile-File' not in response.headers
+    assert not os.path.exists(tmp_path / 'profiles')
+
+def test_collapsed_summary(tmp_path):
+    """语句测试：折叠栈摘要按采样数统计总占比和自身占比"""
+    path = tmp_path / 'sample.collapsed'
+    path.write_text("main;view;query 3\nmain;view 1\n", encoding='utf-8')
+    summary = summarize_profile(str(path), limit=5)
+    assert '共 4 个采样' in summary
+    assert '100.0%     0.0%  main' in summary
+    assert ' 75.0%    75.0%  query' in summary
+
+def test_parse_importtime():
+    """语句测试：解析 -X importtime 输出，忽略其他行"""
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   sqlalchemy.util\n"
+        "import time:      3000 |       3120 | sqlalchemy\n"
+        "Logger setup completed\n"
+    )
+    assert parse_importtime(output) == [('sqlalchemy.util', 120, 120), ('sqlalchemy', 3000, 3120)]
+
+
+# ================ 路径测试 ================
+
+def test_token_profiles_single_request(app, client, profile_dir):
+    """路径测试：只有携带正确令牌的请求被剖析，结果可通过命令行查看"""
+    assert client.get('/api/').status_code == 200
+    assert client.get('/api/', headers={'X-Profile': 'wrong'}).status_code == 200
+    assert list_profiles(profile_dir) == []
+
+    response = client.get('/api/', headers={'X-Profile': 'secret-token'})
+    assert response.status_code == 200
+    filename = response.headers['X-Profile-File']
+    assert filename.endswith('.prof')
+
+    response = client.get('/api/?__profile=secret-token', headers={'X-Profile-Mode': 'sampling'})
+    assert response.headers['X-Profile-File'].endswith('.collapsed')
+
+    profiles = list_profiles(profile_dir)
+    assert [profile['mode'] for profile in profiles] == ['sampling', 'cprofile']
+    assert profiles[1]['file'] == filename
+    assert profiles[1]['method'] == 'GET' and profiles[1]['path'] == '/api'
+
+    runner = CliRunner()
+    result = runner.invoke(app.cli, ['list-profiles'])
+    assert result.exit_code == 0, result.output
+    assert filename in result.output
+
+    result = runner.invoke(app.cli, ['show-profile', filename, '--limit', '5'])
+    assert result.exit_code == 0, result.output
+    assert 'function calls' in result.output
+
+    result = runner.invoke(app.cli, ['show-profile', 'missing.prof'])
+    assert result.exit_code != 0
+
+def test_sample_rate_and_retention(profile_dir):
+    """路径测试：按 1/N 抽样剖析，只保留最近的 PROFILER_MAX_FILES 个文件"""
+    app = make_app(profile_dir, PROFILER_TOKEN=None, PROFILER_SAMPLE_RATE=2, PROFILER_MODE='sampling',
+                   PROFILER_SAMPLE_INTERVAL_MS=1, PROFILER_MAX_FILES=2)
+    client = app.test_client()
+
+    profiled = [bool(client.get('/api/').headers.get('X-Profile-File')) for _ in range(8)]
+    assert profiled == [False, True] * 4
+
+    profiles = list_profiles(profile_dir)
+    assert len(profiles) == 2
+    assert all(profile['file'].endswith('.collapsed') for profile in profiles)
+
+def test_startup_profile_command(app):
+    """路径测试：startup-profile 在子进程中启动应用并报告导入耗时"""
+    result = CliRunner().invoke(app.cli, ['startup-profile', '--config', 'config.TestingConfig', '--limit', '5'])
+    assert result.exit_code == 0, result.output
+    assert 'create_app' in result.output
+    assert 'sqlalchemy' in result.output
+
+    result = CliRunner().invoke(app.cli, ['startup-profile', '--config', 'config.MissingConfig'])
+    assert result.exit_code != 0
+    assert '启动失败' in result.output
@@ -0,0 +1,35 @@
+import pytest
+from app.utils import socketio_queue
+from app.utils.socketio_queue import create_client_manager
+
+
+# ================ 路径测试 ================
+
+def test_broadcast_runs_once_on_every_process(memory_queue):
+    """路径测试：广播在发送进程直接处理，其他进程经 python-socketio 的监听线程收到后处理，发送进程不重复处理"""
+    handled = []
+    sender, receiver = memory_queue(), memory_queue()
+    for manager in (sender, receiver):
+        manager.on_broadcast('__test_event__', lambda payload, manager=manager: handled.append((manager.host_id, payload)))
+
+    sender.broadcast('__test_event__', {'order_id': 1})
+    assert handled == [(sender.host_id, {'order_id': 1})]
+    assert len(sender.published) == 1
+
+    # 监听线程把队列中的消息交给 _handle_emit (队列消息结束后退出循环)
+    receiver.incoming = sender.incoming = list(sender.published)
+    receiver._thread()
+    sender._thread()
+    assert handled == [(sender.host_id, {'order_id': 1}), (receiver.host_id, {'order_id': 1})]
+
+    # 没有登记该事件的进程按普通 emit 处理, 消息发往空房间, 不会送达客户端
+    other = memory_queue()
+    other.incoming = list(sender.published)
+    other._thread()
+    assert len(handled) == 2
+
+def test_client_manager_requires_supported_socketio(monkeypatch):
+    """路径测试：python-socketio 主版本与编写时不一致时拒绝创建消息队列管理器"""
+    monkeypatch.setattr(socketio_queue, 'version', lambda name: '6.0.0')
+    with pytest.raises(RuntimeError):
+        create_client_manager('redis://localhost:6379/0')
@@ -0,0 +1,174 @@
+import pytest
+import json
+from app.models import Order, Message, ChangeLog
+from app.extensions import db
+from datetime import timedelta
+
+@pytest.fixture
+def other_user(create_users):
+    """创建另一位用户，返回 (user_id, 认证头)"""
+    return create_users(1)[0]
+
+# ================ 语句测试 ================
+
+def test_sync_returns_only_changes_since_token(client, app, test_user, other_user, auth_headers, create_order):
+    """语句测试：只返回令牌之后的变更，会话数据仅对成员可见，删除订单返回墓碑"""
+    token = client.get('/api/sync', headers=auth_headers).json['data']['next']
+
+    created = create_order(test_user, auth_headers)
+    order_id, conversation_id = created['order_id'], created['conversation_id']
+
+    response = client.get(f'/api/sync?since={token}', headers=auth_headers)
+    print(f"\n同步结果: {json.dumps(response.json, ensure_ascii=False, indent=2)}")
+    data = response.json['data']
+    assert [o['order_id'] for o in data['changes']['orders']] == [order_id]
+    assert [c['conversation_id'] for c in data['changes']['conversations']] == [conversation_id]
+    assert data['has_more'] is False
+
+    # 待审核的订单不在订单广场上，其他用户看不到
+    _, other_headers = other_user
+    other_data = client.get(f'/api/sync?since={token}', headers=other_headers).json['data']
+    assert other_data['changes']['orders'] == []
+    assert other_data['changes']['conversations'] == []
+
+    # 无新变更时令牌不变
+    token = data['next']
+    data = client.get(f'/api/sync?since={token}', headers=auth_headers).json['data']
+    assert data['next'] == token
+    assert data['changes']['orders'] == []
+
+    # 审核通过后出现在订单广场上，其他用户能看到订单，但看不到不属于自己的会话
+    assert client.post(f'/api/orders/manage/{order_id}/approve').status_code == 200
+    other_data = client.get(f'/api/sync?since={token}', headers=other_headers).json['data']
+    assert [o['order_id'] for o in other_data['changes']['orders']] == [order_id]
+    assert other_data['changes']['conversations'] == []
+
+    token = client.get(f'/api/sync?since={token}', headers=auth_headers).json['data']['next']
+    assert client.delete(f'/api/orders/{order_id}').status_code == 200
+
+    # 删除订单的墓碑发给成员和所有看过订单广场的用户；会话成员记录删除后，原成员收到会话墓碑
+    for headers in (auth_headers, other_headers):
+        data = client.get(f'/api/sync?since={token}', headers=headers).json['data']
+        assert data['changes']['orders'] == []
+        assert data['deleted']['orders'] == [str(order_id)]
+    data = client.get(f'/api/sync?since={token}', headers=auth_headers).json['data']
+    assert data['deleted']['conversations'] == [str(conversation_id)]
+    assert data['deleted']['conversation_participants'] == [f'{conversation_id}:{test_user}']
+
+def test_sync_records_bulk_updates(client, app, test_user, auth_headers, create_order):
+    """语句测试：批量 UPDATE 在同一事务内写入变更记录，回滚时一起撤销"""
+    conversation_id = create_order(test_user, auth_headers)['conversation_id']
+    with app.app_context():
+        message = Message(conversation_id=conversation_id, sender_id=test_user, content='申请加入', message_type='apply_join')
+        db.session.add(message)
+        db.session.commit()
+        message_id = message.id
+        token = ChangeLog.safe_token()
+
+        db.session.query(Message).filter_by(id=message_id).update({'message_type': 'apply_join_reject'})
+        db.session.rollback()
+        assert ChangeLog.safe_token() == token
+
+        db.session.query(Message).filter_by(id=message_id).update({'message_type': 'apply_join_reject'})
+        db.session.commit()
+
+    data = client.get(f'/api/sync?since={token}', headers=auth_headers).json['data']
+    assert [(m['message_id'], m['type']) for m in data['changes']['messages']] == [(message_id, 'apply_join_reject')]
+
+def test_sync_pagination(client, app, test_user, auth_headers, create_order):
+    """语句测试：变更较多时分页返回，has_more 标记后续还有数据"""
+    token = client.get('/api/sync', headers=auth_headers).json['data']['next']
+    for _ in range(3):
+        create_order(test_user, auth_headers)
+
+    seen = []
+    has_more = True
+    while has_more:
+        data = client.get(f'/api/sync?since={token}&limit=2', headers=auth_headers).json['data']
+        seen += [o['order_id'] for o in data['changes']['orders']]
+        token, has_more = data['next'], data['has_more']
+    assert len(set(seen)) == 3
+
+# ================ 路径测试 ================
+
+def test_sync_hides_unlisted_orders_from_non_members(client, app, test_user, other_user, auth_headers, create_order):
+    """路径测试：订单离开订单广场后，非成员收到墓碑而不是订单的最新数据"""
+    order_id = create_order(test_user, auth_headers)['order_id']
+    assert client.post(f'/api/orders/manage/{order_id}/approve').status_code == 200
+    _, other_headers = other_user
+    token = client.get('/api/sync', headers=other_headers).json['data']['next']
+
+    with app.app_context():
+        # 调度器以批量 UPDATE 推进状态, 变更记录按修改前的状态判断是否可见
+        db.session.query(Order).filter_by(order_id=order_id).update({'status': 'in-progress'})
+        db.session.commit()
+
+    data = client.get(f'/api/sync?since={token}', headers=other_headers).json['data']
+    assert data['changes']['orders'] == []
+    assert data['deleted']['orders'] == [str(order_id)]
+
+    # 之后的修改不再发给非成员
+    token = data['next']
+    with app.app_context():
+        Order.query.get(order_id).status = 'to-pay'
+        db.session.commit()
+    data = client.get(f'/api/sync?since={token}', headers=other_headers).json['data']
+    assert data['deleted']['orders'] == [] and data['changes']['orders'] == []
+    data = client.get(f'/api/sync?since={token}', headers=auth_headers).json['data']
+    assert [(o['order_id'], o['status']) for o in data['changes']['orders']] == [(order_id, 'to-pay')]
+
+def test_sync_token_stops_before_uncommitted_gap(client, app, test_user, auth_headers, create_order):
+    """路径测试：序号空洞（可能是未提交的事务）之前停止推进令牌，空洞过期后继续"""
+    token = int(client.get('/api/sync', headers=auth_headers).json['data']['next'])
+    order_id = create_order(test_user, auth_headers)['order_id']
+
+    with app.app_context():
+        latest = db.session.query(db.func.max(ChangeLog.id)).scalar()
+        # 模拟序号 latest+1 的事务尚未提交, latest+2 已提交
+        db.session.add(ChangeLog(id=latest + 2, entity='order', entity_id=str(order_id), action='upsert',
+                                 order_id=order_id))
+        db.session.commit()
+
+    data = client.get(f'/api/sync?since={token}', headers=auth_headers).json['data']
+    assert [o['order_id'] for o in data['changes']['orders']] == [order_id]
+    assert int(data['next']) == latest
+    assert client.get('/api/sync', headers=auth_headers).json['data']['next'] == str(latest)
+
+    with app.app_context():
+        # 超过 CHANGELOG_GAP_SECONDS 后视为已回滚
+        log = db.session.get(ChangeLog, latest + 2)
+        log.created_at = ChangeLog.db_now() - timedelta(seconds=app.config['CHANGELOG_GAP_SECONDS'] + 1)
+        db.session.commit()
+    data = client.get(f'/api/sync?since={latest}', headers=auth_headers).json['data']
+    assert int(data['next']) == latest + 2
+
+def test_sync_token_expired_after_prune(client, app, test_user, auth_headers, create_order):
+    """路径测试：清理旧变更记录后，更早的令牌返回 410 要求全量同步"""
+    token = client.get('/api/sync', headers=auth_headers).json['data']['next']
+    for _ in range(2):
+        create_order(test_user, auth_headers)
+
+    with app.app_context():
+        ChangeLog.query.update({'created_at': ChangeLog.db_now() - timedelta(days=40)})
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['prune-changelog', '--days', '30'])
+    assert result.exit_code == 0
+    with app.app_context():
+        assert ChangeLog.query.count() == 1  # 保留最新一条
+
+    response = client.get(f'/api/sync?since={token}', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json['code'] == 410
+    assert response.json['data']['resync'] is True
+    latest = response.json['data']['next']
+    assert client.get(f'/api/sync?since={latest}', headers=auth_headers).json['code'] == 200
+
+def test_sync_invalid_token(client, auth_headers):
+    """路径测试：同步令牌格式错误"""
+    response = client.get('/api/sync?since=abc', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json['code'] == 400
+
+def test_sync_no_auth(client):
+    """路径测试：未认证访问同步接口"""
+    assert client.get('/api/sync?since=0').status_code == 401
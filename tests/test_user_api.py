@@ -262,3 +262,84 @@ def test_get_avatar_success(client, app, test_user, auth_headers):
         assert data['code'] == 200
         assert data['message'] == "获取头像成功"
         assert 'avatar_url' in data['data']
+
+def test_get_user_avatar_image(client, app, test_user, auth_headers):
+    """路径测试：按用户ID获取头像图片（需登录或带签名的地址）"""
+    with app.app_context():
+        response = client.get(f'/api/user/{test_user}/avatar', headers=auth_headers)
+        assert response.status_code == 404
+
+        test_image = base64.b64encode(b'test_image_data').decode('utf-8')
+        client.post(
+            f'/api/user/upload_avatar/{test_user}',
+            json={'base64_data': f'data:image/jpeg;base64,{test_image}'}
+        )
+
+        response = client.get(f'/api/user/{test_user}/avatar', headers=auth_headers)
+        assert response.status_code == 200
+        assert response.mimetype == 'image/jpeg'
+        assert response.data == b'test_image_data'
+
+        # 未登录: 只能通过带签名的地址获取, 签名与用户ID绑定
+        assert client.get(f'/api/user/{test_user}/avatar').status_code == 401
+        with app.test_request_context():
+            signed_url = User.build_avatar_url(test_user, True)
+            other_signature = User.avatar_signature(test_user + 1)
+        response = client.get(signed_url)
+        assert response.status_code == 200
+        assert response.data == b'test_image_data'
+        assert client.get(f'/api/user/{test_user}/avatar?sig={other_signature}').status_code == 401
+
+def test_get_user_profile_etag(client, app, test_user, auth_headers):
+    """语句测试：档案未修改时返回 304，修改后 ETag 变化"""
+    with app.app_context():
+        response = client.get('/api/user/profile', headers=auth_headers)
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert etag.startswith('W/')
+
+        response = client.get('/api/user/profile', headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+
+        client.post('/api/user/update', headers=auth_headers, json={'username': 'renamed'})
+
+        response = client.get('/api/user/profile', headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+def test_jwt_user_lookup_cache(client, app, test_user, auth_headers):
+    """路径测试：JWT 当前用户精简信息跨请求缓存，修改资料、上传头像、删除用户后失效"""
+    from app.extensions import cache
+
+    def cached_identity():
+        return cache.get('jwt_user', str(test_user))
+
+    from flask import g
+
+    assert client.get('/api/user/modifiable_data', headers=auth_headers).status_code == 200
+    g.pop('user_identities', None)  # 测试中各请求共用 fixture 的应用上下文, 清掉请求内缓存
+    assert client.get('/api/user/modifiable_data', headers=auth_headers).status_code == 200
+    stats = cache.stats()['jwt_user']
+    assert stats['misses'] == 1 and stats['hits'] >= 1
+    identity = cached_identity()
+    assert identity.username == 'testuser' and identity.has_avatar is False and identity.is_manager is False
+
+    response = client.post('/api/user/update', headers=auth_headers, json={'username': 'renamed'})
+    assert response.json['code'] == 200
+    assert cached_identity() is None
+    client.get('/api/user/modifiable_data', headers=auth_headers)
+    assert cached_identity().username == 'renamed'
+
+    image = base64.b64encode(b'test_image_data').decode('utf-8')
+    assert client.post(f'/api/user/upload_avatar/{test_user}', json={'base64_data': image}).status_code == 200
+    assert cached_identity() is None
+    client.get('/api/user/modifiable_data', headers=auth_headers)
+    assert cached_identity().has_avatar is True
+
+    db.session.delete(db.session.get(User, test_user))
+    db.session.commit()
+    assert cached_identity() is None
+    response = client.get('/api/user/modifiable_data', headers=auth_headers)
+    assert response.status_code == 401
+    assert 'Error loading the user' in response.json['msg']
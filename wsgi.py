@@ -1,9 +1,12 @@
 import eventlet
 eventlet.monkey_patch()
 
-import os, argparse, socket
+import os, argparse, signal, socket
+import eventlet.hubs
+import eventlet.wsgi
 from app import create_app
-from app.extensions import socketio
+from app.extensions import socketio, order_scheduler, worker
+from app.utils.lifecycle import health_listener
 
 def parse_args():
     """解析命令行参数"""
@@ -11,25 +14,61 @@ def parse_args():
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
     parser.add_argument('--host', help='Override default host binding')
     parser.add_argument('--port', type=int, default=5000, help='Port to listen on')
+    parser.add_argument('--config', help='Config class path (default: DevelopmentConfig with --debug, else ProductionConfig)')
+    parser.add_argument('--health-port', type=int, help='Base port for a per-worker listener (port + WORKER_ID, set by serve.py)')
     return parser.parse_args()
 
-def get_local_ip():
-    """获取本机局域网IP"""
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))  # 连接一个外部地址
-        local_ip = s.getsockname()[0]
-        s.close()
-        return local_ip
-    except:
-        return "127.0.0.1"  # 失败时回退到本地
+def notify_ready():
+    """通知 serve.py 主进程: 已开始监听端口 (滚动重启时据此停止旧 worker)"""
+    fd = os.getenv('WORKER_READY_FD')
+    if fd:
+        os.write(int(fd), b'1')
+        os.close(int(fd))
+
+def serve(app, host, port, health_port=None):
+    """
+    eventlet 服务, 收到 SIGTERM/SIGINT 后优雅退出
+    监听套接字设置 SO_REUSEPORT, serve.py 启动的多个 worker 共用同一端口, 由内核分配新连接
+    """
+    listener = eventlet.listen((host, port), reuse_port=True)
+    if health_port:
+        # 每个 worker 独占的端口 (基础端口 + WORKER_ID), 健康检查可以确定请求落到哪个 worker; 指标接口只在此端口开放
+        health_port += int(worker.worker_id or 0)
+        eventlet.spawn_n(eventlet.wsgi.server, eventlet.listen((host, health_port)), health_listener(app), log_output=False)
+    notify_ready()
+
+    main_greenlet = eventlet.getcurrent()
+    # 信号处理函数在 hub 等待 IO 时执行, 其中安排的绿色线程要等 hub 下次醒来才会运行,
+    # 因此让解释器收到信号时写入管道 (set_wakeup_fd), 由等待该管道的绿色线程执行退出流程
+    wakeup_read, wakeup_write = os.pipe()
+    os.set_blocking(wakeup_write, False)
+    signal.set_wakeup_fd(wakeup_write)
+
+    def drain_on_signal():
+        eventlet.hubs.trampoline(wakeup_read, read=True)
+        eventlet.spawn_after(app.config['WORKER_DRAIN_TIMEOUT'], os._exit, 1)
+        closed = worker.drain()
+        app.logger.info(f"🛑 worker {worker.worker_id or '-'} 开始退出, 已通知 {closed} 个连接重连")
+        eventlet.sleep(0.5)  # 让重连通知发送出去
+        socketio.server.eio.disconnect()
+        # 结束 accept 循环, eventlet.wsgi.server 随后等待处理中的请求完成
+        eventlet.kill(main_greenlet, SystemExit)
+
+    def on_signal(signum, frame):
+        signal.signal(signum, signal.SIG_DFL)  # 再次发送信号时立即退出
+
+    eventlet.spawn_n(drain_on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    eventlet.wsgi.server(listener, app, log_output=app.debug)
+    app.logger.info(f"👋 worker {worker.worker_id or '-'} 已退出")
 
 def main():
     """主函数入口"""
     args = parse_args()
 
-    # 根据调试模式选择配置
-    config = "config.DevelopmentConfig" if args.debug else "config.ProductionConfig"
+    # 根据调试模式选择配置（--config 显式指定时优先）
+    config = args.config or ("config.DevelopmentConfig" if args.debug else "config.ProductionConfig")
     app = create_app(config)
 
     mode = "开发" if args.debug else "生产"
@@ -42,9 +81,24 @@ def main():
     app.logger.info(f"🚀 服务监听在: http://{host}:{port}")
     if host == '0.0.0.0':
         app.logger.info(f"👉 本地访问: http://127.0.0.1:{port}")
-        app.logger.info(f"👉 局域网访问: http://{get_local_ip()}:{port}")
+        # 只读取本机主机名, 不向外部地址发起连接 (离线环境下探测局域网 IP 会拖慢启动)
+        app.logger.info(f"👉 局域网访问: http://{socket.gethostname()}:{port}")
+
+    if worker.worker_id and not app.config['SOCKETIO_MESSAGE_QUEUE']:
+        app.logger.warning("⚠️ 多进程运行但未配置 SOCKETIO_MESSAGE_QUEUE, 推送只能送达同一进程上的客户端")
+
+    # 订单状态调度（未配置时单进程运行开启; serve.py 下需显式开启, 只在 0 号 worker 运行, 或改用 flask order-scheduler 独立运行）
+    # 多个实例同时运行也是安全的: 调度器在行锁下重新检查订单状态和出发时间
+    scheduler_enabled = app.config['ORDER_SCHEDULER_ENABLED']
+    if scheduler_enabled is None:
+        scheduler_enabled = worker.worker_id is None
+    if scheduler_enabled and worker.worker_id in (None, '0'):
+        order_scheduler.start()
+        app.logger.info("⏱️ 订单状态调度已在后台启动")
+    elif worker.worker_id in (None, '0'):
+        app.logger.warning("⚠️ 订单状态调度未在本进程运行, 请单独运行 flask order-scheduler, 否则已出发的订单不会离开订单广场")
 
-    socketio.run(app, host=host, port=port, debug=os.getenv('FLASK_DEBUG') == '1', use_reloader=False)
+    serve(app, host, port, args.health_port)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file